@@ -0,0 +1,333 @@
+"""
+LearnBridge HTTP API
+
+A headless async service exposing the classroom agent over HTTP, on top of the
+same root_agent, Runner and storage as the Streamlit app. Turns for different
+users run concurrently on one event loop; the blocking Google API calls run in
+a worker thread pool.
+
+Users send the session token the app issued when they signed in (see
+auth_tokens.py, shown in the app under "API access") as
+"Authorization: Bearer <token>"; it is mapped to their user ID here, never
+taken from the client. The /admin endpoints are enabled by setting
+LEARNBRIDGE_ADMIN_TOKEN and expect it as "Authorization: Bearer <token>".
+
+Run with:
+    uvicorn api_server:app --host 0.0.0.0 --port 8080
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from google.adk.runners import Runner
+
+from auth_tokens import user_for_session_token
+from oauth_web_config import is_user_authenticated
+from storage import get_session_service
+from system_root_agent.agent import root_agent
+from system_root_agent.accounting import METRICS_TOKEN_ENV, metrics_authorized, usage_aggregator
+from system_root_agent.cancellation import CancellationToken, turn_registry
+from system_root_agent.context import request_context
+from system_root_agent.freshness import freshness_cache
+from system_root_agent.profiling import PROFILE_MODES, get_saved_profile, profile_turn
+from system_root_agent.subagents.announcement_agent.tools import load_announcements
+from system_root_agent.subagents.course_work_agent.tools import forget_shared_coursework, load_course_work
+from system_root_agent.sync import sync_scheduler
+from system_root_agent.tracing import turn_waterfall
+from system_root_agent.turns import APP_NAME, new_initial_state, run_turn, stream_turn, turn_in_flight
+
+# Worker threads for the blocking Google API calls of all in-flight turns
+API_WORKER_THREADS = int(os.getenv("LEARNBRIDGE_API_WORKER_THREADS", "64"))
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # asyncio.to_thread uses the default executor, size it for many users
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=API_WORKER_THREADS, thread_name_prefix="tool")
+    )
+    yield
+
+
+app = FastAPI(title="LearnBridge API", lifespan=lifespan)
+session_service = get_session_service()
+runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+
+ADMIN_TOKEN_ENV = "LEARNBRIDGE_ADMIN_TOKEN"
+
+# How often POST /chat checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+# One turn at a time per session; different sessions run concurrently. A
+# lock is dropped once no request holds or waits for it
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    # "sampling" or "cprofile" to profile this turn (POST /chat only)
+    profile: Optional[str] = None
+    # Class-wide answers for the courses the user teaches (see teacher_tools.py)
+    teacher_mode: bool = False
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    agent: Optional[str] = None
+    response: Optional[str] = None
+    fast_path: bool = False
+    trace_id: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    profile_id: Optional[str] = None
+    # When the Classroom data the answer used was fetched (UTC)
+    data_as_of: Optional[str] = None
+    # Set if the turn was stopped: "superseded", "disconnected" or "admin"
+    cancelled: Optional[str] = None
+
+
+class SessionInfo(BaseModel):
+    session_id: str
+    state: Dict[str, Any] = {}
+
+
+async def current_user(authorization: Optional[str] = Header(None)) -> str:
+    """Resolve the calling user from their session token and make sure they have stored credentials."""
+    scheme, _, token = (authorization or "").partition(" ")
+    user_id = user_for_session_token(token) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="A valid session token is required.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    if not await asyncio.to_thread(is_user_authenticated, user_id):
+        raise HTTPException(status_code=401, detail="User is not authenticated with Google Classroom.")
+    return user_id
+
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    """Allow operators only; the admin endpoints do not exist without LEARNBRIDGE_ADMIN_TOKEN."""
+    expected = os.getenv(ADMIN_TOKEN_ENV)
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization or "", f"Bearer {expected}"):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+async def _resolve_session(user_id: str, session_id: Optional[str]) -> str:
+    """Return an existing session id, or create a new session."""
+    if session_id is None:
+        session = await session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, state=new_initial_state()
+        )
+        return session.id
+
+    session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return session.id
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.post("/sessions", response_model=SessionInfo)
+async def create_session(user_id: str = Depends(current_user)):
+    session = await session_service.create_session(
+        app_name=APP_NAME, user_id=user_id, state=new_initial_state()
+    )
+    # Warm the user's data before their first message
+    sync_scheduler.warm(user_id)
+    return SessionInfo(session_id=session.id, state=session.state)
+
+
+@app.get("/sessions", response_model=List[SessionInfo])
+async def list_sessions(user_id: str = Depends(current_user)):
+    response = await session_service.list_sessions(app_name=APP_NAME, user_id=user_id)
+    return [SessionInfo(session_id=session.id) for session in response.sessions]
+
+
+@app.get("/sessions/{session_id}", response_model=SessionInfo)
+async def get_session(session_id: str, user_id: str = Depends(current_user)):
+    session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return SessionInfo(session_id=session.id, state=session.state)
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str, user_id: str = Depends(current_user)):
+    await session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    _session_locks.pop(session_id, None)
+    return {"status": "deleted"}
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, http_request: Request, user_id: str = Depends(current_user)):
+    if request.profile and request.profile not in PROFILE_MODES:
+        raise HTTPException(status_code=422, detail=f"profile must be one of {list(PROFILE_MODES)}")
+
+    session_id = await _resolve_session(user_id, request.session_id)
+    sync_scheduler.note_activity(user_id)
+    profile = None
+    token = CancellationToken(user_id, session_id)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, token))
+    try:
+        if turn_in_flight(user_id, session_id, request.message, request.teacher_mode):
+            # A retry of the question being answered joins that turn
+            result = await run_turn(runner, user_id, session_id, request.message, token,
+                                    teacher_mode=request.teacher_mode)
+        else:
+            # A new question replaces the one still being answered
+            turn_registry.cancel_session(user_id, session_id, "superseded")
+            async with _session_lock(session_id):
+                with profile_turn(request.profile, owner=user_id, label="chat") as profile:
+                    result = await run_turn(runner, user_id, session_id, request.message, token,
+                                            teacher_mode=request.teacher_mode)
+    finally:
+        watcher.cancel()
+    return ChatResponse(
+        session_id=session_id,
+        agent=result.agent,
+        response=result.text,
+        fast_path=result.fast_path,
+        trace_id=result.trace_id,
+        usage=result.usage,
+        profile_id=profile.profile_id if profile else None,
+        data_as_of=result.data_as_of,
+        cancelled=result.cancelled,
+    )
+
+
+async def _cancel_on_disconnect(http_request: Request, token: CancellationToken):
+    """Cancel this request's turn once the client has gone away; a newer turn in the session is left alone."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    token.cancel("disconnected")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, user_id: str = Depends(current_user)):
+    """
+    Stream a turn as server-sent events: "delta" chunks, then one "final" (or
+    "cancelled") event. Disconnecting cancels the turn.
+    """
+    session_id = await _resolve_session(user_id, request.session_id)
+    sync_scheduler.note_activity(user_id)
+    # A new question replaces the one still being answered
+    turn_registry.cancel_session(user_id, session_id, "superseded")
+
+    async def events():
+        async with _session_lock(session_id):
+            yield _sse({"type": "session", "session_id": session_id})
+            try:
+                async for update in stream_turn(runner, user_id, session_id, request.message, streaming=True,
+                                               teacher_mode=request.teacher_mode):
+                    yield _sse(update)
+            except Exception as e:
+                yield _sse({"type": "error", "error_message": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/admin/turns", dependencies=[Depends(require_admin)])
+async def admin_running_turns():
+    """The turns running in this process, oldest first."""
+    return turn_registry.running()
+
+
+@app.post("/admin/turns/{turn_id}/cancel", dependencies=[Depends(require_admin)])
+async def admin_cancel_turn(turn_id: str):
+    if not turn_registry.cancel_turn(turn_id, "admin"):
+        raise HTTPException(status_code=404, detail="No such running turn.")
+    return {"status": "cancelled"}
+
+
+@app.post("/admin/users/{user_id}/cancel", dependencies=[Depends(require_admin)])
+async def admin_cancel_user(user_id: str):
+    """Cancel every running turn of a user."""
+    return {"cancelled": turn_registry.cancel_user(user_id, "admin")}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Token and Google API usage in the Prometheus text format, for scrapers with LEARNBRIDGE_METRICS_TOKEN."""
+    if not os.getenv(METRICS_TOKEN_ENV):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not metrics_authorized(authorization):
+        raise HTTPException(status_code=403, detail="Metrics token required.")
+    return PlainTextResponse(usage_aggregator.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/usage")
+async def usage(user_id: str = Depends(current_user)):
+    """Per-turn averages over the user's recent turns."""
+    return usage_aggregator.user_summary(user_id)
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, user_id: str = Depends(current_user)):
+    """Latency breakdown of one of the user's recent turns, one row per span."""
+    try:
+        rows = turn_waterfall(trace_id)
+    except ValueError:
+        rows = []
+    # The first row is the turn's root span, which records whose turn it was
+    if not rows or rows[0]["attributes"].get("user.id") != user_id:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": rows}
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, user_id: str = Depends(current_user)):
+    """Download a turn profile: folded stacks (sampling) or a .prof file (cprofile)."""
+    path = get_saved_profile(profile_id, user_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path), media_type="application/octet-stream")
+
+
+@app.post("/sync")
+async def sync(user_id: str = Depends(current_user)):
+    """Fetch the user's coursework and announcements now (rebuilding the deadline index)."""
+    # Waits for pending snapshot writes, off the event loop
+    await asyncio.to_thread(freshness_cache.invalidate, user_id)
+    with request_context(user_id=user_id):
+        # Course lists too, not only the user's own data
+        await asyncio.to_thread(forget_shared_coursework)
+        coursework, announcements = await asyncio.gather(
+            asyncio.to_thread(load_course_work),
+            asyncio.to_thread(load_announcements),
+        )
+    return {
+        "coursework": {"status": coursework.get("status"), "total_count": coursework.get("total_count")},
+        "announcements": {"status": announcements.get("status"), "total_count": announcements.get("total_count")},
+    }
+
+
+def _sse(payload: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8080")))
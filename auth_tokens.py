@@ -0,0 +1,110 @@
+"""
+Sign-in Tokens
+
+This module decides who a browser or API client is, without trusting any
+identity the client sends. Two kinds of token are issued:
+
+    login state    the OAuth `state` of one sign-in, bound to the browser that
+                   started it (its login id cookie), so a callback URL sent to
+                   someone else is rejected
+    session token  proof that its holder signed in as a user, issued when the
+                   OAuth flow completes; kept in a cookie by the Streamlit app
+                   and sent as "Authorization: Bearer <token>" to the HTTP API
+
+Both are HMAC-SHA256 signed with LEARNBRIDGE_SESSION_SECRET (comma separated,
+the first one signs), so every replica can check them without shared state.
+Without it a random secret is generated per process: fine for a single
+replica, but everyone is signed out when it restarts.
+It does not depend on Streamlit.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+SESSION_SECRET_ENV = "LEARNBRIDGE_SESSION_SECRET"
+
+# How long a session token signs its holder in
+SESSION_TTL_SECONDS = 30 * 86400
+
+# How long a sign-in may take between leaving for Google and coming back
+LOGIN_TTL_SECONDS = 600
+
+
+class TokenSigner:
+    """Signed, expiring tokens of the form <payload>.<expires>.<signature>, with key rotation support."""
+
+    def __init__(self, keys: List[bytes]):
+        if not keys:
+            raise ValueError("At least one signing key is required")
+        self._keys = keys
+
+    @classmethod
+    def from_env(cls) -> "TokenSigner":
+        keys = [key.strip().encode() for key in os.getenv(SESSION_SECRET_ENV, "").split(",") if key.strip()]
+        if not keys:
+            print(f"{SESSION_SECRET_ENV} is not set; sign-ins last until this process restarts")
+            keys = [secrets.token_bytes(32)]
+        return cls(keys)
+
+    def sign(self, purpose: str, payload: str, ttl: float, binding: str = "") -> str:
+        """A token for payload, valid for ttl seconds and only together with binding."""
+        expires = str(int(time.time() + ttl))
+        return f"{payload}.{expires}.{self._signature(self._keys[0], purpose, payload, expires, binding)}"
+
+    def verify(self, purpose: str, token: str, binding: str = "") -> Optional[str]:
+        """The payload of a valid, unexpired token for purpose and binding, or None."""
+        try:
+            payload, expires, signature = token.rsplit(".", 2)
+            if int(expires) < time.time():
+                return None
+        except (AttributeError, ValueError):
+            return None
+        for key in self._keys:
+            if hmac.compare_digest(signature, self._signature(key, purpose, payload, expires, binding)):
+                return payload
+        return None
+
+    @staticmethod
+    def _signature(key: bytes, purpose: str, payload: str, expires: str, binding: str) -> str:
+        message = "\0".join((purpose, payload, expires, binding)).encode()
+        digest = hmac.new(key, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+@lru_cache(maxsize=None)
+def get_token_signer() -> TokenSigner:
+    """Get the process-wide signer keyed by LEARNBRIDGE_SESSION_SECRET."""
+    return TokenSigner.from_env()
+
+
+def new_login_id() -> str:
+    """A random id for a browser that has not signed in yet."""
+    return secrets.token_urlsafe(24)
+
+
+def login_state(login_id: str) -> str:
+    """A fresh OAuth state for one sign-in started by the browser with login_id."""
+    return get_token_signer().sign("login", secrets.token_urlsafe(16), LOGIN_TTL_SECONDS, binding=login_id)
+
+
+def check_login_state(state: str, login_id: Optional[str]) -> bool:
+    """Whether an OAuth callback's state was issued to the browser with login_id."""
+    return bool(login_id) and get_token_signer().verify("login", state, binding=login_id) is not None
+
+
+def issue_session_token(user_id: str) -> str:
+    """A session token that signs its holder in as user_id."""
+    return get_token_signer().sign("session", user_id, SESSION_TTL_SECONDS)
+
+
+def user_for_session_token(token: Optional[str]) -> Optional[str]:
+    """The user a session token signs in, or None if it is missing, forged or expired."""
+    if not token:
+        return None
+    return get_token_signer().verify("session", token)
@@ -0,0 +1 @@
+"""Benchmarks, load tests and offline stand-ins for the Google APIs."""
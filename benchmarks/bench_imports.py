@@ -0,0 +1,233 @@
+"""
+Cold Start Benchmark
+
+Measures what a fresh process imports before it can serve its first page,
+using `python -X importtime` in a new interpreter per run:
+
+    auth_page    the Streamlit app rendering the sign-in page for a new user
+    chat_page    the Streamlit app rendering the chat page for a signed-in user
+                 (no message sent, so the agent graph is not built yet)
+    agent_graph  building the agent graph and its Runner, which the app does on
+                 the first chat message
+
+Streamlit itself (and its test harness) is imported before measuring starts,
+so the numbers are the app's own import cost. The sign-in page has a budget
+and a list of modules it must not load; the run fails if either is broken.
+
+Usage:
+    python -m benchmarks.bench_imports                  # all scenarios, 3 runs each
+    python -m benchmarks.bench_imports --top 25         # show more of the heaviest imports
+    python -m benchmarks.bench_imports --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "-- bench_imports: measuring --"
+
+# Import time allowed for the sign-in page, on top of Streamlit itself
+AUTH_PAGE_BUDGET_MS = 400
+
+# Modules the sign-in page must not import
+AUTH_PAGE_FORBIDDEN = (
+    "google.adk",
+    "google.genai",
+    "googleapiclient.discovery",
+    "opentelemetry.sdk",
+    "system_root_agent.agent",
+)
+
+_RUN_APP = """
+at = AppTest.from_file({app!r}, default_timeout=60)
+{prepare}
+at.run()
+if at.exception:
+    raise SystemExit(f"App raised: {{at.exception[0].message}}")
+if not any({expect!r} in element.value for element in at.markdown):
+    raise SystemExit("Expected page was not rendered")
+"""
+
+
+class Scenario(NamedTuple):
+    setup: str
+    code: str
+    budget_ms: Optional[float] = None
+    forbidden: Tuple[str, ...] = ()
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "auth_page": Scenario(
+        setup="from streamlit.testing.v1 import AppTest",
+        code=_RUN_APP.format(app="streamlit_app.py", prepare="", expect="Authentication Required"),
+        budget_ms=AUTH_PAGE_BUDGET_MS,
+        forbidden=AUTH_PAGE_FORBIDDEN,
+    ),
+    "chat_page": Scenario(
+        setup="from streamlit.testing.v1 import AppTest\n"
+              "from benchmarks.load_test import seed_users\n"
+              "user_id = seed_users(1, prefix='bench-imports')[0]",
+        code=_RUN_APP.format(app="streamlit_app.py", prepare="at.session_state['user_id'] = user_id",
+                             expect="Your AI assistant"),
+    ),
+    "agent_graph": Scenario(
+        setup="",
+        code="from google.adk.runners import Runner\n"
+             "from system_root_agent.agent import root_agent\n"
+             "from storage import get_session_service\n"
+             "Runner(agent=root_agent, app_name='bench', session_service=get_session_service())",
+    ),
+}
+
+# The sign-in page needs OAuth client settings to build its link
+_ENV = {
+    "GOOGLE_CLIENT_SECRETS_JSON": json.dumps({"web": {
+        "client_id": "bench.apps.googleusercontent.com",
+        "client_secret": "bench",
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    }}),
+    "LEARNBRIDGE_STORE_URL": "memory://",
+}
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    Totals from the importtime lines printed after the marker: the sum of the
+    cumulative time of every top-level import, and each module's own time.
+    """
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+
+    total_us = 0
+    modules: Dict[str, int] = {}
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two spaces per level after the first space
+        name = name.rstrip()[1:]
+        if not name.startswith(" "):
+            total_us += int(cumulative_us)
+        modules[name.strip()] = int(self_us)
+    return {"import_ms": total_us / 1000, "modules": modules}
+
+
+def run_once(scenario: Scenario) -> Dict[str, Any]:
+    script = "\n".join([
+        "import sys, time",
+        scenario.setup,
+        f"sys.stderr.write({MARKER!r} + '\\n')",
+        "_started = time.perf_counter()",
+        scenario.code,
+        "print(f'{(time.perf_counter() - _started) * 1000:.1f}')",
+    ])
+    env = {**os.environ, **_ENV}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        tail = "\n".join(line for line in completed.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"Scenario failed:\n{tail[-2000:] or completed.stdout[-2000:]}")
+
+    result = parse_importtime(completed.stderr)
+    result["wall_ms"] = float(completed.stdout.strip().splitlines()[-1])
+    return result
+
+
+def run(names: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Best of `repeat` runs per scenario (import times are noisy)."""
+    results = {}
+    for name in names:
+        print(f"  {name} ...", file=sys.stderr)
+        runs = [run_once(SCENARIOS[name]) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r["import_ms"])
+        results[name] = {
+            "import_ms": round(best["import_ms"], 1),
+            "wall_ms": round(min(r["wall_ms"] for r in runs), 1),
+            "modules": best["modules"],
+        }
+    return results
+
+
+def heaviest_packages(modules: Dict[str, int], top: int) -> List[Tuple[str, float]]:
+    """Own import time summed per top-level package (google.* per subpackage)."""
+    packages: Dict[str, int] = {}
+    for name, self_us in modules.items():
+        parts = name.split(".")
+        package = ".".join(parts[:2]) if parts[0] == "google" and len(parts) > 1 else parts[0]
+        packages[package] = packages.get(package, 0) + self_us
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [(package, us / 1000) for package, us in ranked]
+
+
+def check(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Lines describing every broken budget or forbidden import."""
+    failures = []
+    for name, result in results.items():
+        scenario = SCENARIOS[name]
+        if scenario.budget_ms is not None and result["import_ms"] > scenario.budget_ms:
+            failures.append(f"{name}: imports took {result['import_ms']:.0f} ms, budget {scenario.budget_ms:.0f} ms")
+        for prefix in scenario.forbidden:
+            loaded = sorted(m for m in result["modules"] if m == prefix or m.startswith(prefix + "."))
+            if loaded:
+                failures.append(f"{name}: imported {prefix} ({len(loaded)} modules)")
+    return failures
+
+
+def print_report(results: Dict[str, Dict[str, Any]], top: int):
+    header = f"{'scenario':<14} {'imports ms':>11} {'wall ms':>9} {'modules':>8} {'budget ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        budget = SCENARIOS[name].budget_ms
+        print(f"{name:<14} {result['import_ms']:>11.1f} {result['wall_ms']:>9.1f} {len(result['modules']):>8} "
+              f"{budget if budget is not None else '-':>10}")
+
+    for name, result in results.items():
+        print(f"\nHeaviest packages ({name}):")
+        for package, ms in heaviest_packages(result["modules"], top):
+            print(f"  {package:<40} {ms:>8.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold start import time.")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario (the fastest is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest packages to list per scenario")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = run(args.scenarios or list(SCENARIOS), args.repeat)
+    failures = check(results)
+
+    if args.json:
+        report = {
+            name: {
+                "import_ms": result["import_ms"],
+                "wall_ms": result["wall_ms"],
+                "heaviest": heaviest_packages(result["modules"], args.top),
+            }
+            for name, result in results.items()
+        }
+        report["failures"] = failures
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(results, args.top)
+        for line in failures:
+            print(f"OVER BUDGET {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Data Tool Micro-Benchmarks
+
+Measures how the data tools scale with the size of a user's Classroom:
+get_announcements, get_course_work, the detail tools (get_assignment_details,
+get_announcement), the course catalog, context assembly (the tool output the
+data analyzer's prompt is built from), teacher mode's class-wide submission
+statistics, snapshot writes and restores, the records a loaded
+user keeps in memory and append_interaction.
+
+Every case runs against a FakeClassroomService over synthetic fixtures, so
+results are reproducible offline. For each case it reports median wall time,
+API requests, response bytes, peak traced memory, memory still held by the
+result and output size in tokens.
+
+Usage:
+    python -m benchmarks.bench_tools                       # quick size grid
+    python -m benchmarks.bench_tools --sizes full          # 1/10/50 courses x 10..5000 items
+    python -m benchmarks.bench_tools --save                # write the baseline
+    python -m benchmarks.bench_tools --compare             # diff against the baseline
+
+Baselines live in benchmarks/baselines/bench_tools.json. Request counts and
+token sizes are deterministic, so any change there shows up exactly; wall time
+and memory are flagged when they grow past --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .fake_service import FakeClassroomService
+from .fixtures import generate_classroom
+from .mock_google_api import MockGoogleAPI
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "bench_tools.json")
+USER_ID = "bench-user"
+
+# (courses, items per course)
+SIZE_GRIDS = {
+    "quick": [(1, 10), (10, 100), (50, 100), (1, 5000), (10, 1000)],
+    "full": [(courses, items) for courses in (1, 10, 50) for items in (10, 100, 1000, 5000)],
+}
+
+HISTORY_SIZES = [10, 100, 1000]
+
+# Teacher mode: (sections, students per section, assignments per section)
+TEACHER_SIZES = [(6, 150, 20), (6, 150, 100)]
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text and JSON
+    return len(text) // 4
+
+
+def measure(fn: Callable[[], Any], service: Optional[FakeClassroomService], repeat: int,
+            setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Run fn repeatedly: timings first, then once more under tracemalloc."""
+    timings = []
+    result = None
+    requests = response_bytes = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        if service:
+            service.reset_counters()
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+        if service:
+            requests, response_bytes = service.requests, service.response_bytes
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        kept = fn()
+        retained, peak = tracemalloc.get_traced_memory()
+        del kept
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": round(statistics.median(timings) * 1000, 3),
+        "requests": requests,
+        "response_bytes": response_bytes,
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(retained / 1024, 1),
+        "output_tokens": estimate_tokens(json.dumps(result, default=str)) if result is not None else 0,
+    }
+
+
+def bench_tools(courses: int, items: int, repeat: int) -> Dict[str, Dict[str, Any]]:
+    from system_root_agent.catalog import course_catalog
+    from system_root_agent.context import request_context
+    from system_root_agent.details import detail_cache
+    from system_root_agent.freshness import freshness_cache
+    from system_root_agent.shared_cache import get_shared_cache
+    from cryptography.fernet import Fernet
+    from storage import TokenCipher
+    from system_root_agent.snapshots import SnapshotStore
+    from system_root_agent.subagents.announcement_agent.tools import (
+        get_announcement, get_announcements, load_announcements,
+    )
+    from system_root_agent.subagents.course_work_agent.tools import (
+        get_assignment_details, get_course_work, load_course_work,
+    )
+    from system_root_agent.subagents.data_analyzer_agent.agent import analyzer_instruction_template
+
+    api = MockGoogleAPI(generate_classroom(courses=courses, items_per_course=items, seed=0))
+    service = FakeClassroomService(api, user=USER_ID)
+    shared_cache = get_shared_cache()
+    results = {}
+
+    def cold():
+        course_catalog.invalidate(USER_ID)
+        freshness_cache.invalidate(USER_ID)
+        shared_cache.clear()
+
+    def cold_user():
+        # Another user of the same courses: their own caches are empty, the shared tier is not
+        course_catalog.invalidate(USER_ID)
+        freshness_cache.invalidate(USER_ID)
+
+    def cold_details():
+        detail_cache.clear()
+        shared_cache.clear()
+
+    with request_context(user_id=USER_ID) as ctx:
+        ctx.set_service("classroom", service)
+
+        results["catalog.cold"] = measure(lambda: course_catalog.list_courses(service, USER_ID), service, repeat, cold)
+        results["catalog.warm"] = measure(lambda: course_catalog.list_courses(service, USER_ID), service, repeat)
+        results["get_announcements"] = measure(get_announcements, service, repeat, cold)
+        results["get_course_work"] = measure(get_course_work, service, max(1, repeat // 2), cold)
+        # Within the freshness TTL: served from the cache, no API requests
+        results["get_course_work.fresh"] = measure(get_course_work, service, repeat)
+        # Course lists already in the shared tier: only the user's own submissions are listed
+        results["get_course_work.shared"] = measure(get_course_work, service, max(1, repeat // 2), cold_user)
+
+        # One item in full, as the model asks for it; warm runs hit the item cache
+        first_course = api.fixture.courses[0]["id"]
+        work = api.fixture.coursework[first_course]
+        post = api.fixture.announcements[first_course]
+        if work:
+            details = lambda: get_assignment_details(first_course, work[0]["id"])
+            results["get_assignment_details"] = measure(details, service, repeat, cold_details)
+            results["get_assignment_details.cached"] = measure(details, service, repeat)
+        if post:
+            results["get_announcement"] = measure(
+                lambda: get_announcement(first_course, post[0]["id"]), service, repeat, cold_details
+            )
+
+        # What the data analyzer sees: both gatherer outputs substituted into its instruction
+        announcements = get_announcements()
+        course_work = get_course_work()
+
+        def assemble():
+            return (
+                analyzer_instruction_template()
+                .replace("{course_work_info}", json.dumps(course_work, default=str))
+                .replace("{announcements_info}", json.dumps(announcements, default=str))
+            )
+
+        results["context_assembly"] = measure(assemble, None, repeat)
+
+        # The records kept for a loaded user (deadline index, fast path answers)
+        def load_user():
+            return load_course_work(), load_announcements()
+
+        results["loaded_user"] = measure(load_user, service, max(1, repeat // 2), cold)
+
+        # Writing a user's coursework snapshot, and reading it back after a restart
+        with tempfile.TemporaryDirectory() as directory:
+            store = SnapshotStore(directory, TokenCipher([Fernet.generate_key().decode()]))
+            loaded = load_course_work()
+            save = lambda: store.save(USER_ID, "coursework", time.time(), loaded)
+            results["snapshot.save"] = measure(save, None, repeat)
+            results["snapshot.restore"] = measure(lambda: store.load(USER_ID, "coursework") and None, None, repeat)
+
+    return results
+
+
+def bench_teacher(repeat: int) -> Dict[str, Dict[str, Any]]:
+    from system_root_agent.catalog import course_catalog
+    from system_root_agent.context import request_context
+    from system_root_agent.freshness import freshness_cache
+    from system_root_agent.shared_cache import get_shared_cache
+    from system_root_agent.subagents.data_analyzer_agent.teacher_tools import (
+        get_class_submission_stats, get_missing_submissions,
+    )
+
+    results = {}
+    for sections, students, items in TEACHER_SIZES:
+        fixture = generate_classroom(courses=sections, items_per_course=items, announcements_per_course=0, seed=0)
+        api = MockGoogleAPI(fixture, students_per_course=students)
+        service = FakeClassroomService(api, user=USER_ID)
+        course_id = fixture.courses[0]["id"]
+        work_id = fixture.coursework[course_id][0]["id"]
+        suffix = f"sections={sections}/students={students}/items={items}"
+
+        def cold():
+            course_catalog.invalidate(USER_ID)
+            freshness_cache.invalidate(USER_ID)
+            get_shared_cache().clear()
+
+        with request_context(user_id=USER_ID) as ctx:
+            ctx.teacher_mode = True
+            ctx.set_service("classroom", service)
+            results[f"class_stats/{suffix}"] = measure(get_class_submission_stats, service, max(1, repeat // 2), cold)
+            results[f"class_stats.fresh/{suffix}"] = measure(get_class_submission_stats, service, repeat)
+            results[f"missing_submissions/{suffix}"] = measure(
+                lambda: get_missing_submissions(course_id, work_id), service, repeat
+            )
+    return results
+
+
+def bench_history(repeat: int) -> Dict[str, Dict[str, Any]]:
+    from google.adk.sessions import InMemorySessionService
+
+    from system_root_agent.turns import APP_NAME, append_interaction
+
+    results = {}
+    for size in HISTORY_SIZES:
+        session_service = InMemorySessionService()
+        history = [
+            {"action": "user_query", "query": f"question {n}", "timestamp": "2025-01-01 00:00:00"}
+            for n in range(size)
+        ]
+        session = asyncio.run(session_service.create_session(
+            app_name=APP_NAME, user_id=USER_ID, state={"interaction_history": history}
+        ))
+
+        def append():
+            asyncio.run(append_interaction(session_service, USER_ID, session.id, {
+                "action": "user_query", "query": "what's due this week",
+            }))
+            stored = asyncio.run(session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session.id))
+            return stored.state["interaction_history"]
+
+        def reset():
+            # Keep the history at the benchmarked size
+            asyncio.run(session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session.id))
+            asyncio.run(session_service.create_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session.id, state={"interaction_history": history}
+            ))
+
+        results[f"append_interaction/history={size}"] = measure(append, None, repeat, reset)
+    return results
+
+
+def run(sizes: List[Tuple[int, int]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for courses, items in sizes:
+        print(f"  {courses} courses x {items} items ...", file=sys.stderr)
+        for name, metrics in bench_tools(courses, items, repeat).items():
+            results[f"{name}/courses={courses}/items={items}"] = metrics
+    results.update(bench_teacher(repeat))
+    results.update(bench_history(repeat))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Lines describing every regression against the baseline."""
+    regressions = []
+    for case, metrics in sorted(results.items()):
+        before = baseline.get(case)
+        if before is None:
+            continue
+        for key in ("requests", "response_bytes", "output_tokens"):
+            if metrics[key] > before[key]:
+                regressions.append(f"{case}: {key} {before[key]} -> {metrics[key]}")
+        for key in ("wall_ms", "peak_kb", "retained_kb"):
+            if before.get(key) and metrics[key] > before[key] * (1 + threshold):
+                regressions.append(f"{case}: {key} {before[key]} -> {metrics[key]} (+{metrics[key] / before[key] - 1:.0%})")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]):
+    header = (f"{'case':<62} {'wall ms':>10} {'requests':>9} {'resp KB':>9} {'peak KB':>9} "
+              f"{'kept KB':>9} {'tokens':>9}")
+    print(header)
+    print("-" * len(header))
+    for case, m in results.items():
+        print(f"{case:<62} {m['wall_ms']:>10.2f} {m['requests']:>9} {m['response_bytes'] / 1024:>9.1f} "
+              f"{m['peak_kb']:>9.1f} {m['retained_kb']:>9.1f} {m['output_tokens']:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the data tools at synthetic scale.")
+    parser.add_argument("--sizes", choices=sorted(SIZE_GRIDS), default="quick", help="Size grid to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (median is reported)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if results regress against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed wall time / memory growth")
+    args = parser.parse_args(argv)
+
+    results = run(SIZE_GRIDS[args.sizes], args.repeat)
+    print_table(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
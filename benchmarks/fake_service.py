@@ -0,0 +1,97 @@
+"""
+Fake Google API Service
+
+An in-process stand-in for the discovery-built Classroom service object
+(`service.courses().courseWork().list(...).execute()`), answering from the mock
+API's handlers without HTTP, and counting every request and response byte.
+"""
+
+import json
+import threading
+from typing import Any, Dict
+
+from .mock_google_api import MockGoogleAPI
+
+# Resource path -> (URL template, parameter holding the id for get())
+_RESOURCES = {
+    "courses": ("v1/courses", "id"),
+    "courses.announcements": ("v1/courses/{courseId}/announcements", "id"),
+    "courses.courseWork": ("v1/courses/{courseId}/courseWork", "id"),
+    "courses.students": ("v1/courses/{courseId}/students", "userId"),
+    "courses.courseWork.studentSubmissions": (
+        "v1/courses/{courseId}/courseWork/{courseWorkId}/studentSubmissions", "id"
+    ),
+    "userProfiles": ("v1/userProfiles", "userId"),
+}
+
+
+class FakeRequest:
+    def __init__(self, service: "FakeClassroomService", path: str, query: Dict[str, Any]):
+        self._service = service
+        self._path = path
+        self._query = query
+
+    def execute(self) -> Dict[str, Any]:
+        query = {key: [str(value)] for key, value in self._query.items() if value is not None}
+        status, body = self._service.api.handle("GET", self._path, query, None, self._service.user, simulate=False)
+        # Serialize like the wire does, so callers get fresh objects and bytes are counted
+        payload = json.dumps(body)
+        self._service.record(len(payload))
+        if status != 200:
+            raise RuntimeError(f"Fake API error {status} for {self._path}: {body}")
+        return json.loads(payload)
+
+
+class _Resource:
+    def __init__(self, service: "FakeClassroomService", name: str):
+        self._service = service
+        self._name = name
+
+    def __getattr__(self, child: str):
+        name = f"{self._name}.{child}"
+        if name not in _RESOURCES:
+            raise AttributeError(child)
+        return lambda: _Resource(self._service, name)
+
+    def _path(self, params: Dict[str, Any]) -> str:
+        template, _ = _RESOURCES[self._name]
+        path = template.format(**params)
+        for key in list(params):
+            if "{" + key + "}" in template:
+                del params[key]
+        return path
+
+    def list(self, **params) -> FakeRequest:
+        return FakeRequest(self._service, self._path(params), params)
+
+    def get(self, **params) -> FakeRequest:
+        _, id_param = _RESOURCES[self._name]
+        item_id = params.pop(id_param)
+        return FakeRequest(self._service, f"{self._path(params)}/{item_id}", params)
+
+
+class FakeClassroomService:
+    """A Classroom service object backed by MockGoogleAPI, with request counters."""
+
+    def __init__(self, api: MockGoogleAPI, user: str = "bench-user"):
+        self.api = api
+        self.user = user
+        self.requests = 0
+        self.response_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, size: int):
+        with self._lock:
+            self.requests += 1
+            self.response_bytes += size
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.response_bytes = 0
+
+    def courses(self):
+        return _Resource(self, "courses")
+
+    def userProfiles(self):
+        return _Resource(self, "userProfiles")
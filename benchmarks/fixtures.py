@@ -0,0 +1,182 @@
+"""
+Synthetic Classroom Data
+
+Deterministic generator for Google Classroom courses, coursework, announcements
+and student submissions shaped like the real API responses, at any scale. Used
+by the mock API server and the benchmarks.
+"""
+
+import hashlib
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+_WORDS = (
+    "essay lab report chapter reading quiz worksheet project draft review analysis "
+    "problem set discussion presentation notes outline research group homework unit "
+    "exam study guide vocabulary practice reflection journal experiment data summary"
+).split()
+
+_SUBJECTS = ["Math", "Biology", "Chemistry", "Physics", "History", "English", "Spanish", "Art", "Music", "Economics"]
+
+SUBMISSION_STATES = ["NEW", "CREATED", "TURNED_IN", "RETURNED", "RECLAIMED_BY_STUDENT"]
+
+
+def _timestamp(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+@dataclass
+class ClassroomFixture:
+    """A synthetic Classroom dataset shared by every simulated user."""
+    courses: List[Dict[str, Any]]
+    coursework: Dict[str, List[Dict[str, Any]]]
+    announcements: Dict[str, List[Dict[str, Any]]]
+    now: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __post_init__(self):
+        self._coursework_by_id = {
+            (item["courseId"], item["id"]): item
+            for items in self.coursework.values()
+            for item in items
+        }
+        self._announcements_by_id = {
+            (post["courseId"], post["id"]): post
+            for posts in self.announcements.values()
+            for post in posts
+        }
+
+    def find_coursework(self, course_id: str, course_work_id: str) -> Optional[Dict[str, Any]]:
+        return self._coursework_by_id.get((course_id, course_work_id))
+
+    def find_announcement(self, course_id: str, announcement_id: str) -> Optional[Dict[str, Any]]:
+        return self._announcements_by_id.get((course_id, announcement_id))
+
+    def submission_for(self, user_id: str, course_id: str, course_work_id: str) -> Dict[str, Any]:
+        """The (deterministic) submission of one user for one assignment."""
+        digest = hashlib.sha256(f"{user_id}/{course_id}/{course_work_id}".encode()).digest()
+        rng = random.Random(digest)
+        item = self.find_coursework(course_id, course_work_id) or {}
+        state = rng.choices(SUBMISSION_STATES, weights=[2, 3, 4, 4, 1])[0]
+        submission = {
+            "courseId": course_id,
+            "courseWorkId": course_work_id,
+            "id": f"sub-{digest.hex()[:12]}",
+            "userId": user_id,
+            "creationTime": item.get("creationTime"),
+            "updateTime": item.get("updateTime"),
+            "state": state,
+            "late": rng.random() < 0.15,
+            "alternateLink": f"https://classroom.google.com/c/{course_id}/a/{course_work_id}/submissions/by-status/and-sort-last-name/student/{user_id}",
+            "courseWorkType": "ASSIGNMENT",
+            "assignmentSubmission": {"attachments": []},
+            "submissionHistory": [
+                {"stateHistory": {"state": "CREATED", "stateTimestamp": item.get("creationTime"), "actorUserId": user_id}},
+            ],
+        }
+        if state == "RETURNED" and item.get("maxPoints"):
+            grade = round(rng.uniform(0.5, 1.0) * item["maxPoints"], 1)
+            submission["assignedGrade"] = grade
+            submission["draftGrade"] = grade
+        return submission
+
+
+def generate_classroom(
+    courses: int = 5,
+    items_per_course: int = 20,
+    announcements_per_course: Optional[int] = None,
+    seed: int = 0,
+    now: Optional[datetime] = None,
+) -> ClassroomFixture:
+    """Generate a dataset with the given number of courses and items per course."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    if announcements_per_course is None:
+        announcements_per_course = items_per_course
+
+    course_list = []
+    coursework = {}
+    announcements = {}
+
+    for c in range(courses):
+        course_id = str(600000000000 + c)
+        name = f"{_SUBJECTS[c % len(_SUBJECTS)]} {100 + c}"
+        created = now - timedelta(days=rng.randint(60, 200))
+        course_list.append({
+            "id": course_id,
+            "name": name,
+            "section": f"Period {c % 8 + 1}",
+            "descriptionHeading": name,
+            "room": f"R{rng.randint(100, 400)}",
+            "ownerId": f"teacher-{c}",
+            "creationTime": _timestamp(created),
+            "updateTime": _timestamp(created),
+            "enrollmentCode": f"code{c:04d}",
+            "courseState": "ACTIVE",
+            "alternateLink": f"https://classroom.google.com/c/{course_id}",
+            "teacherGroupEmail": f"teachers-{c}@example.edu",
+            "courseGroupEmail": f"course-{c}@example.edu",
+            "guardiansEnabled": False,
+            "calendarId": f"classroom{c}@group.calendar.google.com",
+            "gradebookSettings": {"calculationType": "TOTAL_POINTS", "displaySetting": "HIDE_OVERALL_GRADE"},
+        })
+
+        items = []
+        for i in range(items_per_course):
+            created = now - timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+            due = now + timedelta(days=rng.randint(-30, 30))
+            work_id = f"{course_id}{i:05d}"
+            item = {
+                "courseId": course_id,
+                "id": work_id,
+                "title": f"{_sentence(rng, 3)[:-1]} {i + 1}",
+                "description": " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(1, 6))),
+                "materials": [
+                    {"link": {"url": f"https://example.edu/{course_id}/{i}/{m}", "title": _sentence(rng, 3)}}
+                    for m in range(rng.randint(0, 3))
+                ],
+                "state": "PUBLISHED",
+                "alternateLink": f"https://classroom.google.com/c/{course_id}/a/{work_id}/details",
+                "creationTime": _timestamp(created),
+                "updateTime": _timestamp(created),
+                "maxPoints": rng.choice([None, 10, 20, 50, 100]),
+                "workType": "ASSIGNMENT",
+                "submissionModificationMode": "MODIFIABLE_UNTIL_TURNED_IN",
+                "assigneeMode": "ALL_STUDENTS",
+                "creatorUserId": f"teacher-{c}",
+                "topicId": str(rng.randint(1, 6)),
+            }
+            if item["maxPoints"] is None:
+                del item["maxPoints"]
+            if rng.random() < 0.85:
+                item["dueDate"] = {"year": due.year, "month": due.month, "day": due.day}
+                item["dueTime"] = {"hours": rng.choice([7, 12, 23]), "minutes": rng.choice([0, 30, 59])}
+            items.append(item)
+        coursework[course_id] = items
+
+        posts = []
+        for a in range(announcements_per_course):
+            created = now - timedelta(days=rng.randint(0, 90), hours=rng.randint(0, 23))
+            announcement_id = f"{course_id}9{a:05d}"
+            posts.append({
+                "courseId": course_id,
+                "id": announcement_id,
+                "text": " ".join(_sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(1, 5))),
+                "state": "PUBLISHED",
+                "alternateLink": f"https://classroom.google.com/c/{course_id}/p/{announcement_id}",
+                "creationTime": _timestamp(created),
+                "updateTime": _timestamp(created),
+                "creatorUserId": f"teacher-{c}",
+                "assigneeMode": "ALL_STUDENTS",
+                "materials": [],
+            })
+        # The API lists announcements newest first
+        posts.sort(key=lambda post: post["updateTime"], reverse=True)
+        announcements[course_id] = posts
+
+    return ClassroomFixture(courses=course_list, coursework=coursework, announcements=announcements, now=now)
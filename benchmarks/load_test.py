@@ -0,0 +1,280 @@
+"""
+End-to-End Load Test
+
+Drives many concurrent simulated users through the same turn pipeline the
+Streamlit app and HTTP API use, against the mock Google API server, and
+reports latency percentiles and throughput.
+
+Usage:
+    python -m benchmarks.load_test --users 50 --turns 5
+    python -m benchmarks.load_test --users 20 --mix mixed --latency-ms 120 --error-rate 0.02
+    python -m benchmarks.load_test --endpoint http://localhost:8765/ --users 100
+    python -m benchmarks.load_test --users 20 --prefetch --first-turn-delay 3
+    python -m benchmarks.load_test --users 20 --mix agent --model fake --duplicates 3
+
+Without --endpoint an in-process mock server is started. The "fast" query mix
+only asks questions the fast path answers, so it needs no model access; the
+"agent" and "mixed" mixes call the model for the remaining turns, and "routing"
+adds open-ended questions that model routing sends to the large model. Use
+--model fake (or replay) to run those offline; see system_root_agent/models.py.
+
+--prefetch has the sync scheduler warm every user as they "sign in" at the
+start of the run, as the app does after the OAuth callback; compare the first
+turn latency with and without it. --first-turn-delay is the time users take to
+ask their first question.
+
+--duplicates sends every question that many times at once in the same session,
+like a double-clicked button or a page reloaded mid-turn. The duplicates join
+the running turn; "coalesced_turns" counts them, and the tokens and Google API
+requests should match a run without duplicates.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .mock_google_api import add_scale_arguments, api_from_arguments, start_mock_server
+
+FAST_QUERIES = [
+    "what's due this week",
+    "show my grades",
+    "what am I missing",
+    "latest announcements",
+]
+
+AGENT_QUERIES = [
+    "Which of my classes has the most work due soon?",
+    "Summarize what my teachers posted recently.",
+    "Am I behind in any course?",
+]
+
+# Open-ended questions that model routing sends to the large model
+COMPLEX_QUERIES = [
+    "Write a sample answer for my next essay assignment.",
+    "Help me plan my study time for the assignments due this week.",
+    "Explain what I should focus on to improve my grade in my weakest course.",
+]
+
+QUERY_MIXES = {
+    "fast": FAST_QUERIES,
+    "agent": AGENT_QUERIES,
+    "mixed": FAST_QUERIES + AGENT_QUERIES,
+    "routing": AGENT_QUERIES + COMPLEX_QUERIES,
+}
+
+
+def seed_users(count: int, prefix: str = "loadtest") -> List[str]:
+    """Store fake credentials for simulated users; the mock accepts any token."""
+    from storage import get_credential_store
+
+    store = get_credential_store()
+    expiry = (datetime.utcnow() + timedelta(days=1)).isoformat() + "Z"
+    user_ids = []
+    for n in range(count):
+        user_id = f"{prefix}-{n:05d}"
+        store.put(user_id, {
+            "token": f"token-{user_id}",
+            "refresh_token": f"refresh-{user_id}",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "loadtest.apps.googleusercontent.com",
+            "client_secret": "loadtest",
+            "scopes": [],
+            "expiry": expiry,
+        })
+        user_ids.append(user_id)
+    return user_ids
+
+
+async def simulate_user(runner, user_id: str, turns: int, queries: List[str], think_time: float,
+                        rng: random.Random, first_turn_delay: float = 0.0,
+                        duplicates: int = 1) -> List[Dict[str, Any]]:
+    """One user holding a conversation of several turns in one session."""
+    from system_root_agent.turns import APP_NAME, new_initial_state, run_turn
+
+    session = await runner.session_service.create_session(
+        app_name=APP_NAME, user_id=user_id, state=new_initial_state()
+    )
+    if first_turn_delay:
+        await asyncio.sleep(first_turn_delay)
+
+    samples = []
+    for turn in range(turns):
+        query = rng.choice(queries)
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*[run_turn(runner, user_id, session.id, query) for _ in range(duplicates)])
+            result = next(result for result in results if not result.coalesced)
+            coalesced = len(results) - 1
+            status = "ok" if result.text else "empty"
+            fast_path = result.fast_path
+            usage = result.usage or {}
+        except Exception as e:
+            status = f"error: {type(e).__name__}"
+            fast_path = False
+            usage = {}
+            coalesced = 0
+        samples.append({
+            "user_id": user_id,
+            "turn": turn,
+            "query": query,
+            "status": status,
+            "fast_path": fast_path,
+            "latency": time.perf_counter() - started,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "complexity": usage.get("complexity"),
+            "tokens_by_model": usage.get("tokens_by_model", {}),
+            "model_fallbacks": usage.get("model_fallbacks", 0),
+            "coalesced": coalesced,
+        })
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, think_time))
+    return samples
+
+
+async def run_load(user_ids: List[str], turns: int, queries: List[str], think_time: float,
+                   seed: int, prefetch: bool = False, first_turn_delay: float = 0.0,
+                   duplicates: int = 1) -> Dict[str, Any]:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from system_root_agent.agent import root_agent
+    from system_root_agent.turns import APP_NAME
+
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=InMemorySessionService())
+
+    started = time.perf_counter()
+    if prefetch:
+        from system_root_agent.sync import sync_scheduler
+        for user_id in user_ids:
+            sync_scheduler.warm(user_id)
+    results = await asyncio.gather(*[
+        simulate_user(runner, user_id, turns, queries, think_time, random.Random(f"{seed}/{user_id}"),
+                      first_turn_delay, duplicates)
+        for user_id in user_ids
+    ])
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for user_samples in results for sample in user_samples]
+    return summarize(samples, elapsed)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = [sample["latency"] for sample in samples if sample["status"] == "ok"]
+    first_turn = [sample["latency"] for sample in samples if sample["status"] == "ok" and sample["turn"] == 0]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[sample["status"]] = statuses.get(sample["status"], 0) + 1
+
+    # Tokens per model and latency per question class, to compare model routing setups
+    model_tokens: Dict[str, int] = {}
+    by_complexity: Dict[str, List[float]] = {}
+    for sample in samples:
+        for model, tokens in sample["tokens_by_model"].items():
+            model_tokens[model] = model_tokens.get(model, 0) + tokens["prompt"] + tokens["completion"]
+        if sample["status"] == "ok" and sample["complexity"]:
+            by_complexity.setdefault(sample["complexity"], []).append(sample["latency"])
+
+    return {
+        "turns": len(samples),
+        "statuses": statuses,
+        "fast_path_turns": sum(1 for sample in samples if sample["fast_path"]),
+        "prompt_tokens": sum(sample["prompt_tokens"] for sample in samples),
+        "completion_tokens": sum(sample["completion_tokens"] for sample in samples),
+        "tokens_by_model": model_tokens,
+        "model_fallbacks": sum(sample["model_fallbacks"] for sample in samples),
+        "coalesced_turns": sum(sample["coalesced"] for sample in samples),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_turns_per_second": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "latency_by_complexity_seconds": {
+            complexity: {"turns": len(values), "p50": round(percentile(values, 50), 4)}
+            for complexity, values in sorted(by_complexity.items())
+        },
+        "first_turn_latency_seconds": {
+            "p50": round(percentile(first_turn, 50), 4),
+            "p95": round(percentile(first_turn, 95), 4),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the chat pipeline against the mock Google API.")
+    parser.add_argument("--endpoint", help="Base URL of a running mock server (default: start one in-process)")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per user")
+    parser.add_argument("--mix", choices=sorted(QUERY_MIXES), default="fast", help="Query mix")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max seconds a user waits between turns")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Warm each user's data with the sync scheduler when they sign in")
+    parser.add_argument("--first-turn-delay", type=float, default=0.0,
+                        help="Seconds between a user signing in and their first question")
+    parser.add_argument("--duplicates", type=int, default=1,
+                        help="Times each question is sent at once in its session (double clicks, reloads)")
+    parser.add_argument("--workers", type=int, default=64, help="Threads for blocking tool calls")
+    parser.add_argument("--model", help="Model spec for every agent, e.g. fake:2 or replay (default: LEARNBRIDGE_MODEL)")
+    parser.add_argument("--json", help="Also write the summary to this file")
+    add_scale_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = api = None
+    endpoint = args.endpoint
+    if not endpoint:
+        api = api_from_arguments(args)
+        server, endpoint = start_mock_server(api)
+        print(f"Started mock Google API on {endpoint}")
+
+    # Must be set before the first API client is built
+    os.environ["GOOGLE_API_ENDPOINT"] = endpoint
+    if args.model:
+        # Read when the agents are first imported
+        os.environ["LEARNBRIDGE_MODEL"] = args.model
+
+    user_ids = seed_users(args.users)
+
+    async def _run():
+        from concurrent.futures import ThreadPoolExecutor
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+        return await run_load(user_ids, args.turns, QUERY_MIXES[args.mix], args.think_time, args.seed,
+                              prefetch=args.prefetch, first_turn_delay=args.first_turn_delay,
+                              duplicates=args.duplicates)
+
+    try:
+        summary = asyncio.run(_run())
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if api is not None:
+        summary["google_api_requests"] = api.request_count
+
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if set(summary["statuses"]) <= {"ok"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
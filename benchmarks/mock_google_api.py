@@ -0,0 +1,388 @@
+"""
+Mock Google Classroom / Calendar API Server
+
+A local stand-in for the Google endpoints the app uses, serving synthetic data
+from benchmarks/fixtures.py with configurable scale, latency and error rate.
+
+Classroom: courses, announcements, courseWork, studentSubmissions, students, userProfiles
+Calendar:  events.list, events.insert, events.patch and batch requests
+
+Classroom responses honour the "fields" parameter (partial responses), so
+response sizes match what the real API would send. Every user teaches every
+course, so teacher mode (teacherId=me, all students' submissions) sees the
+whole fixture with students_per_course students per course.
+
+Usage:
+    python -m benchmarks.mock_google_api --port 8765 --courses 10 --items-per-course 50 --latency-ms 80
+
+Then point the app at it:
+    GOOGLE_API_ENDPOINT=http://localhost:8765/ streamlit run streamlit_app.py
+
+Each bearer token is treated as a separate user, so any stored token works.
+"""
+
+import argparse
+import email.parser
+import json
+import random
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from .fixtures import ClassroomFixture, generate_classroom
+
+DEFAULT_PAGE_SIZE = 100
+
+
+class MockGoogleAPI:
+    """The request handling logic, independent of the HTTP server."""
+
+    def __init__(self, fixture: ClassroomFixture, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, students_per_course: int = 30, seed: int = 0,
+                 calendar_timezone: str = "UTC"):
+        self.fixture = fixture
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.students_per_course = students_per_course
+        self.calendar_timezone = calendar_timezone
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._events: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.request_count = 0
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Optional[Dict[str, Any]],
+               user: str, simulate: bool = True) -> Tuple[int, Dict[str, Any]]:
+        """Route one API call, returning (status, JSON body)."""
+        if simulate and not self.simulate_request():
+            return 503, _error(503, "Mock backend unavailable.", "UNAVAILABLE")
+
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        try:
+            if parts[:1] == ["v1"]:
+                status, response = self._classroom(method, parts[1:], query, user)
+                if status == 200 and query.get("fields"):
+                    response = _select_fields(response, _parse_fields(query["fields"][0]))
+                return status, response
+            if parts[:2] == ["calendar", "v3"]:
+                return self._calendar(method, parts[2:], query, body, user)
+        except KeyError as e:
+            return 404, _error(404, f"Requested entity was not found: {e}", "NOT_FOUND")
+        return 404, _error(404, f"Unknown path {path}", "NOT_FOUND")
+
+    def simulate_request(self) -> bool:
+        """Count a request and apply the configured latency; False if it should fail."""
+        with self._lock:
+            self.request_count += 1
+            fail = self._rng.random() < self.error_rate
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+
+        if delay:
+            time.sleep(delay / 1000.0)
+        return not fail
+
+    # --- Classroom ---
+
+    def _classroom(self, method: str, parts: List[str], query: Dict[str, List[str]],
+                   user: str) -> Tuple[int, Dict[str, Any]]:
+        if method != "GET":
+            return 405, _error(405, "Read-only mock.", "METHOD_NOT_ALLOWED")
+
+        fixture = self.fixture
+        if parts == ["courses"]:
+            return 200, _page(fixture.courses, "courses", query)
+        if parts[:1] == ["userProfiles"] and len(parts) == 2:
+            user_id = user if parts[1] == "me" else parts[1]
+            return 200, {"id": user_id, "name": {"fullName": f"Student {user_id[:8]}"},
+                         "emailAddress": f"{user_id[:8]}@example.edu"}
+        if parts[:1] == ["courses"] and len(parts) == 3 and parts[2] == "announcements":
+            return 200, _page(fixture.announcements[parts[1]], "announcements", query)
+        if parts[:1] == ["courses"] and len(parts) == 4 and parts[2] == "announcements":
+            post = fixture.find_announcement(parts[1], parts[3])
+            if post is None:
+                raise KeyError(parts[3])
+            return 200, post
+        if parts[:1] == ["courses"] and len(parts) == 3 and parts[2] == "students":
+            if parts[1] not in fixture.coursework:
+                raise KeyError(parts[1])
+            students = [
+                {"courseId": parts[1], "userId": f"student-{n}",
+                 "profile": {"id": f"student-{n}", "name": {"fullName": f"Student {n}"}}}
+                for n in range(self.students_per_course)
+            ]
+            return 200, _page(students, "students", query)
+        if parts[:1] == ["courses"] and len(parts) == 3 and parts[2] == "courseWork":
+            return 200, _page(fixture.coursework[parts[1]], "courseWork", query)
+        if parts[:1] == ["courses"] and len(parts) == 4 and parts[2] == "courseWork":
+            item = fixture.find_coursework(parts[1], parts[3])
+            if item is None:
+                raise KeyError(parts[3])
+            return 200, item
+        if parts[:1] == ["courses"] and len(parts) == 5 and parts[4] == "studentSubmissions":
+            keys = self._submission_keys(parts[1], parts[3], query, user)
+            response = _page(keys, "studentSubmissions", query)
+            # Only the submissions on this page are generated
+            response["studentSubmissions"] = [
+                fixture.submission_for(student, parts[1], work_id) for student, work_id in response["studentSubmissions"]
+            ]
+            return 200, response
+        return 404, _error(404, "Unknown Classroom path", "NOT_FOUND")
+
+    def _submission_keys(self, course_id: str, course_work_id: str, query: Dict[str, List[str]],
+                         user: str) -> List[Tuple[str, str]]:
+        """(student, coursework id) of every submission a list request matches."""
+        if course_work_id == "-":
+            work_ids = [item["id"] for item in self.fixture.coursework[course_id]]
+        else:
+            if self.fixture.find_coursework(course_id, course_work_id) is None:
+                raise KeyError(course_work_id)
+            work_ids = [course_work_id]
+
+        user_id = query.get("userId", [None])[0]
+        if user_id == "me":
+            user_id = user
+        students = [user_id] if user_id else [f"student-{n}" for n in range(self.students_per_course)]
+        return [(student, work_id) for work_id in work_ids for student in students]
+
+    # --- Calendar ---
+
+    def _calendar(self, method: str, parts: List[str], query: Dict[str, List[str]],
+                  body: Optional[Dict[str, Any]], user: str) -> Tuple[int, Dict[str, Any]]:
+        if len(parts) < 3 or parts[0] != "calendars" or parts[2] != "events":
+            return 404, _error(404, "Unknown Calendar path", "NOT_FOUND")
+
+        with self._lock:
+            events = self._events.setdefault(f"{user}/{parts[1]}", {})
+
+            if method == "POST" and len(parts) == 3:
+                event = dict(body or {}, id=uuid.uuid4().hex, status="confirmed")
+                events[event["id"]] = event
+                return 200, event
+
+            if method in ("PATCH", "PUT") and len(parts) == 4:
+                event = events[parts[3]]
+                if method == "PUT":
+                    event = dict(body or {}, id=parts[3])
+                else:
+                    event.update(body or {})
+                events[parts[3]] = event
+                return 200, event
+
+            if method == "GET" and len(parts) == 3:
+                page = _page(self._filter_events(list(events.values()), query), "items", query)
+                return 200, dict(page, timeZone=self.calendar_timezone)
+
+        return 405, _error(405, "Unsupported Calendar call", "METHOD_NOT_ALLOWED")
+
+    @staticmethod
+    def _filter_events(events: List[Dict[str, Any]], query: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        for constraint in query.get("privateExtendedProperty", []):
+            key, _, value = constraint.partition("=")
+            events = [e for e in events
+                      if e.get("extendedProperties", {}).get("private", {}).get(key) == value]
+        time_min = query.get("timeMin", [None])[0]
+        time_max = query.get("timeMax", [None])[0]
+        if time_min:
+            events = [e for e in events if _event_start(e) >= time_min[:10]]
+        if time_max:
+            events = [e for e in events if _event_start(e) < time_max[:10]]
+        return sorted(events, key=_event_start)
+
+
+def _event_start(event: Dict[str, Any]) -> str:
+    start = event.get("start", {})
+    return start.get("date") or start.get("dateTime", "")[:10]
+
+
+def _page(items: List[Any], key: str, query: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Slice a list the way the API paginates it."""
+    size = int(query.get("pageSize", query.get("maxResults", [DEFAULT_PAGE_SIZE]))[0] or DEFAULT_PAGE_SIZE)
+    offset = int(query.get("pageToken", ["0"])[0] or 0)
+    response: Dict[str, Any] = {key: items[offset:offset + size]}
+    if offset + size < len(items):
+        response["nextPageToken"] = str(offset + size)
+    return response
+
+
+def _parse_fields(mask: str) -> Dict[str, Any]:
+    """Parse a partial response mask ("nextPageToken,items(id,title)") into {field: sub-mask or None}."""
+    def parse(pos: int) -> Tuple[Dict[str, Any], int]:
+        selected: Dict[str, Any] = {}
+        name = ""
+        while pos < len(mask):
+            char = mask[pos]
+            if char == "(":
+                selected[name.strip()], pos = parse(pos + 1)
+                name = ""
+            elif char == ")":
+                break
+            elif char == ",":
+                if name.strip():
+                    selected[name.strip()] = None
+                name = ""
+            else:
+                name += char
+            pos += 1
+        if name.strip():
+            selected[name.strip()] = None
+        return selected, pos
+
+    return parse(0)[0]
+
+
+def _select_fields(value: Any, selected: Dict[str, Any]) -> Any:
+    """Keep only the selected fields of a response (applied to each element of lists)."""
+    if isinstance(value, list):
+        return [_select_fields(item, selected) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: value[key] if sub is None else _select_fields(value[key], sub)
+        for key, sub in selected.items()
+        if key in value
+    }
+
+
+def _error(code: int, message: str, status: str) -> Dict[str, Any]:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    api: MockGoogleAPI = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients wait on delayed ACKs (~40 ms) for every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _user(self) -> str:
+        auth = self.headers.get("Authorization", "")
+        return auth.split(" ", 1)[1] if " " in auth else "anonymous"
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        raw = self._body()
+        if url.path.startswith("/batch/"):
+            self._batch(raw)
+            return
+        body = json.loads(raw) if raw else None
+        status, payload = self.api.handle(method, url.path, parse_qs(url.query), body, self._user())
+        self._send(status, "application/json", json.dumps(payload).encode())
+
+    def _batch(self, raw: bytes):
+        """Answer a multipart/mixed batch request, one part per call."""
+        # The batch is one HTTP request as far as latency and errors go
+        if not self.api.simulate_request():
+            self._send(503, "application/json",
+                       json.dumps(_error(503, "Mock backend unavailable.", "UNAVAILABLE")).encode())
+            return
+
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw
+        )
+        boundary = uuid.uuid4().hex
+        chunks = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, target, _ = request_line.strip().split(" ", 2)
+            headers, _, body = rest.replace("\r\n", "\n").partition("\n\n")
+            url = urlparse(target)
+            status, payload = self.api.handle(
+                method, url.path, parse_qs(url.query), json.loads(body) if body.strip() else None,
+                self._user(), simulate=False,
+            )
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        body = ("".join(chunks) + f"--{boundary}--\r\n").encode()
+        self._send(200, f"multipart/mixed; boundary={boundary}", body)
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+
+def start_mock_server(api: MockGoogleAPI, host: str = "127.0.0.1", port: int = 0):
+    """Serve the mock API on a background thread. Returns (server, base_url)."""
+    handler = type("MockGoogleAPIHandler", (_Handler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-google-api", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser):
+    """Command line options shared by the mock server and the load test."""
+    parser.add_argument("--courses", type=int, default=5, help="Courses per user")
+    parser.add_argument("--items-per-course", type=int, default=20, help="Coursework items per course")
+    parser.add_argument("--announcements-per-course", type=int, default=None,
+                        help="Announcements per course (default: same as items)")
+    parser.add_argument("--students-per-course", type=int, default=30, help="Roster size for wildcard submission lists")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Random extra latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data")
+
+
+def api_from_arguments(args: argparse.Namespace) -> MockGoogleAPI:
+    fixture = generate_classroom(
+        courses=args.courses,
+        items_per_course=args.items_per_course,
+        announcements_per_course=args.announcements_per_course,
+        seed=args.seed,
+    )
+    return MockGoogleAPI(
+        fixture,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        students_per_course=args.students_per_course,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Google Classroom/Calendar API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(api_from_arguments(args), host=args.host, port=args.port)
+    print(f"Mock Google API serving on {url} (set GOOGLE_API_ENDPOINT={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
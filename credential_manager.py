@@ -0,0 +1,211 @@
+"""
+Credential Manager
+
+This module keeps live OAuth Credentials objects per user and refreshes each
+access token in the background shortly before it expires, so user turns never
+wait on a token refresh round trip and parallel tools never refresh the same
+token twice.
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from google.auth.exceptions import RefreshError
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# Refresh this many seconds before the token expires
+REFRESH_MARGIN_SECONDS = 300
+
+# Wait this long before retrying a refresh that failed transiently
+RETRY_DELAY_SECONDS = 30
+
+# Number of refreshes that can run at the same time
+REFRESH_WORKERS = 4
+
+def credentials_to_info(credentials: "Credentials") -> Dict[str, Any]:
+    """Serialize credentials into the authorized-user dict we store."""
+    info = {
+        'token': credentials.token,
+        'refresh_token': credentials.refresh_token,
+        'token_uri': credentials.token_uri,
+        'client_id': credentials.client_id,
+        'client_secret': credentials.client_secret,
+        'scopes': credentials.scopes,
+    }
+    if credentials.expiry:
+        info['expiry'] = credentials.expiry.isoformat() + 'Z'
+    return info
+
+
+class CredentialManager:
+    """
+    Per-user cache of live Credentials with proactive background refresh.
+
+    A scheduler thread keeps a heap of (refresh_at, user_id) and hands due
+    refreshes to a small worker pool. Every refresh runs under the user's lock,
+    and each refreshed token is published through the on_refresh callback so it
+    can be written back to storage. When a load callback is given, the stored
+    token is checked first so a token another replica already refreshed is
+    adopted instead of refreshed again.
+    """
+
+    def __init__(
+        self,
+        scopes: List[str],
+        on_refresh: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None,
+        load: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+        refresh_margin: float = REFRESH_MARGIN_SECONDS,
+    ):
+        self.scopes = scopes
+        self.on_refresh = on_refresh
+        self.load = load
+        self.refresh_margin = refresh_margin
+
+        self._credentials: Dict[str, "Credentials"] = {}
+        self._user_locks: Dict[str, threading.Lock] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._next_refresh: Dict[str, float] = {}
+        self._wakeup = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="token-refresh")
+        self._scheduler: Optional[threading.Thread] = None
+
+    def register(self, user_id: str, info: Dict[str, Any]) -> "Credentials":
+        """Build live credentials from a stored dict and schedule their refresh."""
+        from google.oauth2.credentials import Credentials
+
+        credentials = Credentials.from_authorized_user_info(info, self._scopes_of(info))
+        with self._wakeup:
+            self._credentials[user_id] = credentials
+        self._schedule_refresh(user_id, credentials)
+        return credentials
+
+    def _scopes_of(self, info: Dict[str, Any]) -> List[str]:
+        # A token is refreshed with the scopes it was granted; asking for scopes
+        # added to the app since then would fail the refresh with invalid_scope
+        scopes = info.get('scopes')
+        if isinstance(scopes, str):
+            scopes = scopes.split(" ")
+        return scopes or self.scopes
+
+    def get(self, user_id: str) -> Optional["Credentials"]:
+        """
+        Get the live credentials for a user, or None if they are not registered.
+
+        The background refresh normally keeps the token valid. If it could not
+        (for example the scheduler fell behind), the token is refreshed here as a
+        last resort, still under the user's lock so only one caller refreshes.
+        """
+        credentials = self._credentials.get(user_id)
+        if credentials is not None and credentials.expired and credentials.refresh_token:
+            from opentelemetry import trace
+            with trace.get_tracer("learnbridge").start_as_current_span("credentials.refresh"):
+                self._refresh(user_id)
+            credentials = self._credentials.get(user_id)
+        return credentials
+
+    def forget(self, user_id: str):
+        """Drop a user's credentials (logout or revoked grant)."""
+        with self._wakeup:
+            self._credentials.pop(user_id, None)
+            self._user_locks.pop(user_id, None)
+            self._next_refresh.pop(user_id, None)
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        with self._wakeup:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.Lock()
+            return lock
+
+    def _schedule_refresh(self, user_id: str, credentials: "Credentials", delay: Optional[float] = None):
+        """Queue the next refresh for a user."""
+        if not credentials.refresh_token:
+            return
+
+        if delay is not None:
+            refresh_at = time.time() + delay
+        elif credentials.expiry is None:
+            # Unknown expiry: refresh right away to learn it
+            refresh_at = time.time()
+        else:
+            expires_at = (credentials.expiry - datetime.utcnow()).total_seconds() + time.time()
+            refresh_at = expires_at - self.refresh_margin
+
+        with self._wakeup:
+            # Only the latest entry per user counts, older heap entries are skipped
+            self._next_refresh[user_id] = refresh_at
+            heapq.heappush(self._schedule, (refresh_at, user_id))
+            if self._scheduler is None or not self._scheduler.is_alive():
+                self._scheduler = threading.Thread(target=self._run_scheduler, name="token-scheduler", daemon=True)
+                self._scheduler.start()
+            self._wakeup.notify()
+
+    def _run_scheduler(self):
+        """Hand due refreshes to the worker pool."""
+        while True:
+            with self._wakeup:
+                while not self._schedule or self._schedule[0][0] > time.time():
+                    timeout = self._schedule[0][0] - time.time() if self._schedule else None
+                    self._wakeup.wait(timeout)
+                refresh_at, user_id = heapq.heappop(self._schedule)
+                if self._next_refresh.get(user_id) != refresh_at:
+                    continue
+                del self._next_refresh[user_id]
+            self._pool.submit(self._refresh, user_id, True)
+
+    def _refresh(self, user_id: str, reschedule: bool = False):
+        """Refresh a user's token under their lock and publish the result."""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+
+        with self._user_lock(user_id):
+            credentials = self._credentials.get(user_id)
+            if credentials is None:
+                return
+
+            # Another replica may have refreshed and stored a newer token
+            if self.load is not None:
+                stored = self.load(user_id)
+                if stored and stored.get('token') != credentials.token:
+                    credentials = Credentials.from_authorized_user_info(stored, self._scopes_of(stored))
+                    self._credentials[user_id] = credentials
+
+            # Another caller may have refreshed while we waited for the lock
+            if credentials.expiry is not None:
+                remaining = (credentials.expiry - datetime.utcnow()).total_seconds()
+                if remaining > self.refresh_margin:
+                    if reschedule:
+                        self._schedule_refresh(user_id, credentials)
+                    return
+
+            try:
+                credentials.refresh(Request())
+            except RefreshError as e:
+                # The grant was revoked or expired, the user has to sign in again
+                print(f"Token refresh failed for user {user_id}: {e}")
+                self.forget(user_id)
+                self._publish(user_id, None)
+                return
+            except Exception as e:
+                print(f"Transient error refreshing token for user {user_id}: {e}")
+                if reschedule:
+                    self._schedule_refresh(user_id, credentials, delay=RETRY_DELAY_SECONDS)
+                return
+
+            self._publish(user_id, credentials_to_info(credentials))
+            if reschedule:
+                self._schedule_refresh(user_id, credentials)
+
+    def _publish(self, user_id: str, info: Optional[Dict[str, Any]]):
+        if self.on_refresh is None:
+            return
+        try:
+            self.on_refresh(user_id, info)
+        except Exception as e:
+            print(f"Error publishing refreshed credentials for user {user_id}: {e}")
@@ -0,0 +1,107 @@
+"""
+Instrumented Google API Requests
+
+Every Classroom and Calendar service is built with InstrumentedHttpRequest as
+its request class, so a single place sees each Google API call. Other modules
+register hooks here (rate limiting, tracing, accounting) instead of wrapping
+every call site.
+
+A hook is a callable taking the HttpRequest about to be executed and returning
+a context manager (or None) that is entered around the call. After the call the
+request carries `response_bytes` with the size of the response body.
+
+Calendar batches are built as InstrumentedBatchHttpRequest, which runs the same
+hooks around each batch HTTP request it sends: hooks see it as one POST to the
+batch endpoint, with its multipart body and response size.
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Callable, ContextManager, Iterator, List, Optional
+
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+
+RequestHook = Callable[[HttpRequest], Optional[ContextManager]]
+
+_hooks: List[RequestHook] = []
+_hooks_lock = threading.Lock()
+
+
+def register_request_hook(hook: RequestHook):
+    """Run a hook around every Google API request made from now on."""
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def unregister_request_hook(hook: RequestHook):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """HttpRequest that runs the registered hooks around execute()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response_bytes = 0
+
+        # Record the body size on the way through the response parser
+        postproc = self.postproc
+
+        def _measure(resp, content):
+            self.response_bytes = len(content or b"")
+            return postproc(resp, content)
+
+        self.postproc = _measure
+
+    def execute(self, http=None, num_retries=0):
+        with _run_hooks(self):
+            return super().execute(http=http, num_retries=num_retries)
+
+
+class InstrumentedBatchHttpRequest(BatchHttpRequest):
+    """BatchHttpRequest that runs the registered hooks around each HTTP request it sends."""
+
+    method = "POST"
+
+    def __init__(self, callback=None, batch_uri=None):
+        super().__init__(callback=callback, batch_uri=batch_uri)
+        self.uri = self._batch_uri
+        self.body = None
+        self.response_bytes = 0
+
+    def _execute(self, http, order, requests):
+        # Called once for the batch and again for calls retried after a 401
+        self.body = None
+        self.response_bytes = 0
+        with _run_hooks(self):
+            return super()._execute(_MeasuredHttp(http, self), order, requests)
+
+
+class _MeasuredHttp:
+    """Records the body and response size of the batch request sent through it."""
+
+    def __init__(self, http, request: InstrumentedBatchHttpRequest):
+        self._http = http
+        self._request = request
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self._request.body = body
+        resp, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+        self._request.response_bytes = len(content or b"")
+        return resp, content
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+@contextmanager
+def _run_hooks(request) -> Iterator[None]:
+    with ExitStack() as stack:
+        for hook in list(_hooks):
+            manager = hook(request)
+            if manager is not None:
+                stack.enter_context(manager)
+        yield
@@ -2,21 +2,28 @@
 OAuth Web Configuration for Public Deployment
 
 This module handles OAuth 2.0 web flow for multiple users in a deployed environment.
+It does not depend on Streamlit: callers pass the user ID explicitly.
+
+The OAuth and API client libraries are imported on first use, so the sign-in
+page does not wait for googleapiclient to load.
 """
 
 import os
 import json
-import base64
-import uuid
-from typing import Optional, Dict, Any
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import streamlit as st
-
-# OAuth 2.0 Configuration
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
+
+from credential_manager import CredentialManager, credentials_to_info
+from storage import get_credential_store
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import Flow
+    from googleapiclient.http import BatchHttpRequest
+
+# OAuth 2.0 Configuration. openid gets an ID token, whose verified subject
+# (the Google account id) is the app's user ID
 SCOPES = [
+    'openid',
     'https://www.googleapis.com/auth/classroom.announcements.readonly',
     'https://www.googleapis.com/auth/classroom.courses.readonly',
     'https://www.googleapis.com/auth/classroom.coursework.students.readonly',
@@ -24,14 +31,32 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar.events'
 ]
 
-def get_user_id():
-    """Get or create a unique user ID for the current session."""
-    if 'user_id' not in st.session_state:
-        st.session_state.user_id = str(uuid.uuid4())
-    return st.session_state.user_id
+# Requested on top of SCOPES only when a user turns on teacher mode: student
+# names for "who hasn't turned in"
+TEACHER_SCOPES = [
+    'https://www.googleapis.com/auth/classroom.rosters.readonly',
+]
+
+# The Calendar API's batch endpoint (its discovery document's batchPath)
+CALENDAR_BATCH_URI = 'https://www.googleapis.com/batch/calendar/v3'
+
+def _publish_refreshed_credentials(user_id: str, info: Optional[Dict[str, Any]]):
+    """Write a token refreshed (or revoked) by the credential manager back to the store."""
+    if info is None:
+        get_credential_store().delete(user_id)
+    else:
+        get_credential_store().put(user_id, info)
+
+credential_manager = CredentialManager(
+    SCOPES,
+    on_refresh=_publish_refreshed_credentials,
+    load=lambda user_id: get_credential_store().get(user_id),
+)
+
+def get_oauth_flow(scopes: Optional[List[str]] = None) -> "Flow":
+    """Create OAuth flow for web application (for SCOPES unless scopes are given)."""
+    from google_auth_oauthlib.flow import Flow
 
-def get_oauth_flow() -> Flow:
-    """Create OAuth flow for web application."""
     # Get client secrets from environment variable
     client_secrets_json = os.getenv('GOOGLE_CLIENT_SECRETS_JSON')
     if not client_secrets_json:
@@ -43,56 +68,47 @@ def get_oauth_flow() -> Flow:
     # Create flow
     flow = Flow.from_client_config(
         client_secrets,
-        scopes=SCOPES,
+        scopes=scopes or SCOPES,
         redirect_uri=os.getenv('OAUTH_REDIRECT_URI', 'https://your-app.streamlit.app/oauth2callback')
     )
     
     return flow
 
-def get_user_credentials(user_id: str) -> Optional[Credentials]:
-    """Get stored credentials for a specific user."""
-    if 'user_credentials' not in st.session_state:
-        st.session_state.user_credentials = {}
+def get_user_credentials(user_id: str) -> Optional["Credentials"]:
+    """Get live credentials for a specific user."""
+    # Reuse the live credentials object, refreshed in the background
+    creds = credential_manager.get(user_id)
+    if creds is not None:
+        return creds
     
-    user_creds = st.session_state.user_credentials.get(user_id)
+    # Another replica may have handled the login, load it from the shared store
+    user_creds = get_credential_store().get(user_id)
     if not user_creds:
         return None
     
     try:
-        # Create credentials object from stored data
-        creds = Credentials.from_authorized_user_info(user_creds, SCOPES)
-        
-        # Refresh if expired
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            # Update stored credentials
-            st.session_state.user_credentials[user_id] = {
-                'token': creds.token,
-                'refresh_token': creds.refresh_token,
-                'token_uri': creds.token_uri,
-                'client_id': creds.client_id,
-                'client_secret': creds.client_secret,
-                'scopes': creds.scopes
-            }
-        
-        return creds
+        return credential_manager.register(user_id, user_creds)
     except Exception as e:
-        st.error(f"Error loading credentials: {e}")
+        print(f"Error loading credentials: {e}")
         return None
 
-def store_user_credentials(user_id: str, credentials: Credentials):
+def store_user_credentials(user_id: str, credentials: "Credentials"):
     """Store credentials for a specific user."""
-    if 'user_credentials' not in st.session_state:
-        st.session_state.user_credentials = {}
-    
-    st.session_state.user_credentials[user_id] = {
-        'token': credentials.token,
-        'refresh_token': credentials.refresh_token,
-        'token_uri': credentials.token_uri,
-        'client_id': credentials.client_id,
-        'client_secret': credentials.client_secret,
-        'scopes': credentials.scopes
-    }
+    info = credentials_to_info(credentials)
+    get_credential_store().put(user_id, info)
+    credential_manager.register(user_id, info)
+
+def _api_endpoint(service_path: str) -> Optional[str]:
+    """
+    Endpoint override for the API clients.
+
+    Set GOOGLE_API_ENDPOINT (e.g. http://localhost:8765/, the mock server in
+    benchmarks/mock_google_api.py) to send every Google API request there.
+    """
+    root = os.getenv('GOOGLE_API_ENDPOINT')
+    if not root:
+        return None
+    return root.rstrip('/') + '/' + service_path
 
 def get_classroom_service(user_id: str):
     """Get Google Classroom service for a specific user."""
@@ -100,21 +116,72 @@ def get_classroom_service(user_id: str):
     if not credentials:
         return None
     
+    from googleapiclient.discovery import build
+    from google_requests import InstrumentedHttpRequest
+
     try:
-        service = build('classroom', 'v1', credentials=credentials)
+        endpoint = _api_endpoint('')
+        service = build(
+            'classroom', 'v1',
+            credentials=credentials,
+            requestBuilder=InstrumentedHttpRequest,
+            client_options={'api_endpoint': endpoint} if endpoint else None,
+        )
         return service
     except Exception as e:
-        st.error(f"Error creating Classroom service: {e}")
+        print(f"Error creating Classroom service: {e}")
         return None
 
+def get_calendar_service(user_id: str):
+    """Get Google Calendar service for a specific user."""
+    credentials = get_user_credentials(user_id)
+    if not credentials:
+        return None
+    
+    from googleapiclient.discovery import build
+    from google_requests import InstrumentedHttpRequest
+
+    try:
+        endpoint = _api_endpoint('calendar/v3/')
+        service = build(
+            'calendar', 'v3',
+            credentials=credentials,
+            requestBuilder=InstrumentedHttpRequest,
+            client_options={'api_endpoint': endpoint} if endpoint else None,
+        )
+        return service
+    except Exception as e:
+        print(f"Error creating Calendar service: {e}")
+        return None
+
+def new_calendar_batch(callback) -> "BatchHttpRequest":
+    """
+    Create a batch request for the Calendar API, honoring GOOGLE_API_ENDPOINT.
+    Like the services' requests it runs the request hooks, once per batch.
+    """
+    from google_requests import InstrumentedBatchHttpRequest
+
+    batch_uri = _api_endpoint('batch/calendar/v3') or CALENDAR_BATCH_URI
+    return InstrumentedBatchHttpRequest(callback=callback, batch_uri=batch_uri)
+
 def is_user_authenticated(user_id: str) -> bool:
     """Check if a user is authenticated."""
     return get_user_credentials(user_id) is not None
 
-def get_auth_url(user_id: str) -> str:
-    """Get OAuth authorization URL for a user."""
-    flow = get_oauth_flow()
-    flow.state = user_id  # Store user_id in state
+def has_scopes(user_id: str, scopes: List[str]) -> bool:
+    """Whether a user has granted all of scopes."""
+    credentials = get_user_credentials(user_id)
+    return credentials is not None and set(scopes) <= set(credentials.scopes or [])
+
+def get_auth_url(state: str, extra_scopes: Optional[List[str]] = None) -> str:
+    """
+    Get the OAuth authorization URL for one sign-in. state must be a fresh
+    value the callback can check (see auth_tokens.login_state), never a user ID.
+    extra_scopes are asked for on top of SCOPES (e.g. TEACHER_SCOPES); scopes
+    granted before are kept.
+    """
+    flow = get_oauth_flow(SCOPES + list(extra_scopes or []))
+    flow.state = state
     
     auth_url, _ = flow.authorization_url(
         access_type='offline',
@@ -123,17 +190,32 @@ def get_auth_url(user_id: str) -> str:
     
     return auth_url
 
-def handle_oauth_callback(code: str, state: str) -> bool:
-    """Handle OAuth callback and store credentials."""
+def google_user_id(credentials: "Credentials") -> str:
+    """The Google account id (sub) of the verified ID token that came with freshly issued credentials."""
+    from google.auth.transport.requests import Request
+    from google.oauth2 import id_token
+
+    if not credentials.id_token:
+        raise ValueError("No ID token was returned; is the openid scope granted?")
+    claims = id_token.verify_oauth2_token(credentials.id_token, Request(), credentials.client_id)
+    return claims["sub"]
+
+def handle_oauth_callback(code: str, scope: Optional[str] = None) -> Optional[str]:
+    """
+    Handle the OAuth callback: store the credentials under the user ID of the
+    Google account that signed in, and return it (None if it failed). The
+    caller checks the callback's state first. scope is the callback's scope
+    parameter: everything granted so far, which can be more than SCOPES.
+    """
     try:
-        flow = get_oauth_flow()
+        flow = get_oauth_flow(scope.split() if scope else None)
         flow.fetch_token(code=code)
         
-        # Store credentials for the user
-        user_id = state
+        # The same Google account is the same user in every browser
+        user_id = google_user_id(flow.credentials)
         store_user_credentials(user_id, flow.credentials)
         
-        return True
+        return user_id
     except Exception as e:
-        st.error(f"Error handling OAuth callback: {e}")
-        return False 
\ No newline at end of file
+        print(f"Error handling OAuth callback: {e}")
+        return None 
\ No newline at end of file
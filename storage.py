@@ -0,0 +1,225 @@
+"""
+Storage Backends
+
+This module provides the pluggable storage used for user OAuth credentials and
+ADK sessions, so the app can run as several replicas behind a load balancer
+without sticky sessions.
+
+The backend is selected with the LEARNBRIDGE_STORE_URL environment variable:
+    memory://                       In-process storage (default, single replica)
+    sqlite:////data/learnbridge.db  Shared SQLite file (several processes, one node)
+    postgresql://user:pw@host/db    Any SQLAlchemy URL (several nodes)
+
+The credential store talks to the database synchronously and ADK's session
+service asynchronously, so each gets the URL with a driver of its kind: a
+sqlite:// or postgresql:// URL (with or without a driver) works for both.
+
+Credentials in a database are encrypted at rest with the Fernet key(s) in
+LEARNBRIDGE_CREDENTIALS_KEY (comma separated, the first one encrypts); data
+snapshots (see system_root_agent/snapshots.py) use the same keys.
+"""
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+STORE_URL_ENV = "LEARNBRIDGE_STORE_URL"
+CREDENTIALS_KEY_ENV = "LEARNBRIDGE_CREDENTIALS_KEY"
+DEFAULT_STORE_URL = "memory://"
+
+# Drivers per database dialect: (sync, async)
+SQL_DRIVERS = {
+    "sqlite": ("pysqlite", "aiosqlite"),
+    "postgresql": ("psycopg2", "asyncpg"),
+    "mysql": ("pymysql", "aiomysql"),
+}
+
+
+class CredentialStore(ABC):
+    """Interface for storing each user's authorized-user credentials dict."""
+
+    @abstractmethod
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored credentials for a user, or None."""
+
+    @abstractmethod
+    def put(self, user_id: str, info: Dict[str, Any]):
+        """Create or replace the stored credentials for a user."""
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        """Remove a user's credentials."""
+
+    @abstractmethod
+    def list_user_ids(self) -> List[str]:
+        """Return the ids of all users with stored credentials."""
+
+
+class InMemoryCredentialStore(CredentialStore):
+    """Process-local credential store, also used as the test double."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            info = self._data.get(user_id)
+            return dict(info) if info else None
+
+    def put(self, user_id: str, info: Dict[str, Any]):
+        with self._lock:
+            self._data[user_id] = dict(info)
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def list_user_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._data)
+
+
+class TokenCipher:
+    """Fernet encryption for credentials and snapshots at rest, with key rotation support."""
+
+    def __init__(self, keys: List[str]):
+        from cryptography.fernet import Fernet, MultiFernet
+
+        if not keys:
+            raise ValueError(f"{CREDENTIALS_KEY_ENV} environment variable not set")
+        self._fernet = MultiFernet([Fernet(key.strip().encode()) for key in keys])
+
+    @classmethod
+    def from_env(cls) -> "TokenCipher":
+        keys = [key for key in os.getenv(CREDENTIALS_KEY_ENV, "").split(",") if key.strip()]
+        return cls(keys)
+
+    def encrypt(self, info: Dict[str, Any]) -> bytes:
+        return self._fernet.encrypt(json.dumps(info).encode())
+
+    def decrypt(self, payload: bytes) -> Dict[str, Any]:
+        return json.loads(self._fernet.decrypt(payload))
+
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        return self._fernet.encrypt(data)
+
+    def decrypt_bytes(self, payload: bytes) -> bytes:
+        """The plaintext of payload; ValueError if no key decrypts it."""
+        from cryptography.fernet import InvalidToken
+
+        try:
+            return self._fernet.decrypt(payload)
+        except InvalidToken:
+            raise ValueError("Payload cannot be decrypted with the configured keys") from None
+
+
+class SQLCredentialStore(CredentialStore):
+    """Encrypted credential store in any SQLAlchemy database (SQLite, Postgres, ...)."""
+
+    def __init__(self, db_url: str, cipher: TokenCipher):
+        from sqlalchemy import Column, Float, LargeBinary, MetaData, String, Table, create_engine, event
+
+        self._cipher = cipher
+        self._engine = create_engine(db_url, pool_pre_ping=True)
+
+        if self._engine.dialect.name == "sqlite":
+            # WAL lets several processes read while one writes
+            @event.listens_for(self._engine, "connect")
+            def _set_sqlite_pragmas(dbapi_connection, _):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+        metadata = MetaData()
+        self._table = Table(
+            "learnbridge_credentials",
+            metadata,
+            Column("user_id", String(128), primary_key=True),
+            Column("payload", LargeBinary, nullable=False),
+            Column("updated_at", Float, nullable=False),
+        )
+        metadata.create_all(self._engine)
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        from sqlalchemy import select
+
+        with self._engine.connect() as connection:
+            payload = connection.execute(
+                select(self._table.c.payload).where(self._table.c.user_id == user_id)
+            ).scalar()
+        return self._cipher.decrypt(payload) if payload else None
+
+    def put(self, user_id: str, info: Dict[str, Any]):
+        from sqlalchemy.exc import IntegrityError
+
+        values = {"payload": self._cipher.encrypt(info), "updated_at": time.time()}
+        with self._engine.begin() as connection:
+            updated = connection.execute(
+                self._table.update().where(self._table.c.user_id == user_id).values(**values)
+            ).rowcount
+            if updated:
+                return
+            try:
+                with connection.begin_nested():
+                    connection.execute(self._table.insert().values(user_id=user_id, **values))
+            except IntegrityError:
+                # Another replica inserted first
+                connection.execute(
+                    self._table.update().where(self._table.c.user_id == user_id).values(**values)
+                )
+
+    def delete(self, user_id: str):
+        with self._engine.begin() as connection:
+            connection.execute(self._table.delete().where(self._table.c.user_id == user_id))
+
+    def list_user_ids(self) -> List[str]:
+        from sqlalchemy import select
+
+        with self._engine.connect() as connection:
+            return list(connection.execute(select(self._table.c.user_id)).scalars())
+
+
+def get_store_url() -> str:
+    return os.getenv(STORE_URL_ENV, DEFAULT_STORE_URL)
+
+
+def sql_store_url(url: str, use_async: bool) -> str:
+    """
+    url with the sync or async driver of its dialect. A driver that works both
+    ways (e.g. postgresql+psycopg) and unknown dialects are left as they are.
+    """
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    dialect = parsed.get_backend_name()
+    drivers = SQL_DRIVERS.get(dialect)
+    if drivers is None or (parsed.get_driver_name() not in drivers and "+" in parsed.drivername):
+        return url
+    return parsed.set(drivername=f"{dialect}+{drivers[use_async]}").render_as_string(hide_password=False)
+
+
+@lru_cache(maxsize=None)
+def get_credential_store() -> CredentialStore:
+    """Get the process-wide credential store selected by LEARNBRIDGE_STORE_URL."""
+    url = get_store_url()
+    if url.startswith("memory://"):
+        return InMemoryCredentialStore()
+    return SQLCredentialStore(sql_store_url(url, use_async=False), TokenCipher.from_env())
+
+
+@lru_cache(maxsize=None)
+def get_session_service():
+    """Get the process-wide ADK session service selected by LEARNBRIDGE_STORE_URL."""
+    url = get_store_url()
+    if url.startswith("memory://"):
+        from google.adk.sessions import InMemorySessionService
+        return InMemorySessionService()
+
+    from google.adk.sessions import DatabaseSessionService
+    return DatabaseSessionService(db_url=sql_store_url(url, use_async=True))
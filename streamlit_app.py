@@ -10,27 +10,35 @@ import json
 from typing import Dict, Any
 import sys
 import os
-from datetime import datetime
-import uuid
+import threading
 
 # Add the system_root_agent to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'system_root_agent'))
 
-# Import ADK components
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-
-# Import the main system root agent
-from system_root_agent.agent import root_agent
-
-# Import OAuth configuration
+# Only what the sign-in page needs is imported up front; ADK, the agents and
+# googleapiclient load after authentication, and the agent graph is built on
+# the first chat message
 from oauth_web_config import (
+    TEACHER_SCOPES,
     is_user_authenticated, 
     get_auth_url, 
     handle_oauth_callback,
-    get_classroom_service
+    has_scopes,
 )
+from auth_tokens import (
+    SESSION_TTL_SECONDS,
+    check_login_state,
+    issue_session_token,
+    login_state,
+    new_login_id,
+    user_for_session_token,
+)
+from storage import get_session_service
+
+# Cookies: the signed session token of a signed-in browser, and the id that
+# binds a sign-in in progress to the browser that started it
+SESSION_COOKIE = "learnbridge_session"
+LOGIN_COOKIE = "learnbridge_login"
 
 # Page configuration
 st.set_page_config(
@@ -79,28 +87,90 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def get_user_id():
-    """Get or create a unique user ID for the current session."""
+    """
+    The signed-in user of this browser, or None.
+
+    The user is the Google account that signed in (its verified ID token
+    subject). The session cookie only holds a signed token the server issues
+    for it when the OAuth flow completes, so a reconnect that lands on a
+    different replica finds the same stored credentials and conversation.
+    """
     if 'user_id' not in st.session_state:
-        st.session_state.user_id = str(uuid.uuid4())
+        st.session_state.user_id = user_for_session_token(get_cookie(SESSION_COOKIE))
     return st.session_state.user_id
 
+def get_cookie(name: str):
+    """A cookie the browser sent, or None (also outside a browser, e.g. in AppTest)."""
+    value = st.context.cookies.get(name)
+    return value if isinstance(value, str) else None
+
+def set_cookie(name: str, value: str, max_age: int):
+    """Set a cookie in the browser (Streamlit has no server-side API for it)."""
+    st.iframe(f"""
+    <script>
+        const secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+        window.parent.document.cookie = {json.dumps(name)} + "=" + {json.dumps(value)}
+            + "; Max-Age={max_age}; Path=/; SameSite=Lax" + secure;
+    </script>
+    """, height=1)
+
+def run_async(coro):
+    """Run a coroutine to completion from the Streamlit script thread."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def messages_from_history(interaction_history):
+    """Rebuild the chat transcript from a stored interaction history."""
+    messages = []
+    for entry in interaction_history:
+        if entry.get("action") == "user_query":
+            messages.append({"role": "user", "content": entry.get("query", "")})
+        elif entry.get("action") == "agent_response":
+            messages.append({"role": "assistant", "content": entry.get("response", "")})
+    return messages
+
 def handle_oauth_callback_from_url():
     """Handle OAuth callback from URL parameters."""
     # Check if we have OAuth callback parameters
-    query_params = st.experimental_get_query_params()
-    code = query_params.get('code', [None])[0]
-    state = query_params.get('state', [None])[0]
+    code = st.query_params.get('code')
+    state = st.query_params.get('state')
+    scope = st.query_params.get('scope')
     
     if code and state:
-        # Handle the OAuth callback
-        if handle_oauth_callback(code, state):
+        st.query_params.clear()
+        # Only a sign-in this browser started, so nobody can sign someone
+        # else in with a callback URL of theirs
+        if not check_login_state(state, get_cookie(LOGIN_COOKIE)):
+            st.error("❌ This sign-in link has expired or was started in another browser. Please try again.")
+            return
+
+        # The user is the Google account that signed in, whoever used this browser before
+        user_id = handle_oauth_callback(code, scope)
+        if user_id:
+            # Start fetching the user's Classroom data while the chat page loads
+            from system_root_agent.sync import sync_scheduler
+            sync_scheduler.warm(user_id)
+            if st.session_state.get("user_id") != user_id:
+                # Another account's conversation must not carry over
+                for key in ("session_id", "messages", "api_token", "sync_started", "teacher_mode"):
+                    st.session_state.pop(key, None)
+            st.session_state.user_id = user_id
+            set_cookie(SESSION_COOKIE, issue_session_token(user_id), SESSION_TTL_SECONDS)
             st.success("✅ Authentication successful! You can now use the chatbot.")
-            # Clear the URL parameters
-            st.experimental_set_query_params()
-            st.rerun()
         else:
             st.error("❌ Authentication failed. Please try again.")
 
+def new_auth_url(extra_scopes=None):
+    """An OAuth URL with a fresh state per sign-in, bound to this browser's login cookie."""
+    login_id = get_cookie(LOGIN_COOKIE)
+    if not login_id:
+        login_id = st.session_state.setdefault("login_id", new_login_id())
+        set_cookie(LOGIN_COOKIE, login_id, SESSION_TTL_SECONDS)
+    return get_auth_url(login_state(login_id), extra_scopes)
+
 def show_authentication_page():
     """Show the authentication page."""
     st.title("🎓 LearnBridge")
@@ -117,11 +187,10 @@ def show_authentication_page():
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            user_id = get_user_id()
-            auth_url = get_auth_url(user_id)
+            auth_url = new_auth_url()
             st.markdown(f'''
             <div style="text-align: center; margin: 2rem 0;">
-                <a href="{auth_url}" target="_blank" style="
+                <a href="{auth_url}" target="_self" style="
                     display: inline-block;
                     background-color: #4285f4;
                     color: white;
@@ -139,112 +208,90 @@ def show_authentication_page():
     <div style="margin-top: 2rem; padding: 1rem; background-color: #1e1e1e; border-radius: 0.5rem;">
         <h4>🔒 Privacy & Security</h4>
         <ul>
-            <li>Your credentials are stored securely in your browser session</li>
+            <li>Your credentials are encrypted at rest and only used on your behalf</li>
             <li>We only access the data you authorize</li>
-            <li>No data is stored permanently on our servers</li>
+            <li>Your Classroom data is only cached to answer faster; copies saved to disk are encrypted and deleted within a day</li>
             <li>You can revoke access anytime from your Google Account settings</li>
         </ul>
     </div>
     """, unsafe_allow_html=True)
 
-# Initialize session state
-if "session_service" not in st.session_state:
-    st.session_state.session_service = InMemorySessionService()
-
-if "runner" not in st.session_state:
-    st.session_state.runner = Runner(
-        agent=root_agent,
-        app_name="Classroom ChatBot",
-        session_service=st.session_state.session_service,
-    )
-
-if "session_id" not in st.session_state:
-    # Create initial session
-    initial_state = {
-        "user_name": "Classroom User",
-        "courses_accessed": [],
-        "interaction_history": [],
-        "last_announcement_check": None,
-        "last_coursework_check": None,
-    }
-    
-    new_session = st.session_state.session_service.create_session_sync(
-        app_name="Classroom ChatBot",
-        user_id=get_user_id(),
-        state=initial_state,
-    )
-    st.session_state.session_id = new_session.id
-    print("DEBUG: type(new_session) =", type(new_session))
-
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
 # Handle OAuth callback
 handle_oauth_callback_from_url()
 
 # Check if user is authenticated
 user_id = get_user_id()
-if not is_user_authenticated(user_id):
+if not user_id or not is_user_authenticated(user_id):
     show_authentication_page()
     st.stop()
 
-def update_interaction_history(entry):
-    """Add an entry to the interaction history in state."""
-    try:
-        # Get current session
-        session = st.session_state.session_service.get_session_sync(
-            app_name="Classroom ChatBot",
-            user_id=st.session_state.user_id,
-            session_id=st.session_state.session_id
-        )
+# Signed in: load the chat page's dependencies
+from system_root_agent.accounting import start_metrics_server
+from system_root_agent.cancellation import CancellationToken
+from system_root_agent.profiling import PROFILE_MODES, profile_turn
+from system_root_agent.sync import sync_scheduler
+from system_root_agent.tracing import format_waterfall, turn_waterfall
+from system_root_agent.turns import APP_NAME, new_initial_state, run_turn
 
-        # Get current interaction history
-        interaction_history = session.state.get("interaction_history", [])
+# Serve Prometheus metrics when LEARNBRIDGE_METRICS_PORT is set (once per process)
+start_metrics_server()
 
-        # Add timestamp if not already present
-        if "timestamp" not in entry:
-            entry["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+@st.cache_resource(show_spinner="Starting the agents...")
+def get_runner():
+    """Build the agent graph and its runner once per process, on first use."""
+    from google.adk.runners import Runner
+    from system_root_agent.agent import root_agent
 
-        # Add the entry to interaction history
-        interaction_history.append(entry)
+    return Runner(
+        agent=root_agent,
+        app_name=APP_NAME,
+        session_service=get_session_service(),
+    )
 
-        # Create updated state
-        updated_state = session.state.copy()
-        updated_state["interaction_history"] = interaction_history
+# Initialize session state
+if "session_service" not in st.session_state:
+    st.session_state.session_service = get_session_service()
 
-        # Create a new session with updated state
-        st.session_state.session_service.create_session_sync(
-            app_name="Classroom ChatBot",
-            user_id=st.session_state.user_id,
-            session_id=st.session_state.session_id,
-            state=updated_state,
-        )
-    except Exception as e:
-        st.error(f"Error updating interaction history: {e}")
-
-def add_user_query_to_history(query):
-    """Add a user query to the interaction history."""
-    update_interaction_history({
-        "action": "user_query",
-        "query": query,
-    })
-
-def add_agent_response_to_history(agent_name, response):
-    """Add an agent response to the interaction history."""
-    update_interaction_history({
-        "action": "agent_response",
-        "agent": agent_name,
-        "response": response,
-    })
+if "session_id" not in st.session_state:
+    # Resume the user's latest conversation (possibly started on another
+    # replica), or create a new one
+    existing = run_async(st.session_state.session_service.list_sessions(
+        app_name=APP_NAME,
+        user_id=get_user_id(),
+    ))
+    sessions = sorted(existing.sessions, key=lambda s: s.last_update_time, reverse=True)
+    if sessions:
+        latest = run_async(st.session_state.session_service.get_session(
+            app_name=APP_NAME,
+            user_id=get_user_id(),
+            session_id=sessions[0].id,
+        ))
+        st.session_state.session_id = latest.id
+        st.session_state.messages = messages_from_history(latest.state.get("interaction_history", []))
+    else:
+        new_session = run_async(st.session_state.session_service.create_session(
+            app_name=APP_NAME,
+            user_id=get_user_id(),
+            state=new_initial_state(),
+        ))
+        st.session_state.session_id = new_session.id
+
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+
+if "sync_started" not in st.session_state:
+    # Keep the user's Classroom data warm in the background from now on
+    sync_scheduler.warm(get_user_id())
+    st.session_state.sync_started = True
 
 def display_current_state():
     """Display the current session state."""
     try:
-        session = st.session_state.session_service.get_session_sync(
-            app_name="Classroom ChatBot",
+        session = run_async(st.session_state.session_service.get_session(
+            app_name=APP_NAME,
             user_id=st.session_state.user_id,
             session_id=st.session_state.session_id
-        )
+        ))
 
         with st.expander("🔍 Current Session State", expanded=False):
             st.json(session.state)
@@ -265,42 +312,115 @@ def display_current_state():
     except Exception as e:
         st.error(f"Error displaying state: {e}")
 
-async def call_agent_async(query):
+def display_turn_trace():
+    """Display where the time of the last turn went."""
+    trace_id = st.session_state.get("last_trace_id")
+    if not trace_id:
+        return
+
+    with st.expander("⏱️ Last Turn Timing", expanded=False):
+        rows = turn_waterfall(trace_id)
+        if rows:
+            st.caption(f"Total: {rows[0]['duration_ms'] / 1000:.2f} s · trace {trace_id[:8]}")
+        usage = st.session_state.get("last_usage")
+        if usage:
+            st.caption(
+                f"Tokens: {usage['prompt_tokens']} prompt / {usage['completion_tokens']} completion · "
+                f"Google API requests: {sum(usage['api_requests'].values())} "
+                f"({sum(usage['bytes_received'].values()) / 1024:.0f} KB)"
+            )
+            if usage.get("models"):
+                models = ", ".join(f"{agent}: {model}" for agent, model in usage["models"].items())
+                st.caption(f"Models ({usage.get('complexity') or 'unclassified'} question): {models}")
+        st.code(format_waterfall(rows, width=24, name_width=36), language=None)
+
+def display_teacher_mode():
+    """Teacher mode asks for roster access (to name students) only once it is turned on."""
+    if not st.toggle("👩‍🏫 Teacher mode", key="teacher_mode",
+                     help="Class-wide answers for courses you teach, with student names"):
+        return
+    if has_scopes(st.session_state.user_id, TEACHER_SCOPES):
+        st.caption("✅ Class rosters are available.")
+        return
+    st.caption("To name the students who haven't turned in work, LearnBridge needs to read your class rosters.")
+    st.link_button("🔑 Allow roster access", new_auth_url(TEACHER_SCOPES))
+
+def display_profiling_controls():
+    """Per-session switch to profile turns, and the last profile for download."""
+    with st.expander("🔬 Profiling", expanded=False):
+        st.selectbox(
+            "Profile my next turns",
+            options=[None, *PROFILE_MODES],
+            format_func=lambda mode: "Off" if mode is None else mode,
+            key="profile_mode",
+        )
+        path = st.session_state.get("last_profile_path")
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button("⬇️ Download last profile", data=f.read(), file_name=os.path.basename(path))
+            st.caption("Folded stacks open in speedscope or flamegraph.pl; .prof files in snakeviz.")
+
+def assistant_message(response):
+    """A chat message for an answer, with when the Classroom data it used was fetched."""
+    return {"role": "assistant", "content": response, "data_as_of": st.session_state.get("last_data_as_of")}
+
+def display_data_as_of(message):
+    """Show how current the data behind an answer is."""
+    if message.get("data_as_of"):
+        st.caption(f"Classroom data as of {message['data_as_of'].replace('T', ' ')[:16]} UTC")
+
+# How often a running turn checks that its browser tab is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
+def cancel_turn_on_disconnect(token):
+    """
+    Watch the browser session while the turn of token runs, and cancel that
+    turn (never a newer one, e.g. from another tab) if the tab is closed or
+    loses its connection. Returns an Event that ends the watch.
+    """
+    stop = threading.Event()
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        runtime, browser_session = get_instance(), get_script_run_ctx().session_id
+    except Exception:
+        # Not running under the Streamlit server
+        return stop
+
+    def watch():
+        while not stop.wait(DISCONNECT_POLL_SECONDS):
+            if not runtime.is_active_session(browser_session):
+                token.cancel("disconnected")
+                return
+
+    threading.Thread(target=watch, daemon=True, name="learnbridge-disconnect").start()
+    return stop
+
+async def call_agent_async(query, token=None):
     """Call the agent asynchronously with the user's query."""
-    content = types.Content(role="user", parts=[types.Part(text=query)])
-    
-    # Add user query to history
-    add_user_query_to_history(query)
-    
-    final_response_text = None
-    agent_name = None
-
+    st.session_state.last_data_as_of = None
+    sync_scheduler.note_activity(st.session_state.user_id)
     try:
-        async for event in st.session_state.runner.run_async(
+        result = await run_turn(
+            get_runner(),
             user_id=st.session_state.user_id,
             session_id=st.session_state.session_id,
-            new_message=content
-        ):
-            # Capture the agent name from the event if available
-            if event.author:
-                agent_name = event.author
-
-            # Process the event
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if hasattr(part, "text") and part.text and not part.text.isspace():
-                        final_response_text = part.text.strip()
-                        break
-
+            query=query,
+            token=token,
+            # The sidebar toggle; off, the agent has no class-wide teacher tools
+            teacher_mode=bool(st.session_state.get("teacher_mode")),
+        )
     except Exception as e:
         st.error(f"Error during agent run: {e}")
         return f"❌ Error: {str(e)}"
 
-    # Add the agent response to interaction history if we got a final response
-    if final_response_text and agent_name:
-        add_agent_response_to_history(agent_name, final_response_text)
-
-    return final_response_text
+    st.session_state.last_trace_id = result.trace_id
+    st.session_state.last_usage = result.usage
+    st.session_state.last_data_as_of = result.data_as_of
+    if result.cancelled:
+        # Usually a newer message replaced this one, and this run is not shown anymore
+        return f"⏹️ Stopped ({result.cancelled})."
+    return result.text
 
 def get_agent_response_sync(query):
     """Synchronous wrapper for the async agent call."""
@@ -308,12 +428,37 @@ def get_agent_response_sync(query):
         # Run the async function in a new event loop
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(call_agent_async(query))
+        # A new message in this session cancels the turn (see stream_turn), closing the tab does too
+        token = CancellationToken(st.session_state.user_id, st.session_state.session_id)
+        watching = cancel_turn_on_disconnect(token)
+        try:
+            # Profile the whole turn when the session asked for it
+            with profile_turn(st.session_state.get("profile_mode"), owner=st.session_state.user_id) as profile:
+                response = loop.run_until_complete(call_agent_async(query, token))
+        finally:
+            watching.set()
         loop.close()
+        if profile is not None:
+            st.session_state.last_profile_path = profile.path
         return response
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
+def ask_quick_action(query):
+    """
+    Ask a sidebar question. Clicking again while it is being answered joins the
+    running turn (see run_turn), so the question and answer are shown once.
+    """
+    messages = st.session_state.messages
+    question = {"role": "user", "content": query}
+    if not messages or messages[-1] != question:
+        messages.append(question)
+    response = get_agent_response_sync(query)
+    # The other run of a double click may have added the answer already
+    if messages[-1] == question:
+        messages.append(assistant_message(response))
+    st.rerun()
+
 def main():
     """Main Streamlit app function."""
     
@@ -332,16 +477,10 @@ def main():
         
         st.header("💡 Quick Actions")
         if st.button("📢 Get Announcements"):
-            st.session_state.messages.append({"role": "user", "content": "Show me the latest announcements"})
-            response = get_agent_response_sync("Show me the latest announcements")
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.rerun()
+            ask_quick_action("Show me the latest announcements")
         
         if st.button("📚 Get Assignments"):
-            st.session_state.messages.append({"role": "user", "content": "What assignments are due?"})
-            response = get_agent_response_sync("What assignments are due?")
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.rerun()
+            ask_quick_action("What assignments are due?")
         
         if st.button("🗑️ Clear Chat"):
             st.session_state.messages = []
@@ -349,29 +488,29 @@ def main():
         
         if st.button("🔄 New Session"):
             # Create a new session
-            initial_state = {
-                "user_name": "Classroom User",
-                "courses_accessed": [],
-                "interaction_history": [],
-                "last_announcement_check": None,
-                "last_coursework_check": None,
-            }
-            
-            new_session = st.session_state.session_service.create_session_sync(
-                app_name="Classroom ChatBot",
+            new_session = run_async(st.session_state.session_service.create_session(
+                app_name=APP_NAME,
                 user_id=st.session_state.user_id,
-                state=initial_state,
-            )
+                state=new_initial_state(),
+            ))
             st.session_state.session_id = new_session.id
             st.session_state.messages = []
             st.rerun()
         
         st.header("🔧 Session Info")
         st.info(f"Session ID: {st.session_state.session_id[:8]}...")
-        st.info(f"User ID: {st.session_state.user_id}")
+
+        with st.expander("🔑 API access", expanded=False):
+            st.caption("Send this token as `Authorization: Bearer <token>` to the LearnBridge HTTP API. "
+                       "Anyone who has it can act as you until it expires in 30 days.")
+            st.code(st.session_state.setdefault("api_token", issue_session_token(st.session_state.user_id)),
+                    language=None)
         
         # Display current state
         display_current_state()
+        display_turn_trace()
+        display_teacher_mode()
+        display_profiling_controls()
     
     # Chat interface
     #st.header("💬 Start Chatting")
@@ -380,6 +519,7 @@ def main():
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            display_data_as_of(message)
     
     # Chat input
     if prompt := st.chat_input("Ask me about your Google Classroom..."):
@@ -395,7 +535,9 @@ def main():
             with st.spinner("🤖 AI Agent is thinking..."):
                 response = get_agent_response_sync(prompt)
                 st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                message = assistant_message(response)
+                display_data_as_of(message)
+                st.session_state.messages.append(message)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
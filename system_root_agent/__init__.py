@@ -7,7 +7,14 @@ and produces a comprehensive system health report.
 
 from dotenv import load_dotenv
 
-from .agent import root_agent
-
-# Load environment variables from .env file
+# Load environment variables from .env file (before the agents read their model settings)
 load_dotenv()
+
+
+def __getattr__(name):
+    # Build the agent graph on first use, so importing a submodule (turns,
+    # tracing, accounting, ...) does not load ADK and every agent
+    if name == "root_agent":
+        from .agent import root_agent
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
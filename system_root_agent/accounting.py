@@ -0,0 +1,410 @@
+"""
+Usage Accounting
+
+This module counts what each turn costs: Gemini prompt and completion tokens
+per agent and per model (from the usage_metadata on ADK events, and the model
+routing tags on them), and Google API requests and
+bytes per API (through the request hook in google_requests). Each turn's usage
+is returned with the turn and added to rolling per-user and global aggregates,
+which are exported in the Prometheus text format.
+
+Any process can serve the metrics: the HTTP API exposes /metrics, and setting
+LEARNBRIDGE_METRICS_PORT starts a small metrics server (used by the Streamlit app),
+on localhost unless LEARNBRIDGE_METRICS_HOST says otherwise. Scrapers send
+LEARNBRIDGE_METRICS_TOKEN as "Authorization: Bearer <token>"; the HTTP API
+serves no metrics without it. Users appear in the per-user series only as a
+hash of their ID (metrics_user_label).
+"""
+
+import contextvars
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from google_requests import register_request_hook
+
+# Turns kept per user (and globally) for the rolling averages
+ROLLING_TURNS_PER_USER = 50
+ROLLING_TURNS_GLOBAL = 1000
+
+# Users whose recent turns are kept; the least recently active are dropped first
+ROLLING_USERS = 10_000
+
+# Per-user series are exported only for the most expensive users
+METRICS_TOP_USERS = 20
+
+METRICS_PORT_ENV = "LEARNBRIDGE_METRICS_PORT"
+METRICS_HOST_ENV = "LEARNBRIDGE_METRICS_HOST"
+METRICS_TOKEN_ENV = "LEARNBRIDGE_METRICS_TOKEN"
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+def _api_name(uri: str) -> str:
+    path = urlparse(uri).path
+    return "calendar" if "/calendar/" in path else "classroom"
+
+
+@dataclass
+class TurnUsage:
+    """Tokens and API traffic of one turn."""
+    prompt_tokens: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    completion_tokens: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    api_requests: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    bytes_sent: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    bytes_received: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # (model, "prompt" | "completion") -> tokens
+    model_tokens: Dict[tuple, int] = field(default_factory=lambda: defaultdict(int))
+    # Agent -> the model that served its last call
+    models: Dict[str, str] = field(default_factory=dict)
+    model_fallbacks: int = 0
+    fast_path: bool = False
+    complexity: Optional[str] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_tokens(self, agent: str, prompt: int, completion: int, model: Optional[str] = None,
+                   fallback: bool = False):
+        with self._lock:
+            self.prompt_tokens[agent] += prompt
+            self.completion_tokens[agent] += completion
+            if model:
+                self.model_tokens[(model, "prompt")] += prompt
+                self.model_tokens[(model, "completion")] += completion
+                self.models[agent] = model
+            if fallback:
+                self.model_fallbacks += 1
+
+    def add_request(self, api: str, sent: int, received: int):
+        # Tools of one turn run in parallel threads
+        with self._lock:
+            self.api_requests[api] += 1
+            self.bytes_sent[api] += sent
+            self.bytes_received[api] += received
+
+    @property
+    def total_prompt_tokens(self) -> int:
+        return sum(self.prompt_tokens.values())
+
+    @property
+    def total_completion_tokens(self) -> int:
+        return sum(self.completion_tokens.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompt_tokens": self.total_prompt_tokens,
+                "completion_tokens": self.total_completion_tokens,
+                "tokens_by_agent": {
+                    agent: {"prompt": self.prompt_tokens[agent], "completion": self.completion_tokens[agent]}
+                    for agent in sorted(set(self.prompt_tokens) | set(self.completion_tokens))
+                },
+                "fast_path": self.fast_path,
+                "complexity": self.complexity,
+                "models": dict(self.models),
+                "tokens_by_model": {
+                    model: {"prompt": self.model_tokens[(model, "prompt")],
+                            "completion": self.model_tokens[(model, "completion")]}
+                    for model in sorted({model for model, _ in self.model_tokens})
+                },
+                "model_fallbacks": self.model_fallbacks,
+                "api_requests": dict(self.api_requests),
+                "bytes_sent": dict(self.bytes_sent),
+                "bytes_received": dict(self.bytes_received),
+            }
+
+
+@dataclass
+class _TurnSample:
+    prompt_tokens: int
+    completion_tokens: int
+    api_requests: int
+    seconds: float
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_labels(**labels: str) -> str:
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def metrics_user_label(user_id: str) -> str:
+    """How a user appears in the metrics: a hash, so a scrape reveals no user IDs."""
+    return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+
+
+def metrics_authorized(authorization: Optional[str]) -> bool:
+    """Whether an Authorization header carries LEARNBRIDGE_METRICS_TOKEN (False if it is not set)."""
+    token = os.getenv(METRICS_TOKEN_ENV)
+    return bool(token) and hmac.compare_digest(authorization or "", f"Bearer {token}")
+
+
+class UsageAggregator:
+    """Process-wide totals plus rolling windows of recent turns per user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns: Dict[str, int] = defaultdict(int)
+        self.turn_seconds = 0.0
+        self.tokens: Dict[tuple, int] = defaultdict(int)
+        self.model_tokens: Dict[tuple, int] = defaultdict(int)
+        self.model_fallbacks = 0
+        self.api_requests: Dict[str, int] = defaultdict(int)
+        self.api_bytes: Dict[tuple, int] = defaultdict(int)
+        self._recent: Deque[_TurnSample] = deque(maxlen=ROLLING_TURNS_GLOBAL)
+        self._recent_by_user: "OrderedDict[str, Deque[_TurnSample]]" = OrderedDict()
+
+    def record_request(self, api: str, sent: int, received: int):
+        """Count an API request made outside of any turn (e.g. a background sync)."""
+        with self._lock:
+            self.api_requests[api] += 1
+            self.api_bytes[(api, "sent")] += sent
+            self.api_bytes[(api, "received")] += received
+
+    def record_turn(self, user_id: str, usage: TurnUsage, seconds: float):
+        sample = _TurnSample(
+            prompt_tokens=usage.total_prompt_tokens,
+            completion_tokens=usage.total_completion_tokens,
+            api_requests=sum(usage.api_requests.values()),
+            seconds=seconds,
+        )
+        with self._lock:
+            self.turns["true" if usage.fast_path else "false"] += 1
+            self.turn_seconds += seconds
+            for agent, count in usage.prompt_tokens.items():
+                self.tokens[(agent, "prompt")] += count
+            for agent, count in usage.completion_tokens.items():
+                self.tokens[(agent, "completion")] += count
+            for key, count in usage.model_tokens.items():
+                self.model_tokens[key] += count
+            self.model_fallbacks += usage.model_fallbacks
+            for api, count in usage.api_requests.items():
+                self.api_requests[api] += count
+            for api, count in usage.bytes_sent.items():
+                self.api_bytes[(api, "sent")] += count
+            for api, count in usage.bytes_received.items():
+                self.api_bytes[(api, "received")] += count
+
+            self._recent.append(sample)
+            recent = self._recent_by_user.get(user_id)
+            if recent is None:
+                recent = self._recent_by_user[user_id] = deque(maxlen=ROLLING_TURNS_PER_USER)
+                if len(self._recent_by_user) > ROLLING_USERS:
+                    self._recent_by_user.popitem(last=False)
+            else:
+                self._recent_by_user.move_to_end(user_id)
+            recent.append(sample)
+
+    @staticmethod
+    def _averages(samples: List[_TurnSample]) -> Dict[str, float]:
+        count = len(samples) or 1
+        return {
+            "turns": len(samples),
+            "prompt_tokens": sum(s.prompt_tokens for s in samples) / count,
+            "completion_tokens": sum(s.completion_tokens for s in samples) / count,
+            "api_requests": sum(s.api_requests for s in samples) / count,
+            "seconds": sum(s.seconds for s in samples) / count,
+        }
+
+    def user_summary(self, user_id: str) -> Dict[str, float]:
+        """Per-turn averages over the user's recent turns."""
+        with self._lock:
+            return self._averages(list(self._recent_by_user.get(user_id, ())))
+
+    def global_summary(self) -> Dict[str, float]:
+        with self._lock:
+            return self._averages(list(self._recent))
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            recent = list(self._recent)
+            by_user = {user_id: list(samples) for user_id, samples in self._recent_by_user.items()}
+            lines = [
+                "# HELP learnbridge_turns_total Chat turns served.",
+                "# TYPE learnbridge_turns_total counter",
+            ]
+            lines += [f"learnbridge_turns_total{_metric_labels(fast_path=k)} {v}" for k, v in sorted(self.turns.items())]
+            lines += [
+                "# HELP learnbridge_turn_seconds Time spent serving turns.",
+                "# TYPE learnbridge_turn_seconds summary",
+                f"learnbridge_turn_seconds_sum {self.turn_seconds:.6f}",
+                f"learnbridge_turn_seconds_count {sum(self.turns.values())}",
+                "# HELP learnbridge_llm_tokens_total Model tokens by agent and kind.",
+                "# TYPE learnbridge_llm_tokens_total counter",
+            ]
+            lines += [
+                f"learnbridge_llm_tokens_total{_metric_labels(agent=agent, kind=kind)} {v}"
+                for (agent, kind), v in sorted(self.tokens.items())
+            ]
+            lines += [
+                "# HELP learnbridge_llm_model_tokens_total Model tokens by model and kind.",
+                "# TYPE learnbridge_llm_model_tokens_total counter",
+            ]
+            lines += [
+                f"learnbridge_llm_model_tokens_total{_metric_labels(model=model, kind=kind)} {v}"
+                for (model, kind), v in sorted(self.model_tokens.items())
+            ]
+            lines += [
+                "# HELP learnbridge_llm_fallbacks_total Model calls answered by the fallback model.",
+                "# TYPE learnbridge_llm_fallbacks_total counter",
+                f"learnbridge_llm_fallbacks_total {self.model_fallbacks}",
+            ]
+            lines += [
+                "# HELP learnbridge_google_api_requests_total Google API requests by API.",
+                "# TYPE learnbridge_google_api_requests_total counter",
+            ]
+            lines += [
+                f"learnbridge_google_api_requests_total{_metric_labels(api=api)} {v}"
+                for api, v in sorted(self.api_requests.items())
+            ]
+            lines += [
+                "# HELP learnbridge_google_api_bytes_total Google API bytes by API and direction.",
+                "# TYPE learnbridge_google_api_bytes_total counter",
+            ]
+            lines += [
+                f"learnbridge_google_api_bytes_total{_metric_labels(api=api, direction=direction)} {v}"
+                for (api, direction), v in sorted(self.api_bytes.items())
+            ]
+
+        averages = self._averages(recent)
+        lines += [
+            f"# HELP learnbridge_recent_turn_prompt_tokens Mean prompt tokens per turn over the last {ROLLING_TURNS_GLOBAL} turns.",
+            "# TYPE learnbridge_recent_turn_prompt_tokens gauge",
+            f"learnbridge_recent_turn_prompt_tokens {averages['prompt_tokens']:.1f}",
+            "# HELP learnbridge_recent_turn_api_requests Mean Google API requests per turn over recent turns.",
+            "# TYPE learnbridge_recent_turn_api_requests gauge",
+            f"learnbridge_recent_turn_api_requests {averages['api_requests']:.1f}",
+        ]
+
+        # Only the heaviest users, to keep the series count bounded
+        user_averages = sorted(
+            ((user_id, self._averages(samples)) for user_id, samples in by_user.items()),
+            key=lambda item: item[1]["prompt_tokens"],
+            reverse=True,
+        )[:METRICS_TOP_USERS]
+        lines += [
+            f"# HELP learnbridge_user_turn_prompt_tokens Mean prompt tokens per turn over a user's last "
+            f"{ROLLING_TURNS_PER_USER} turns (top {METRICS_TOP_USERS} users).",
+            "# TYPE learnbridge_user_turn_prompt_tokens gauge",
+        ]
+        lines += [
+            f"learnbridge_user_turn_prompt_tokens{_metric_labels(user=metrics_user_label(user_id))} {avg['prompt_tokens']:.1f}"
+            for user_id, avg in user_averages
+        ]
+        lines += [
+            "# HELP learnbridge_user_turn_api_requests Mean Google API requests per turn over a user's recent turns.",
+            "# TYPE learnbridge_user_turn_api_requests gauge",
+        ]
+        lines += [
+            f"learnbridge_user_turn_api_requests{_metric_labels(user=metrics_user_label(user_id))} {avg['api_requests']:.1f}"
+            for user_id, avg in user_averages
+        ]
+        return "\n".join(lines) + "\n"
+
+
+usage_aggregator = UsageAggregator()
+
+_current_usage: contextvars.ContextVar[Optional[TurnUsage]] = contextvars.ContextVar(
+    "learnbridge_turn_usage", default=None
+)
+
+
+@contextmanager
+def _count_google_request(request) -> Iterator[None]:
+    """Attribute one Google API request to the turn making it."""
+    try:
+        yield
+    finally:
+        api = _api_name(request.uri)
+        body = request.body or b""
+        sent = len(body.encode() if isinstance(body, str) else body)
+        usage = _current_usage.get()
+        if usage is not None:
+            usage.add_request(api, sent, request.response_bytes)
+        else:
+            usage_aggregator.record_request(api, sent, request.response_bytes)
+
+
+register_request_hook(_count_google_request)
+
+
+@contextmanager
+def turn_usage(user_id: str) -> Iterator[TurnUsage]:
+    """Collect the usage of one turn and add it to the aggregates at the end."""
+    usage = TurnUsage()
+    token = _current_usage.set(usage)
+    started = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        usage_aggregator.record_turn(user_id, usage, time.perf_counter() - started)
+
+
+def record_event_usage(usage: TurnUsage, event) -> None:
+    """Add the token counts of a final (non-partial) ADK event, and the model that served it."""
+    metadata = getattr(event, "usage_metadata", None)
+    if metadata is None or event.partial:
+        return
+    # Set by RoutedLlm, see routing.py
+    routing = getattr(event, "custom_metadata", None) or {}
+    usage.add_tokens(
+        event.author or "unknown",
+        metadata.prompt_token_count or 0,
+        metadata.candidates_token_count or 0,
+        model=routing.get("model") or getattr(event, "model_version", None),
+        fallback=bool(routing.get("fallback")),
+    )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        # Without a token only local scrapers can reach it (see start_metrics_server)
+        if os.getenv(METRICS_TOKEN_ENV) and not metrics_authorized(self.headers.get("Authorization")):
+            self.send_error(403)
+            return
+        body = usage_aggregator.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on a background thread, once per process (port from
+    LEARNBRIDGE_METRICS_PORT, interface from LEARNBRIDGE_METRICS_HOST, localhost by default).
+    """
+    global _metrics_server
+    if port is None:
+        if not os.getenv(METRICS_PORT_ENV):
+            return None
+        port = int(os.environ[METRICS_PORT_ENV])
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            host = os.getenv(METRICS_HOST_ENV, DEFAULT_METRICS_HOST)
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+    return _metrics_server
@@ -0,0 +1,214 @@
+"""
+Batch Digest Mode
+
+Generates the weekly "what's due / what's new" digest for many users in
+parallel, running the same gather + analyze pipeline as a chat turn.
+
+Usage:
+    python -m system_root_agent.batch --output digests.jsonl
+    python -m system_root_agent.batch --users users.txt --workers 16 --api-rps 20
+
+Users come from --users (one user ID per line) or, by default, every user in
+the credential store. Results are appended to the output JSONL as each user
+finishes; the file doubles as the checkpoint, so rerunning the same command
+skips users that already have a digest.
+
+Digests are read-only turns: nothing is written to anyone's Google account
+(no calendar sync). Besides the Google API budget (--api-rps), a run stops
+spending model tokens once --max-tokens is used up: digests still running are
+cancelled and the remaining users are skipped, so a rerun picks them up.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from google_requests import register_request_hook, unregister_request_hook
+from oauth_web_config import is_user_authenticated
+from storage import get_credential_store
+
+from .agent import root_agent
+from .cancellation import CancellationToken
+from .ratelimit import RateLimiter
+from .turns import APP_NAME, new_initial_state, run_turn
+
+DIGEST_PROMPT = (
+    "Write my weekly digest. List everything due in the next 7 days, anything "
+    "overdue that I have not turned in, and summarize the announcements posted "
+    "in the last 7 days, grouped by course."
+)
+
+# Model tokens (prompt and completion) one run may spend across all users
+DEFAULT_MAX_TOKENS = 10_000_000
+
+
+def load_user_ids(users_file: Optional[str] = None) -> List[str]:
+    """Read user IDs from a file, or list every user with stored credentials."""
+    if users_file:
+        with open(users_file) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return get_credential_store().list_user_ids()
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """User IDs that already have a successful digest in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if record.get("status") == "success":
+                done.add(record["user_id"])
+    return done
+
+
+class DigestRunner:
+    """Runs digests on a thread pool under a global API request budget and a model token budget."""
+
+    def __init__(self, output_path: str, workers: int, api_rps: float, prompt: str = DIGEST_PROMPT,
+                 max_tokens: int = DEFAULT_MAX_TOKENS):
+        self.output_path = output_path
+        self.workers = workers
+        self.prompt = prompt
+        self.api_limiter = RateLimiter(api_rps, burst=api_rps)
+        self.max_tokens = max_tokens
+        self.tokens_spent = 0
+        # Digests in progress, cancelled when the token budget runs out
+        self._running: Dict[str, CancellationToken] = {}
+        self._budget_lock = threading.Lock()
+
+        # One runner for all workers; each digest uses a throwaway session
+        self.session_service = InMemorySessionService()
+        self.runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=self.session_service)
+
+        self._output_lock = threading.Lock()
+
+    @contextmanager
+    def _throttle(self, request):
+        # Every Classroom/Calendar request of every worker draws from one budget
+        self.api_limiter.acquire()
+        yield
+
+    def run(self, user_ids: Iterable[str]) -> Dict[str, int]:
+        """Generate digests for the users, returning counts by status."""
+        register_request_hook(self._throttle)
+        counts: Dict[str, int] = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="digest") as pool:
+                futures = [pool.submit(self._digest_for_user, user_id) for user_id in user_ids]
+                for future in as_completed(futures):
+                    record = future.result()
+                    self._write(record)
+                    counts[record["status"]] = counts.get(record["status"], 0) + 1
+                    print(f"[{sum(counts.values())}/{len(futures)}] {record['user_id']}: {record['status']}")
+        finally:
+            unregister_request_hook(self._throttle)
+
+        return counts
+
+    def _digest_for_user(self, user_id: str) -> Dict[str, Any]:
+        started = time.time()
+        record: Dict[str, Any] = {"user_id": user_id, "started_at": started}
+
+        token = CancellationToken(user_id)
+        with self._budget_lock:
+            if self.tokens_spent >= self.max_tokens:
+                record.update(status="skipped", error="The token budget of this run is spent.")
+                return record
+            self._running[user_id] = token
+
+        try:
+            if not is_user_authenticated(user_id):
+                record.update(status="skipped", error="No valid stored credentials.")
+                return record
+
+            result = asyncio.run(self._run_turn(user_id, token))
+            if result.usage:
+                self._spend(result.usage["prompt_tokens"] + result.usage["completion_tokens"])
+            if result.cancelled:
+                record.update(status="skipped", error=f"Stopped ({result.cancelled}).")
+            elif result.text:
+                record.update(status="success", digest=result.text, agent=result.agent, usage=result.usage,
+                              data_as_of=result.data_as_of)
+            else:
+                record.update(status="error", error="The agent returned no answer.")
+        except Exception as e:
+            record.update(status="error", error=str(e))
+        finally:
+            with self._budget_lock:
+                self._running.pop(user_id, None)
+
+        record["elapsed_seconds"] = round(time.time() - started, 3)
+        return record
+
+    def _spend(self, tokens: int):
+        """Count a finished digest's tokens, stopping the run's digests once the budget is used up."""
+        with self._budget_lock:
+            self.tokens_spent += tokens
+            if self.tokens_spent < self.max_tokens:
+                return
+            running = list(self._running.values())
+        for token in running:
+            token.cancel("token budget spent")
+
+    async def _run_turn(self, user_id: str, token: CancellationToken):
+        session = await self.session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, state=new_initial_state()
+        )
+        try:
+            # A digest only reads: it must not add events to the user's calendar
+            return await run_turn(self.runner, user_id, session.id, self.prompt, token, read_only=True)
+        finally:
+            await self.session_service.delete_session(
+                app_name=APP_NAME, user_id=user_id, session_id=session.id
+            )
+
+    def _write(self, record: Dict[str, Any]):
+        # Append and flush per user so an interrupted run can resume
+        with self._output_lock, open(self.output_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate weekly digests for many users.")
+    parser.add_argument("--users", help="File with one user ID per line (default: every stored user)")
+    parser.add_argument("--output", default="digests.jsonl", help="JSONL output and checkpoint file")
+    parser.add_argument("--workers", type=int, default=8, help="Users processed concurrently")
+    parser.add_argument("--api-rps", type=float, default=10.0,
+                        help="Google API requests per second across all workers")
+    parser.add_argument("--prompt", default=DIGEST_PROMPT, help="Digest question asked for each user")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help="Model tokens the whole run may spend; the rest of the users are skipped")
+    args = parser.parse_args(argv)
+
+    user_ids = load_user_ids(args.users)
+    done = load_checkpoint(args.output)
+    pending = [user_id for user_id in user_ids if user_id not in done]
+    print(f"{len(user_ids)} users, {len(done)} already done, {len(pending)} to process")
+
+    runner = DigestRunner(args.output, workers=args.workers, api_rps=args.api_rps, prompt=args.prompt,
+                          max_tokens=args.max_tokens)
+    counts = runner.run(pending)
+    print(f"Finished: {counts}, {runner.tokens_spent} model tokens")
+    return 0 if not counts.get("error") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
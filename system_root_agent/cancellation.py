@@ -0,0 +1,139 @@
+"""
+Turn Cancellation
+
+A turn nobody will see the answer of is stopped instead of run to the end.
+Every turn gets a CancellationToken (in its request context), and the
+pipeline checks it between units of work: pages of an API list, courses,
+tool calls, model calls and calendar batches (see check_cancelled in
+context.py). Cancellation is cooperative: the unit in progress finishes, the
+next one raises TurnCancelled, and the turn ends with a "cancelled" update.
+
+Tokens are cancelled:
+    by a newer turn in the same session  ("superseded")
+    when the client goes away            ("disconnected")
+    by an operator                       ("admin")
+
+Data a cancelled turn was fetching is not cached, and turns or background
+refreshes that were waiting for that fetch fetch it themselves.
+"""
+
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class TurnCancelled(Exception):
+    """The turn was cancelled; raised at the next check after cancel()."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Turn cancelled ({reason})")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Cancelled at most once, from any thread; work checks it between steps."""
+
+    def __init__(self, user_id: Optional[str] = None, session_id: Optional[str] = None):
+        self.turn_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        """Cancel the turn; returns False if it was already cancelled."""
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self.cancelled_at = time.time()
+        self._event.set()
+        return True
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TurnCancelled(self.reason or "cancelled")
+
+    def __getstate__(self):
+        # A copy in a process pool worker keeps the state at the time of the call
+        state = dict(self.__dict__)
+        state["_event"] = self._event.is_set()
+        return state
+
+    def __setstate__(self, state):
+        cancelled = state.pop("_event")
+        self.__dict__.update(state)
+        self._event = threading.Event()
+        if cancelled:
+            self._event.set()
+
+
+class TurnRegistry:
+    """The running turns of this process, one per session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: Dict[Tuple[str, str], CancellationToken] = {}
+
+    def start(self, user_id: str, session_id: str,
+              token: Optional[CancellationToken] = None) -> CancellationToken:
+        """
+        Register a session's new turn, cancelling the one it supersedes. A
+        caller that made the turn's token beforehand (to cancel exactly this
+        turn later) passes it in.
+        """
+        if token is None:
+            token = CancellationToken(user_id, session_id)
+        else:
+            # It may have been made before the session existed
+            token.user_id, token.session_id = user_id, session_id
+        with self._lock:
+            previous = self._turns.get((user_id, session_id))
+            self._turns[(user_id, session_id)] = token
+        if previous is not None:
+            previous.cancel("superseded")
+        return token
+
+    def finish(self, token: CancellationToken):
+        with self._lock:
+            if self._turns.get((token.user_id, token.session_id)) is token:
+                del self._turns[(token.user_id, token.session_id)]
+
+    def cancel_session(self, user_id: str, session_id: str, reason: str) -> bool:
+        """Cancel the turn running in a session, if any."""
+        with self._lock:
+            token = self._turns.get((user_id, session_id))
+        return token is not None and token.cancel(reason)
+
+    def cancel_turn(self, turn_id: str, reason: str = "admin") -> bool:
+        """Cancel a turn by id, if it is running in this process."""
+        with self._lock:
+            tokens = [token for token in self._turns.values() if token.turn_id == turn_id]
+        return any(token.cancel(reason) for token in tokens)
+
+    def cancel_user(self, user_id: str, reason: str = "admin") -> int:
+        """Cancel every running turn of a user; returns how many were cancelled."""
+        with self._lock:
+            tokens = [token for key, token in self._turns.items() if key[0] == user_id]
+        return sum(token.cancel(reason) for token in tokens)
+
+    def running(self) -> List[Dict[str, Any]]:
+        """The running turns, oldest first."""
+        now = time.time()
+        with self._lock:
+            tokens = sorted(self._turns.values(), key=lambda token: token.started_at)
+        return [
+            {"turn_id": token.turn_id, "user_id": token.user_id, "session_id": token.session_id,
+             "seconds": round(now - token.started_at, 1), "cancelled": token.reason}
+            for token in tokens
+        ]
+
+
+# Process-wide registry of running turns
+turn_registry = TurnRegistry()
@@ -0,0 +1,105 @@
+"""
+Course Catalog
+
+This module keeps a process-wide cache of Google Classroom courses. Course
+records are stored once per course id and shared by every user enrolled in it,
+and each user's course list is cached for a short TTL, so the tools of one turn
+(and every user of a batch run) do not list the same courses again. The
+courses a user teaches (teacher mode) are listed and cached separately.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from .context import check_cancelled
+from .records import Course
+
+# How long a user's course list stays fresh
+COURSE_LIST_TTL_SECONDS = 600
+
+
+class CourseCatalog:
+    """Shared course metadata plus a per-user cache of course memberships."""
+
+    def __init__(self, ttl: float = COURSE_LIST_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._courses: Dict[str, Course] = {}
+        # (user id, teaching) -> (listed at, course ids)
+        self._user_courses: Dict[Tuple[str, bool], Tuple[float, List[str]]] = {}
+
+    def list_courses(self, service, user_id: str, teaching: bool = False) -> List[Course]:
+        """
+        Get all courses the user has access to (or only those they teach),
+        from the cache when fresh.
+        """
+        key = (user_id, teaching)
+        with self._lock:
+            cached = self._user_courses.get(key)
+            if cached and time.time() - cached[0] < self.ttl:
+                return [self._courses[course_id] for course_id in cached[1] if course_id in self._courses]
+
+        courses = _fetch_courses(service, teacherId="me") if teaching else _fetch_courses(service)
+        if courses is None:
+            # Listing failed, serve whatever we had rather than nothing
+            with self._lock:
+                cached = self._user_courses.get(key)
+                return [self._courses[course_id] for course_id in cached[1]] if cached else []
+
+        courses = [Course.from_api(course) for course in courses]
+        with self._lock:
+            for course in courses:
+                self._courses[course.id] = course
+            self._user_courses[key] = (time.time(), [course.id for course in courses])
+        return courses
+
+    def user_course(self, service, user_id: str, course_id: str, teaching: bool = False) -> Optional[Course]:
+        """The course, if it is one of the user's courses (or one they teach)."""
+        for course in self.list_courses(service, user_id, teaching):
+            if course.id == course_id:
+                return course
+        return None
+
+    def get(self, course_id: str) -> Optional[Course]:
+        """Get a course's record if any user has listed it."""
+        return self._courses.get(course_id)
+
+    def invalidate(self, user_id: str):
+        """Forget a user's course list so the next call refetches it."""
+        with self._lock:
+            self._user_courses.pop((user_id, False), None)
+            self._user_courses.pop((user_id, True), None)
+
+
+def _fetch_courses(service, **filters) -> Optional[List[Dict[str, Any]]]:
+    """List all courses (matching filters, e.g. teacherId) from the API, or None if the request failed."""
+    try:
+        courses = []
+        page_token = None
+
+        while True:
+            check_cancelled()
+            response = service.courses().list(
+                pageToken=page_token,
+                pageSize=100,
+                **filters
+            ).execute()
+
+            courses.extend(response.get('courses', []))
+            page_token = response.get('nextPageToken')
+
+            if not page_token:
+                break
+
+        return courses
+
+    except HttpError as e:
+        print(f"Error fetching courses: {e}")
+        return None
+
+
+# Process-wide catalog shared by every request, user and batch worker
+course_catalog = CourseCatalog()
@@ -0,0 +1,135 @@
+"""
+Class-Wide Submission Statistics
+
+Teacher mode lists every student's submissions of a course (the wildcard
+studentSubmissions.list) and hands the model per-assignment aggregates instead
+of the raw submissions. SubmissionColumns keeps a course's submissions as
+typed columns, filled page by page as they are listed, so a 6 x 150 student
+teacher never holds thousands of submission dicts at once. The aggregates
+(counts by state, late counts, grade percentiles and histograms) are computed
+for all assignments at once with numpy.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .deadlines import TURNED_IN_STATES
+
+STATES = ("NEW", "CREATED", "TURNED_IN", "RETURNED", "RECLAIMED_BY_STUDENT")
+_STATE_CODES = {state: code for code, state in enumerate(STATES)}
+_TURNED_IN_CODES = np.array([code for code, state in enumerate(STATES) if state in TURNED_IN_STATES])
+
+# Grade histograms split 0-100% of the max points into this many bins
+HISTOGRAM_BINS = 10
+
+PERCENTILES = (25, 50, 75)
+
+
+class SubmissionColumns:
+    """All students' submissions of one course, one array per field."""
+
+    def __init__(self, work_ids: Sequence[str]):
+        self.work_ids: List[str] = list(work_ids)
+        self.student_ids: List[str] = []
+        self._work_index = {work_id: index for index, work_id in enumerate(self.work_ids)}
+        self._student_index: Dict[str, int] = {}
+        # Appended to while listing, turned into numpy arrays by finish()
+        self._work = array("i")
+        self._student = array("i")
+        self._state = array("b")
+        self._late = array("b")
+        self._grade = array("d")
+
+    def extend(self, submissions: Iterable[Dict[str, Any]]):
+        """Add one page of submissions; submissions of unknown coursework are skipped."""
+        for submission in submissions:
+            work = self._work_index.get(submission.get("courseWorkId"))
+            if work is None:
+                continue
+            user_id = submission.get("userId", "")
+            student = self._student_index.get(user_id)
+            if student is None:
+                student = self._student_index[user_id] = len(self.student_ids)
+                self.student_ids.append(user_id)
+            grade = submission.get("assignedGrade")
+            self._work.append(work)
+            self._student.append(student)
+            self._state.append(_STATE_CODES.get(submission.get("state"), 0))
+            self._late.append(bool(submission.get("late")))
+            self._grade.append(float("nan") if grade is None else grade)
+
+    def finish(self) -> "SubmissionColumns":
+        """Freeze the columns as numpy arrays once every page is in."""
+        self.work = np.frombuffer(self._work, dtype=np.int32) if self._work else np.zeros(0, np.int32)
+        self.student = np.frombuffer(self._student, dtype=np.int32) if self._student else np.zeros(0, np.int32)
+        self.state = np.frombuffer(self._state, dtype=np.int8) if self._state else np.zeros(0, np.int8)
+        self.late = np.frombuffer(self._late, dtype=np.int8).astype(bool) if self._late else np.zeros(0, bool)
+        self.grade = np.frombuffer(self._grade, dtype=np.float64) if self._grade else np.zeros(0)
+        return self
+
+    def __len__(self) -> int:
+        return len(self._work)
+
+    def not_turned_in(self, work_id: str) -> List[str]:
+        """Ids of the students who have not turned in (or got back) an assignment."""
+        work = self._work_index.get(work_id)
+        if work is None:
+            return []
+        mask = (self.work == work) & ~np.isin(self.state, _TURNED_IN_CODES)
+        return [self.student_ids[student] for student in self.student[mask]]
+
+
+def _group_percentiles(values: np.ndarray, groups: np.ndarray, counts: np.ndarray,
+                       percentile: float) -> np.ndarray:
+    """Linear-interpolated percentile of values per group; values must be sorted within groups."""
+    result = np.full(len(counts), np.nan)
+    has = counts > 0
+    if not has.any():
+        return result
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = starts[has] + (counts[has] - 1) * percentile / 100.0
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    fraction = position - low
+    result[has] = values[low] * (1 - fraction) + values[high] * fraction
+    return result
+
+
+def assignment_stats(columns: SubmissionColumns, max_points: Sequence[Optional[float]]) -> Dict[str, np.ndarray]:
+    """
+    Aggregates per assignment (in columns.work_ids order): "submissions",
+    counts per state ("NEW", ...), "turned_in", "late", "graded", "mean",
+    "p25"/"p50"/"p75" of the assigned grades and "histogram" (graded
+    submissions per 10% of max points, an (assignments, HISTOGRAM_BINS) array).
+    """
+    n = len(columns.work_ids)
+    work = columns.work.astype(np.int64)
+
+    by_state = np.bincount(work * len(STATES) + columns.state, minlength=n * len(STATES)).reshape(n, len(STATES))
+    stats: Dict[str, np.ndarray] = {state: by_state[:, code] for code, state in enumerate(STATES)}
+    stats["submissions"] = by_state.sum(axis=1)
+    stats["turned_in"] = by_state[:, _TURNED_IN_CODES].sum(axis=1)
+    stats["late"] = np.bincount(work, weights=columns.late, minlength=n).astype(np.int64)
+
+    graded_mask = ~np.isnan(columns.grade)
+    graded_work = work[graded_mask]
+    grades = columns.grade[graded_mask]
+    graded = np.bincount(graded_work, minlength=n)
+    stats["graded"] = graded
+    stats["mean"] = np.divide(np.bincount(graded_work, weights=grades, minlength=n), graded,
+                              out=np.full(n, np.nan), where=graded > 0)
+
+    order = np.lexsort((grades, graded_work))
+    for percentile in PERCENTILES:
+        stats[f"p{percentile}"] = _group_percentiles(grades[order], graded_work[order], graded, percentile)
+
+    points = np.array([p if p else np.nan for p in max_points], dtype=np.float64)
+    ratio = grades / points[graded_work] if len(grades) else grades
+    scored = ~np.isnan(ratio)
+    bins = np.clip(np.floor(ratio[scored] * HISTOGRAM_BINS), 0, HISTOGRAM_BINS - 1).astype(np.int64)
+    stats["histogram"] = np.bincount(
+        graded_work[scored] * HISTOGRAM_BINS + bins, minlength=n * HISTOGRAM_BINS
+    ).reshape(n, HISTOGRAM_BINS)
+    return stats
@@ -0,0 +1,163 @@
+"""
+Request Context
+
+This module carries the per-request state the tools need (user id, credentials,
+API services and data-layer handles) in a context variable instead of reading
+Streamlit's session_state. Any entry point (Streamlit, an HTTP server, a batch
+job, a benchmark) sets the context around a turn, and it follows the turn into
+asyncio tasks and, through the helpers below, into thread and process pools.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Add project root to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from oauth_web_config import get_calendar_service, get_classroom_service, get_user_credentials
+
+from .cancellation import CancellationToken
+from .deadlines import DeadlineIndex, get_deadline_index
+from .profiling import profiled_in_thread
+from .tracing import tracer
+
+
+@dataclass
+class RequestContext:
+    """Everything a tool needs to act on behalf of one user for one request."""
+    user_id: str
+    session_id: Optional[str] = None
+    # When the oldest data the request was answered from was fetched (epoch seconds)
+    data_as_of: Optional[float] = None
+    # "simple" or "complex", set once the turn's question is classified (see routing.py)
+    complexity: Optional[str] = None
+    # Cancelled when nobody will see the answer (see cancellation.py)
+    cancellation: CancellationToken = field(default_factory=CancellationToken, repr=False)
+    # No tool may change anything in the user's Google account (e.g. batch digests)
+    read_only: bool = False
+    # The user turned teacher mode on: class-wide tools over the courses they teach
+    teacher_mode: bool = False
+    _services: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def credentials(self):
+        """The user's live OAuth credentials, or None if not signed in."""
+        return get_user_credentials(self.user_id)
+
+    @property
+    def deadline_index(self) -> DeadlineIndex:
+        return get_deadline_index(self.user_id)
+
+    def classroom_service(self):
+        """The Classroom API service, built once per request and thread."""
+        return self._service("classroom", get_classroom_service)
+
+    def calendar_service(self):
+        """The Calendar API service, built once per request and thread."""
+        return self._service("calendar", get_calendar_service)
+
+    def note_data_as_of(self, fetched_at: float):
+        """Record that the request used data fetched at the given time."""
+        if self.data_as_of is None or fetched_at < self.data_as_of:
+            self.data_as_of = fetched_at
+
+    def set_service(self, name: str, service):
+        """Use a prebuilt service (e.g. a fake in benchmarks) on every thread."""
+        self._services[(name, None)] = service
+
+    def _service(self, name: str, build_service: Callable):
+        if (name, None) in self._services:
+            return self._services[(name, None)]
+        # httplib2 connections are not thread-safe, so tools running in
+        # parallel threads each get their own service object
+        key = (name, threading.get_ident())
+        if key not in self._services:
+            with tracer.start_as_current_span(f"build_service {name}"):
+                self._services[key] = build_service(self.user_id)
+        return self._services[key]
+
+    def __getstate__(self):
+        # API services hold live HTTP connections, a process pool worker rebuilds them
+        state = dict(self.__dict__)
+        state["_services"] = {}
+        return state
+
+
+_current_request: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar(
+    "learnbridge_request", default=None
+)
+
+
+def current_request() -> RequestContext:
+    """Get the context of the request being served."""
+    ctx = _current_request.get()
+    if ctx is None:
+        raise RuntimeError("No request context set. Wrap the agent call in request_context(user_id=...).")
+    return ctx
+
+
+@contextmanager
+def request_context(user_id: str, session_id: Optional[str] = None) -> Iterator[RequestContext]:
+    """Set the request context for the duration of a block."""
+    ctx = RequestContext(user_id=user_id, session_id=session_id)
+    token = _current_request.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current_request.reset(token)
+
+
+def check_cancelled():
+    """
+    Raise TurnCancelled if the current request's turn has been cancelled. Call
+    it between units of work: pages, courses, tool and model calls.
+    """
+    ctx = _current_request.get()
+    if ctx is not None:
+        ctx.cancellation.raise_if_cancelled()
+
+
+def run_with_context(ctx: RequestContext, fn: Callable, *args, **kwargs):
+    """
+    Call fn with the given request context set.
+
+    Use this as the target when handing work to a process pool, where the
+    context variable does not travel with the call.
+    """
+    token = _current_request.set(ctx)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current_request.reset(token)
+
+
+def submit_with_context(executor, fn: Callable, *args, **kwargs):
+    """Submit fn to a thread pool, carrying over the caller's context variables."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def threaded_tool(fn: Callable) -> Callable:
+    """
+    Wrap a blocking tool so the agent runs it in a worker thread.
+
+    The Google API client is synchronous; called directly from the event loop it
+    would stall every other user's turn. The wrapper keeps the tool's name,
+    docstring and signature, so the model sees the same tool, and
+    asyncio.to_thread carries the request context into the thread. A cancelled
+    turn's tool calls do not start.
+    """
+    worker = profiled_in_thread(fn)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        check_cancelled()
+        return await asyncio.to_thread(worker, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,202 @@
+"""
+Deadline Index
+
+This module keeps a per-user index of coursework due dates. The nested Classroom
+dueDate/dueTime dicts are normalized once into UTC epoch timestamps (when the
+CourseWork record is built) and kept in sorted arrays, so deadline questions
+("due between X and Y", "next N deadlines", "overdue and not turned in") are
+answered with a bisect instead of a rescan.
+
+Indexes of the MAX_INDEXES most recently used users are kept; an evicted one
+is rebuilt from the cached coursework the next time it is needed.
+"""
+
+import bisect
+import threading
+import time
+from calendar import timegm
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .records import CourseWork
+
+# Submission states that count as handed in
+TURNED_IN_STATES = {"TURNED_IN", "RETURNED"}
+
+# Users whose index is kept, least recently used are dropped first
+MAX_INDEXES = 2000
+
+
+class DeadlineEntry(NamedTuple):
+    """A coursework item together with its normalized due timestamp."""
+    due: float
+    key: str
+    item: "CourseWork"
+
+
+def due_timestamp(item: Dict[str, Any]) -> Optional[float]:
+    """Convert the Classroom dueDate/dueTime dicts into a UTC epoch timestamp."""
+    due_date = item.get("dueDate")
+    if not due_date:
+        return None
+
+    # Without a dueTime the assignment is due at the end of the day; the API
+    # omits zero fields, so an empty dueTime means midnight.
+    due_time = item.get("dueTime")
+    if due_time is None:
+        due_time = {"hours": 23, "minutes": 59}
+
+    try:
+        return float(timegm((
+            int(due_date["year"]),
+            int(due_date["month"]),
+            int(due_date["day"]),
+            int(due_time.get("hours", 0)),
+            int(due_time.get("minutes", 0)),
+            int(due_time.get("seconds", 0)),
+        )))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def deadline_key(course_id: str, course_work_id: str) -> str:
+    """Stable key for a coursework item across syncs."""
+    return f"{course_id}/{course_work_id}"
+
+
+class DeadlineIndex:
+    """
+    Sorted index of one user's coursework deadlines.
+
+    Two sorted arrays of (due, key) pairs are kept: one for every dated item and
+    one for the items that are still outstanding. Range lookups bisect into them,
+    so queries cost O(log n) plus the size of the answer.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[str, DeadlineEntry] = {}
+        self._by_due: List[Tuple[float, str]] = []
+        self._outstanding: List[Tuple[float, str]] = []
+        self.built_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._by_due)
+
+    def rebuild(self, coursework: List["CourseWork"]):
+        """Replace the whole index from a full coursework sync."""
+        entries = {}
+        for item in coursework:
+            if item.due is not None:
+                key = item.key
+                entries[key] = DeadlineEntry(item.due, key, item)
+
+        by_due = sorted((entry.due, key) for key, entry in entries.items())
+        outstanding = [pair for pair in by_due if not entries[pair[1]].item.turned_in]
+
+        with self._lock:
+            self._entries = entries
+            self._by_due = by_due
+            self._outstanding = outstanding
+            self.built_at = time.time()
+
+    def sync(self, coursework: List["CourseWork"]):
+        """
+        Bring the index up to date with a full coursework sync. Only the items
+        that were added, changed or dropped since the previous sync are applied;
+        an index that was never built is built from scratch.
+        """
+        with self._lock:
+            if self.built_at is None:
+                self.rebuild(coursework)
+                return
+            current = {item.key: item for item in coursework}
+            for entry in [entry for key, entry in self._entries.items() if key not in current]:
+                self.remove(entry.item.course_id, entry.item.id)
+            for key, item in current.items():
+                entry = self._entries.get(key)
+                if entry is None and item.due is None:
+                    continue
+                if entry is None or entry.item != item:
+                    self.upsert(item)
+            self.built_at = time.time()
+
+    def upsert(self, item: "CourseWork"):
+        """Add or update a single coursework item."""
+        key = item.key
+        with self._lock:
+            self._discard(key)
+            if item.due is None:
+                return
+            self._entries[key] = DeadlineEntry(item.due, key, item)
+            bisect.insort(self._by_due, (item.due, key))
+            if not item.turned_in:
+                bisect.insort(self._outstanding, (item.due, key))
+
+    def remove(self, course_id: str, course_work_id: str):
+        """Drop a coursework item from the index."""
+        with self._lock:
+            self._discard(deadline_key(course_id, course_work_id))
+
+    def get(self, course_id: str, course_work_id: str) -> Optional[DeadlineEntry]:
+        """Look up a single coursework item's entry."""
+        with self._lock:
+            return self._entries.get(deadline_key(course_id, course_work_id))
+
+    def due_between(self, start: float, end: float) -> List[DeadlineEntry]:
+        """Entries due in the inclusive range [start, end], soonest first."""
+        with self._lock:
+            return self._slice(self._by_due, start, end)
+
+    def next_deadlines(self, n: int, now: Optional[float] = None) -> List[DeadlineEntry]:
+        """The next n entries due at or after now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            lo = bisect.bisect_left(self._by_due, (now, ""))
+            return [self._entries[key] for _, key in self._by_due[lo:lo + n]]
+
+    def overdue(self, now: Optional[float] = None) -> List[DeadlineEntry]:
+        """Entries past due and not turned in, oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            hi = bisect.bisect_left(self._outstanding, (now, ""))
+            return [self._entries[key] for _, key in self._outstanding[:hi]]
+
+    def _slice(self, pairs: List[Tuple[float, str]], start: float, end: float) -> List[DeadlineEntry]:
+        lo = bisect.bisect_left(pairs, (start, ""))
+        hi = bisect.bisect_right(pairs, (end, "\uffff"))
+        return [self._entries[key] for _, key in pairs[lo:hi]]
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for pairs in (self._by_due, self._outstanding):
+            i = bisect.bisect_left(pairs, (entry.due, key))
+            if i < len(pairs) and pairs[i] == (entry.due, key):
+                del pairs[i]
+
+
+# --- Per-user registry ---
+_indexes: "OrderedDict[str, DeadlineIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_deadline_index(user_id: str) -> DeadlineIndex:
+    """Get (or create) the deadline index for a user."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = DeadlineIndex()
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(user_id)
+        return index
+
+
+def forget_deadline_index(user_id: str):
+    """Drop a user's index (e.g. when they sign out)."""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
@@ -0,0 +1,143 @@
+"""
+Item Details
+
+The list tools return one summary row per assignment or announcement. The
+detail tools fetch an item's full content only when the model asks for it,
+and keep what they fetched in this cache for FRESH_TTL_SECONDS. An item
+addressed to the whole course (assigneeMode ALL_STUDENTS) is the same for
+everyone in it and is cached per course, but only served to users enrolled in
+that course. Items addressed to individual students, and submissions, are
+cached per user, so a classmate asking for the same id fetches it (and is
+refused) with their own credentials. Requests for an item that is being
+fetched wait for that fetch (see single_flight.py).
+
+Items addressed to the whole course also go through the shared cache tier
+(see shared_cache.py), so other worker processes fetch them only once too.
+Nothing else is written there: per-user items and submissions stay in this
+process, and a shared entry is checked again before it is served.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .freshness import FRESH_TTL_SECONDS
+from .shared_cache import get_shared_cache
+from .single_flight import SingleFlight
+from .tracing import tracer
+
+# Items kept, least recently used are dropped first
+MAX_ITEMS = 5000
+
+
+def addressed_to_all(item: Dict[str, Any]) -> bool:
+    """Whether a coursework item or announcement is addressed to everyone in its course."""
+    return item.get("assigneeMode") == "ALL_STUDENTS"
+
+
+class DetailCache:
+    """Fetched item details with a TTL, bounded in size."""
+
+    def __init__(self, ttl: float = FRESH_TTL_SECONDS, max_items: int = MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Tuple[str, ...], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._fetches = SingleFlight()
+
+    def get(self, key: Tuple[str, ...], fetch: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """The cached value for key, or fetch() if missing or expired. None (a failed fetch) is not cached."""
+        now = time.time()
+        cached = self._cached(key, now)
+        if cached is not None:
+            return cached
+
+        value = self._fetches.do(key, fetch)
+        if value is not None:
+            self._store(key, now, value)
+        return value
+
+    def get_course_item(self, key: Tuple[str, str, str], user_id: str,
+                        fetch: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        An item of a course, key being (kind, course_id, item_id), as user_id
+        sees it: cached for the course if it is addressed to all of it, and
+        for user_id alone otherwise. fetch gets it with user_id's credentials.
+        """
+        kind, course_id, item_id = key
+        user_key = (kind, user_id, course_id, item_id)
+        now = time.time()
+        for cached_key in (key, user_key):
+            cached = self._cached(cached_key, now)
+            if cached is not None:
+                return cached
+
+        # One fetch per item, but only an item for the whole course is the
+        # joiners' to use; anything else they fetch as themselves
+        future, leader = self._fetches.join(key)
+        if leader:
+            try:
+                value = self._load(key, fetch)
+            except BaseException as e:
+                self._fetches.settle(key, future, error=e)
+                raise
+            self._fetches.settle(key, future, value)
+        else:
+            try:
+                value = future.result()
+            except Exception:
+                value = None
+            if value is None or not addressed_to_all(value):
+                value = self._fetches.do(user_key, fetch)
+
+        if value is not None:
+            self._store(key if addressed_to_all(value) else user_key, now, value)
+        return value
+
+    def _load(self, key: Tuple[str, str, str], fetch: Callable[[], Optional[Dict[str, Any]]]):
+        """fetch(), through the shared tier for items addressed to the whole course."""
+        shared_key = "/".join(key)
+        cache = get_shared_cache()
+        with tracer.start_as_current_span("shared_cache.get", attributes={"cache.key": shared_key}) as span:
+            try:
+                value = cache.get(shared_key)
+            except Exception as e:
+                # The cache is an optimization, a broken backend must not fail the fetch
+                print(f"Shared cache read failed for {shared_key}: {e}")
+                value = None
+            span.set_attribute("cache.hit", value is not None)
+        if value is not None and addressed_to_all(value):
+            return value
+
+        value = fetch()
+        # Only what everyone in the course sees alike may leave this user
+        if value is not None and addressed_to_all(value):
+            try:
+                cache.set(shared_key, value, self.ttl)
+            except Exception as e:
+                print(f"Shared cache write failed for {shared_key}: {e}")
+        return value
+
+    def _cached(self, key: Tuple[str, ...], now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._items.move_to_end(key)
+                return cached[1]
+        return None
+
+    def _store(self, key: Tuple[str, ...], now: float, value: Dict[str, Any]):
+        with self._lock:
+            self._items[key] = (now, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Process-wide cache shared by every request
+detail_cache = DetailCache()
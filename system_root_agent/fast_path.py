@@ -0,0 +1,233 @@
+"""
+Fast Path Dispatcher
+
+This module answers the most common structured questions ("what's due this
+week", "show my grades", "what am I missing", "latest announcements") directly
+from the Google Classroom tool data, without a Gemini call. Anything it does not
+recognize returns None so the caller can fall back to the full agent pipeline.
+"""
+
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from .cancellation import TurnCancelled
+from .context import current_request
+from .deadlines import DeadlineEntry
+from .records import Announcement, CourseWork
+from .subagents.announcement_agent.tools import load_announcements
+from .subagents.course_work_agent.tools import load_course_work
+
+# Name recorded in the interaction history for fast path answers
+FAST_PATH_AGENT_NAME = "FastPath"
+
+# How far ahead "what's due" looks
+DUE_WINDOW = timedelta(days=7)
+
+# Maximum number of announcements shown for "latest announcements"
+MAX_ANNOUNCEMENTS = 10
+
+# Intent patterns, matched against the whole normalized query so that longer
+# questions ("help me with the essay that's due this week") go to the agents.
+_INTENT_PATTERNS = {
+    "due_this_week": [
+        r"(what|which)s?( assignments?| homework| work| coursework)?( is| are)? due( this week| soon| next)?( for me)?",
+        r"(show|list|get)( me)?( my)? (assignments?|homework|deadlines?)( that are)?( due)?( this week| soon)?",
+        r"(my )?(upcoming )?deadlines?( this week)?",
+    ],
+    "grades": [
+        r"(show|list|get|what are|whats)( me)?( all)?( of)? my grades?",
+        r"my grades?",
+    ],
+    "missing": [
+        r"what am i missing",
+        r"(show|list|get|what are|whats)( me)?( my)? (missing|overdue|late) (assignments?|work|homework)",
+        r"(my )?(missing|overdue) (assignments?|work|homework)",
+    ],
+    "announcements": [
+        r"(show|list|get|what are|whats)( me)?( the)?( latest| recent| new)? announcements?",
+        r"(any )?(latest|recent|new) announcements?",
+    ],
+}
+
+_COMPILED_INTENTS = {
+    intent: [re.compile(pattern) for pattern in patterns]
+    for intent, patterns in _INTENT_PATTERNS.items()
+}
+
+
+def match_intent(query: str) -> Optional[str]:
+    """Return the fast path intent for a query, or None if it needs the agents."""
+    normalized = re.sub(r"'", "", query.lower())
+    normalized = re.sub(r"[^a-z0-9 ]", " ", normalized)
+    normalized = " ".join(normalized.split())
+
+    for intent, patterns in _COMPILED_INTENTS.items():
+        for pattern in patterns:
+            if pattern.fullmatch(normalized):
+                return intent
+    return None
+
+
+def answer_fast_path(query: str) -> Optional[str]:
+    """
+    Answers a common structured question directly from the tool data.
+
+    Args:
+        query (str): The user's question.
+    Returns:
+        Optional[str]: A markdown answer, or None if the query should go
+        through the full agent pipeline.
+    """
+    intent = match_intent(query)
+    if intent is None:
+        return None
+
+    try:
+        if intent == "announcements":
+            data = load_announcements()
+            if data.get("status") != "success":
+                return None
+            return _render_announcements(data.get("announcements", []))
+
+        data = load_course_work()
+        if data.get("status") != "success":
+            return None
+
+        if intent == "grades":
+            return _render_grades(data.get("coursework", []))
+
+        # The sync above rebuilt the deadline index, answer from it
+        index = current_request().deadline_index
+        if intent == "due_this_week":
+            now = time.time()
+            return _render_due_this_week(index.due_between(now, now + DUE_WINDOW.total_seconds()))
+        return _render_missing(index.overdue())
+
+    except TurnCancelled:
+        raise
+    except Exception as e:
+        # Never fail the turn here, the agents can still answer it
+        print(f"Fast path failed for intent {intent}: {e}")
+        return None
+
+
+def _render_due_this_week(upcoming: List[DeadlineEntry]) -> str:
+    """Render the assignments due in the next week as a markdown table."""
+    if not upcoming:
+        return "🎉 Nothing is due in the next 7 days."
+
+    rows = [
+        [
+            _escape(entry.item.course_name),
+            _link(entry.item.title, entry.item.link),
+            _format_due(entry.due),
+            _submission_state(entry.item),
+        ]
+        for entry in upcoming
+    ]
+    return (
+        f"### 📚 Due in the next 7 days ({len(rows)})\n\n"
+        + _table(["Course", "Assignment", "Due (UTC)", "Status"], rows)
+    )
+
+
+def _render_grades(coursework: List[CourseWork]) -> str:
+    """Render the graded assignments as a markdown table."""
+    rows = []
+    for item in coursework:
+        grade = item.submission.assigned_grade if item.submission else None
+        if grade is None:
+            continue
+        max_points = item.max_points
+        if max_points:
+            score = f"{grade:g} / {max_points:g} ({grade / max_points:.0%})"
+        else:
+            score = f"{grade:g}"
+        rows.append([
+            _escape(item.course_name),
+            _link(item.title, item.link),
+            f"**{score}**",
+        ])
+
+    if not rows:
+        return "No graded assignments yet."
+
+    return f"### 📊 Your grades ({len(rows)})\n\n" + _table(["Course", "Assignment", "Grade"], rows)
+
+
+def _render_missing(missing: List[DeadlineEntry]) -> str:
+    """Render the past-due assignments that have not been turned in."""
+    if not missing:
+        return "✅ You're all caught up, nothing is missing."
+
+    rows = [
+        [
+            _escape(entry.item.course_name),
+            _link(entry.item.title, entry.item.link),
+            _format_due(entry.due),
+            _submission_state(entry.item),
+        ]
+        for entry in missing
+    ]
+    return (
+        f"### ⚠️ Missing assignments ({len(rows)})\n\n"
+        + _table(["Course", "Assignment", "Was due (UTC)", "Status"], rows)
+    )
+
+
+def _render_announcements(announcements: List[Announcement]) -> str:
+    """Render the most recent announcements as a markdown table."""
+    if not announcements:
+        return "No announcements found."
+
+    latest = sorted(announcements, key=lambda a: a.posted, reverse=True)[:MAX_ANNOUNCEMENTS]
+
+    rows = []
+    for announcement in latest:
+        text = " ".join(announcement.text.split())
+        if len(text) > 160:
+            text = text[:157] + "..."
+        rows.append([
+            _escape(announcement.course_name),
+            announcement.posted[:10],
+            _link(text or "(no text)", announcement.link),
+        ])
+
+    return (
+        f"### 📢 Latest announcements ({len(rows)} of {len(announcements)})\n\n"
+        + _table(["Course", "Posted", "Announcement"], rows)
+    )
+
+
+def _format_due(due: float) -> str:
+    return datetime.fromtimestamp(due, timezone.utc).strftime("%a %Y-%m-%d %H:%M")
+
+
+def _submission_state(item: CourseWork) -> str:
+    submission = item.submission
+    state = (submission.state if submission else None) or "NOT SUBMITTED"
+    if submission and submission.late:
+        state += " (late)"
+    return state.replace("_", " ").title()
+
+
+def _link(text: str, url: Optional[str]) -> str:
+    text = _escape(text)
+    return f"[{text}]({url})" if url else text
+
+
+def _escape(value: Any) -> str:
+    """Escape a cell value for a markdown table."""
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _table(headers: List[str], rows: List[List[Any]]) -> str:
+    lines = [
+        "| " + " | ".join(headers) + " |",
+        "| " + " | ".join("---" for _ in headers) + " |",
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join(str(cell) for cell in row) + " |")
+    return "\n".join(lines)
@@ -0,0 +1,259 @@
+"""
+Data Freshness
+
+This module caches each user's gathered Classroom data (coursework,
+announcements) with a stale-while-revalidate policy, so most turns never wait
+on the Google APIs:
+
+    age < FRESH_TTL_SECONDS                      served from the cache
+    age < FRESH_TTL_SECONDS + STALE_GRACE_SECONDS  served from the cache at once,
+                                                 and refreshed in the background
+    older, or never fetched                      fetched within the turn
+
+Every result carries "data_as_of" (when it was fetched) and the request context
+remembers the oldest data a turn used, so answers can say how current they are.
+A failed fetch never replaces good data: the last successful result is served
+instead, however old. A turn that finds nothing usable while a fetch of the
+same data is already running (another turn of the same user, e.g. in a second
+tab, a background refresh, or the sync scheduler warming a user who just
+signed in) waits for that fetch instead of fetching again.
+
+With LEARNBRIDGE_SNAPSHOT_DIR set, every successful fetch is also written to a
+snapshot (see snapshots.py). After a restart, a user's first turn is answered
+from their snapshot if it is younger than SNAPSHOT_MAX_AGE_SECONDS, served as
+stale and refreshed in the background like any other stale data.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from .context import current_request, request_context
+from .snapshots import SnapshotStore, snapshot_store_from_env
+from .tracing import tracer
+
+# Data younger than this is served as is
+FRESH_TTL_SECONDS = 300
+
+# Past the TTL, data this much older is still served while it is refreshed
+STALE_GRACE_SECONDS = 3600
+
+# Background refreshes running at the same time
+REVALIDATE_WORKERS = 4
+
+# (user, dataset) results kept, least recently used are dropped first
+MAX_ENTRIES = 2000
+
+# Longest a turn waits for a refresh already in flight before fetching itself
+IN_FLIGHT_WAIT_SECONDS = 30
+
+Fetch = Callable[[], Dict[str, Any]]
+
+
+class CachedResult(NamedTuple):
+    fetched_at: float
+    value: Dict[str, Any]
+    # Read back from a snapshot rather than fetched by this process
+    restored: bool = False
+
+
+def format_as_of(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FreshnessCache:
+    """Per-user results of the data loaders with stale-while-revalidate."""
+
+    def __init__(self, ttl: float = FRESH_TTL_SECONDS, grace: float = STALE_GRACE_SECONDS,
+                 max_entries: int = MAX_ENTRIES, workers: int = REVALIDATE_WORKERS,
+                 snapshots: Optional[SnapshotStore] = None):
+        self.ttl = ttl
+        self.grace = grace
+        self.max_entries = max_entries
+        self.snapshots = snapshots
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], CachedResult]" = OrderedDict()
+        # Refreshes in flight, set when they finish
+        self._refreshing: Dict[Tuple[str, str], threading.Event] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="learnbridge-revalidate")
+        # Snapshot writes, one at a time so a newer one is never overtaken
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="learnbridge-snapshot")
+        if snapshots is not None:
+            # Drop what expired while the process was down
+            self._writer.submit(self._sweep_snapshots)
+
+    def get(self, dataset: str, fetch: Fetch) -> Dict[str, Any]:
+        """
+        The current user's result for a dataset under the freshness policy.
+        fetch loads it from the API for the user of the current request.
+        """
+        ctx = current_request()
+        key = (ctx.user_id, dataset)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            in_flight = self._refreshing.get(key)
+
+        if cached is None and in_flight is None:
+            cached = self._restore(key)
+
+        if in_flight is not None and (cached is None or time.time() - cached.fetched_at >= self._servable_age(cached)):
+            with tracer.start_as_current_span("freshness.wait", attributes={"freshness.dataset": dataset}):
+                in_flight.wait(IN_FLIGHT_WAIT_SECONDS)
+            cached = self._entries.get(key)
+
+        if cached is not None:
+            age = time.time() - cached.fetched_at
+            if age < self._servable_age(cached):
+                if age >= self.ttl:
+                    self.revalidate(ctx.user_id, dataset, fetch)
+                return self._serve(cached, stale=age >= self.ttl)
+
+        result, value = self._fetch_once(key, fetch, cached)
+        if result is not None:
+            return self._serve(result, stale=False)
+        if cached is not None:
+            # Serve the last good data rather than the error
+            return self._serve(cached, stale=True)
+        return value
+
+    def refresh(self, user_id: str, dataset: str, fetch: Fetch) -> Optional[CachedResult]:
+        """
+        Fetch a user's dataset now, outside any turn, and cache it if it
+        succeeded. If a refresh of it is already running, wait for that one.
+        """
+        key = (user_id, dataset)
+        with self._lock:
+            in_flight = self._refreshing.get(key)
+            if in_flight is None:
+                done = self._refreshing[key] = threading.Event()
+        if in_flight is not None:
+            in_flight.wait()
+            return self._entries.get(key)
+
+        try:
+            with request_context(user_id=user_id):
+                result, _ = self._fetch(key, fetch)
+            return result
+        finally:
+            with self._lock:
+                del self._refreshing[key]
+            done.set()
+
+    def revalidate(self, user_id: str, dataset: str, fetch: Fetch):
+        """Refresh a user's dataset in the background, once at a time per dataset."""
+        if (user_id, dataset) in self._refreshing:
+            return
+
+        def run():
+            try:
+                self.refresh(user_id, dataset, fetch)
+            except Exception as e:
+                print(f"Background refresh of {dataset} failed for user {user_id}: {e}")
+
+        self._executor.submit(run)
+
+    def fetched_at(self, user_id: str, dataset: str) -> Optional[float]:
+        cached = self._entries.get((user_id, dataset))
+        return cached.fetched_at if cached else None
+
+    def invalidate(self, user_id: str, dataset: Optional[str] = None):
+        """Forget a user's cached data (one dataset, or all of them), including their snapshots."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id and dataset in (None, key[1])]:
+                del self._entries[key]
+        if self.snapshots is not None:
+            # Queued behind pending writes, so none of them brings the data back
+            self._writer.submit(self.snapshots.delete, user_id, dataset).result()
+
+    def _fetch_once(self, key: Tuple[str, str], fetch: Fetch,
+                    cached: Optional[CachedResult]) -> Tuple[Optional[CachedResult], Dict[str, Any]]:
+        """_fetch within a turn, joining a fetch of the same data another turn or refresh has started."""
+        with self._lock:
+            in_flight = self._refreshing.get(key)
+            if in_flight is None:
+                done = self._refreshing[key] = threading.Event()
+
+        if in_flight is not None:
+            with tracer.start_as_current_span("freshness.wait", attributes={"freshness.dataset": key[1]}):
+                in_flight.wait(IN_FLIGHT_WAIT_SECONDS)
+            joined = self._entries.get(key)
+            if joined is not None and joined is not cached:
+                return joined, joined.value
+            # It failed or is taking too long: fetch for this turn after all
+            with tracer.start_as_current_span("freshness.fetch", attributes={"freshness.dataset": key[1]}):
+                return self._fetch(key, fetch)
+
+        try:
+            with tracer.start_as_current_span("freshness.fetch", attributes={"freshness.dataset": key[1]}):
+                return self._fetch(key, fetch)
+        finally:
+            with self._lock:
+                del self._refreshing[key]
+            done.set()
+
+    def _fetch(self, key: Tuple[str, str], fetch: Fetch) -> Tuple[Optional[CachedResult], Dict[str, Any]]:
+        """Call fetch and cache its value if it succeeded; returns (cached result, value)."""
+        fetched_at = time.time()
+        value = fetch()
+        if value.get("status") != "success":
+            return None, value
+        result = CachedResult(fetched_at, value)
+        self._store(key, result)
+        if self.snapshots is not None and self.snapshots.persists(key[1]):
+            self._writer.submit(self._save_snapshot, key, result)
+        return result, value
+
+    def _store(self, key: Tuple[str, str], result: CachedResult):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _servable_age(self, cached: CachedResult) -> float:
+        # Restored data stands in until the first refresh after a restart
+        if cached.restored:
+            return max(self.ttl + self.grace, self.snapshots.max_age)
+        return self.ttl + self.grace
+
+    def _restore(self, key: Tuple[str, str]) -> Optional[CachedResult]:
+        """Load a dataset from its snapshot into the cache, if there is one."""
+        if self.snapshots is None or not self.snapshots.persists(key[1]):
+            return None
+        with tracer.start_as_current_span("freshness.restore", attributes={"freshness.dataset": key[1]}):
+            snapshot = self.snapshots.load(*key)
+        if snapshot is None:
+            return None
+        result = CachedResult(snapshot[0], snapshot[1], restored=True)
+        with self._lock:
+            # A fetch may have finished meanwhile, its data is newer
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = result
+        self.snapshots.restored(key[0], key[1], result.value)
+        return result
+
+    def _save_snapshot(self, key: Tuple[str, str], result: CachedResult):
+        try:
+            self.snapshots.save(key[0], key[1], result.fetched_at, result.value)
+        except Exception as e:
+            print(f"Could not write the {key[1]} snapshot for user {key[0]}: {e}")
+
+    def _sweep_snapshots(self):
+        try:
+            self.snapshots.sweep()
+        except OSError as e:
+            print(f"Could not sweep old snapshots: {e}")
+
+    def _serve(self, cached: CachedResult, stale: bool) -> Dict[str, Any]:
+        current_request().note_data_as_of(cached.fetched_at)
+        return {**cached.value, "data_as_of": format_as_of(cached.fetched_at), "stale": stale}
+
+
+# Process-wide cache shared by every request and background refresh
+freshness_cache = FreshnessCache(snapshots=snapshot_store_from_env())
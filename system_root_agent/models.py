@@ -0,0 +1,280 @@
+"""
+Model Configuration
+
+This module picks the model each agent runs on. By default agents are routed
+between a small and a large Gemini model (see routing.py): the agents that
+reformat tool output always use the small one, and the data analyzer uses the
+large one only for complex questions. Environment variables can switch all
+agents, or one of them, to another spec below:
+
+    LEARNBRIDGE_MODEL=gemini-2.5-flash                   every agent
+    LEARNBRIDGE_MODEL_DATA_ANALYZER_AGENT=gemini-2.5-pro  one agent (by agent name)
+    LEARNBRIDGE_MODEL_SMALL / LEARNBRIDGE_MODEL_LARGE     the models behind "route"
+
+Model specs:
+    route[:<policy>]       the small or large model per call; policy is auto
+                           (by question complexity, the default), small or large
+    <model name>           a Gemini model, called over the network
+    fake[:<ms per token>]  ScriptedFakeLlm: calls the agent's read tools, then
+                           summarizes their results, with simulated token latency
+    record:<model name>    call the model and save every response to disk
+    replay                 answer only from saved responses, never the network
+    replay:<model name>    answer from saved responses, calling the model (and
+                           saving the response) on a miss
+
+Saved responses live in LEARNBRIDGE_CASSETTE_DIR (default benchmarks/cassettes),
+one JSON file per request, keyed by a hash of the prompt.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import Field
+
+from .routing import routed_model
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+MODEL_ENV = "LEARNBRIDGE_MODEL"
+
+# The two models behind the "route" spec
+SMALL_MODEL_ENV = "LEARNBRIDGE_MODEL_SMALL"
+LARGE_MODEL_ENV = "LEARNBRIDGE_MODEL_LARGE"
+DEFAULT_SMALL_MODEL = "gemini-2.0-flash-lite"
+DEFAULT_LARGE_MODEL = DEFAULT_MODEL
+
+# Specs used when the environment names none
+DEFAULT_SPEC = "route"
+DEFAULT_AGENT_SPECS = {
+    # These agents reformat a tool result into a report section
+    "CourseWorkAgent": "route:small",
+    "AnnouncementAgent": "route:small",
+}
+CASSETTE_DIR_ENV = "LEARNBRIDGE_CASSETTE_DIR"
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "benchmarks", "cassettes")
+
+# Tools the fake model calls and their arguments. Tools with side effects
+# (sync_deadlines_to_calendar) are deliberately left out.
+DEFAULT_TOOL_SCRIPT: Dict[str, Dict[str, Any]] = {
+    "get_course_work": {},
+    "get_announcements": {},
+    "get_deadlines": {"days_ahead": 7},
+}
+
+
+def _env_suffix(agent_name: str) -> str:
+    """CourseWorkAgent -> COURSE_WORK_AGENT"""
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", agent_name).upper()
+
+
+def get_model(agent_name: str) -> Union[str, BaseLlm]:
+    """The model an agent should use, from the environment."""
+    spec = (
+        os.getenv(f"{MODEL_ENV}_{_env_suffix(agent_name)}")
+        or os.getenv(MODEL_ENV)
+        or DEFAULT_AGENT_SPECS.get(agent_name, DEFAULT_SPEC)
+    )
+    return model_from_spec(spec)
+
+
+def model_from_spec(spec: str) -> Union[str, BaseLlm]:
+    """Turn a model spec (see the module docstring) into what LlmAgent accepts."""
+    kind, _, arg = spec.partition(":")
+
+    if kind == "route":
+        small = model_from_spec(os.getenv(SMALL_MODEL_ENV, DEFAULT_SMALL_MODEL))
+        large = model_from_spec(os.getenv(LARGE_MODEL_ENV, DEFAULT_LARGE_MODEL))
+        return routed_model(arg or "auto", small, large)
+
+    if kind == "fake":
+        return ScriptedFakeLlm(model=spec, token_latency_ms=float(arg or 0))
+
+    if kind in ("record", "replay"):
+        cassette_dir = os.getenv(CASSETTE_DIR_ENV, DEFAULT_CASSETTE_DIR)
+        if kind == "replay" and not arg:
+            return RecordReplayLlm(model="replay", cassette_dir=cassette_dir, mode="replay")
+        from google.adk.models import Gemini
+        return RecordReplayLlm(
+            model=arg or DEFAULT_MODEL,
+            cassette_dir=cassette_dir,
+            mode="record" if kind == "record" else "auto",
+            inner=Gemini(model=arg or DEFAULT_MODEL),
+        )
+
+    # A plain model name, resolved by ADK's model registry
+    return spec
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text and JSON
+    return max(1, len(text) // 4)
+
+
+class ScriptedFakeLlm(BaseLlm):
+    """
+    A deterministic stand-in for Gemini.
+
+    On a new question it calls every scripted tool the agent has, and once the
+    tool results come back it answers with a summary of them, so the pipeline
+    runs its real tools and state passing with no network access. Each output
+    token costs token_latency_ms of (async) sleep.
+    """
+
+    model: str = "fake"
+    token_latency_ms: float = 0.0
+    script: Dict[str, Dict[str, Any]] = Field(default_factory=lambda: dict(DEFAULT_TOOL_SCRIPT))
+    max_items: int = 20
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        tool_results = [part.function_response for part in (last.parts or []) if part.function_response] if last else []
+        calls = [name for name in self.script if name in (llm_request.tools_dict or {})]
+
+        prompt_tokens = _estimate_tokens(_request_text(llm_request))
+
+        if tool_results or not calls:
+            text = self._summarize(tool_results)
+            words = text.split(" ")
+            chunk = 8
+
+            if stream:
+                for start in range(0, len(words), chunk):
+                    piece = " ".join(words[start:start + chunk]) + " "
+                    await self._sleep_tokens(chunk)
+                    yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=piece)]), partial=True)
+            else:
+                await self._sleep_tokens(len(words))
+
+            yield LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                usage_metadata=_usage(prompt_tokens, len(words)),
+                turn_complete=True,
+            )
+            return
+
+        await self._sleep_tokens(10 * len(calls))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[
+                types.Part(function_call=types.FunctionCall(name=name, args=dict(self.script[name])))
+                for name in calls
+            ]),
+            usage_metadata=_usage(prompt_tokens, 10 * len(calls)),
+        )
+
+    async def _sleep_tokens(self, tokens: int):
+        if self.token_latency_ms:
+            await asyncio.sleep(tokens * self.token_latency_ms / 1000.0)
+
+    def _summarize(self, tool_results: List[types.FunctionResponse]) -> str:
+        if not tool_results:
+            return "There is nothing to look up for this question."
+
+        lines = []
+        for result in tool_results:
+            response = result.response or {}
+            lines.append(f"**{result.name}** ({response.get('status', 'unknown')}):")
+            for key, value in response.items():
+                if isinstance(value, dict) and "rows" in value:
+                    # A compact table from the tools: {"fields": [...], "rows": [[...]]}
+                    value = [dict(zip(value.get("fields", []), row)) for row in value["rows"]]
+                if isinstance(value, list):
+                    lines.append(f"- {key}: {len(value)} item(s)")
+                    for item in value[:self.max_items]:
+                        lines.append(f"  - {_describe(item)}")
+        return "\n".join(lines)
+
+
+def _usage(prompt_tokens: int, output_tokens: int) -> types.GenerateContentResponseUsageMetadata:
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+
+
+def _describe(item: Any) -> str:
+    if not isinstance(item, dict):
+        return str(item)[:80]
+    title = item.get("title") or item.get("name") or item.get("text") or item.get("preview") or item.get("id") or ""
+    details = [f"{key}: {item[key]}" for key in ("course", "course_name", "course_id", "due", "due_utc") if item.get(key)]
+    return str(title)[:80] + (f" ({', '.join(details)})" if details else "")
+
+
+def _request_text(llm_request: LlmRequest) -> str:
+    system = llm_request.config.system_instruction if llm_request.config else None
+    contents = [content.model_dump(mode="json", exclude_none=True) for content in llm_request.contents]
+    return json.dumps([str(system or ""), contents], default=str)
+
+
+def _strip_ids(value: Any) -> Any:
+    """Drop generated function call ids, which differ on every run."""
+    if isinstance(value, dict):
+        return {key: _strip_ids(item) for key, item in value.items() if key != "id"}
+    if isinstance(value, list):
+        return [_strip_ids(item) for item in value]
+    return value
+
+
+def prompt_hash(llm_request: LlmRequest) -> str:
+    """A stable key for a model request: instruction, history and tool names."""
+    config = llm_request.config
+    payload = {
+        "system_instruction": str(config.system_instruction) if config and config.system_instruction else None,
+        "contents": _strip_ids([content.model_dump(mode="json", exclude_none=True) for content in llm_request.contents]),
+        "tools": sorted(llm_request.tools_dict or {}),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class RecordReplayLlm(BaseLlm):
+    """
+    Saves model responses to disk and plays them back.
+
+    mode "record" always calls the inner model and saves the response, "replay"
+    only plays back (a miss is an error), and "auto" plays back when it can and
+    records otherwise.
+    """
+
+    model: str
+    cassette_dir: str
+    mode: str = "auto"
+    inner: Optional[BaseLlm] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = prompt_hash(llm_request)
+        path = self._path(key)
+
+        if self.mode != "record" and os.path.exists(path):
+            with open(path) as f:
+                cassette = json.load(f)
+            for response in cassette["responses"]:
+                yield LlmResponse.model_validate(response)
+            return
+
+        if self.mode == "replay" or self.inner is None:
+            raise LookupError(f"No recorded model response for prompt {key} in {self.cassette_dir}")
+
+        responses = []
+        async for response in self.inner.generate_content_async(llm_request, stream=stream):
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            yield response
+
+        os.makedirs(self.cassette_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.inner.model, "responses": responses}, f, indent=1)
+        os.replace(tmp_path, path)
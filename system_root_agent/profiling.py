@@ -0,0 +1,268 @@
+"""
+Turn Profiling
+
+This module runs a single chat turn under a profiler on demand, without a
+redeploy. Two modes:
+
+    sampling  samples the stacks of the turn's threads every few milliseconds
+              and writes folded stacks (`a;b;c 42` per line), which
+              flamegraph.pl, speedscope and most flamegraph viewers read
+    cprofile  deterministic cProfile of the turn's threads, written as a
+              .prof file for pstats, snakeviz or flameprof
+
+A turn covers the thread that starts it (the event loop) and every worker
+thread its tools run in. In a server the event loop is shared, so other turns
+running at the same time show up in its samples. When no turn is being
+profiled the only cost is one context variable lookup per tool call. Only one
+turn per process is profiled at a time; a request while another profile is
+running is served unprofiled.
+
+Profiles are written to LEARNBRIDGE_PROFILE_DIR (default ./profiles). The
+process keeps the last MAX_PROFILES and deletes the files of older ones. The
+list of profiles is not kept across restarts, so the first profile a process
+saves also deletes the profile files left from before it started.
+"""
+
+import contextvars
+import cProfile
+import functools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_DIR_ENV = "LEARNBRIDGE_PROFILE_DIR"
+PROFILE_MODES = ("sampling", "cprofile")
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Profiles remembered for download
+MAX_PROFILES = 50
+
+_SITE_PACKAGES = "site-packages" + os.sep
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_STDLIB = os.path.dirname(os.__file__) + os.sep
+
+# File names of saved profiles (see TurnProfile.profile_id and save)
+_PROFILE_FILE = re.compile(r"^\d{8}-\d{6}-.+-[0-9a-f]{8}\.(folded|prof)$")
+_PROCESS_STARTED = time.time()
+
+
+def profile_dir() -> str:
+    return os.getenv(PROFILE_DIR_ENV, os.path.join(os.getcwd(), "profiles"))
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if _SITE_PACKAGES in filename:
+        filename = filename.split(_SITE_PACKAGES, 1)[1]
+    elif filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT):]
+    elif filename.startswith(_STDLIB):
+        filename = filename[len(_STDLIB):]
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class TurnProfile:
+    """A profile of one turn across the threads that work on it."""
+
+    def __init__(self, mode: str, owner: str, label: str = "turn"):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.owner = owner
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+        self.path: Optional[str] = None
+        self.elapsed = 0.0
+
+        self._lock = threading.Lock()
+        self._threads: Dict[int, str] = {}
+        self._stacks: Counter = Counter()
+        self._stats: Optional[pstats.Stats] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # --- Threads ---
+
+    @contextmanager
+    def thread(self) -> Iterator[None]:
+        """Include the calling thread in the profile for the duration of a block."""
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ profiles every thread from one active profiler
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self._add_stats(profiler)
+        else:
+            ident = threading.get_ident()
+            with self._lock:
+                self._threads[ident] = threading.current_thread().name
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._threads.pop(ident, None)
+
+    def _add_stats(self, profiler: cProfile.Profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    # --- Sampling ---
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = dict(self._threads)
+            for ident, thread_name in threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(re.sub(r"_\d+$", "", thread_name))
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        if self.mode == "sampling":
+            self._sampler = threading.Thread(target=self._sample, name="turn-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    # --- Output ---
+
+    def save(self) -> str:
+        """Write the profile to the profile directory and return its path."""
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        if self.mode == "sampling":
+            self.path = os.path.join(directory, f"{self.profile_id}.folded")
+            with open(self.path, "w") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        else:
+            self.path = os.path.join(directory, f"{self.profile_id}.prof")
+            if self._stats is not None:
+                self._stats.dump_stats(self.path)
+            else:
+                open(self.path, "wb").close()
+        return self.path
+
+
+_active_profile: contextvars.ContextVar[Optional[TurnProfile]] = contextvars.ContextVar(
+    "learnbridge_profile", default=None
+)
+_profile_slot = threading.Lock()
+_saved_profiles: Dict[str, Tuple[str, str]] = {}
+_saved_lock = threading.Lock()
+_orphans_swept = False
+
+
+def _remove_profile_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing profile {path}: {e}")
+
+
+def _orphaned_profiles(directory: str) -> List[str]:
+    """Profile files written before this process started, which no one can download any more."""
+    orphans = []
+    for entry in os.scandir(directory):
+        if _PROFILE_FILE.match(entry.name) and entry.stat().st_mtime < _PROCESS_STARTED:
+            orphans.append(entry.path)
+    return orphans
+
+
+@contextmanager
+def profile_turn(mode: Optional[str], owner: str, label: str = "turn") -> Iterator[Optional[TurnProfile]]:
+    """
+    Profile the block (a whole turn) if mode is set.
+
+    Yields the TurnProfile, or None when profiling is off or another turn is
+    being profiled. After the block the profile has been saved to .path.
+    """
+    global _orphans_swept
+    if mode and mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+    if not mode or not _profile_slot.acquire(blocking=False):
+        yield None
+        return
+
+    profile = TurnProfile(mode, owner, label)
+    token = _active_profile.set(profile)
+    started = time.perf_counter()
+    try:
+        profile.start()
+        with profile.thread():
+            yield profile
+    finally:
+        profile.stop()
+        _active_profile.reset(token)
+        profile.elapsed = time.perf_counter() - started
+        _profile_slot.release()
+        try:
+            path = profile.save()
+            evicted = []
+            with _saved_lock:
+                if not _orphans_swept:
+                    _orphans_swept = True
+                    evicted += _orphaned_profiles(os.path.dirname(path))
+                _saved_profiles[profile.profile_id] = (owner, path)
+                while len(_saved_profiles) > MAX_PROFILES:
+                    evicted.append(_saved_profiles.pop(next(iter(_saved_profiles)))[1])
+            _remove_profile_files(evicted)
+        except OSError as e:
+            print(f"Error saving profile {profile.profile_id}: {e}")
+
+
+def profiled_in_thread(fn: Callable) -> Callable:
+    """
+    Wrap a function that will run in a worker thread so the thread is part of
+    the active turn profile, if any.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        with profile.thread():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def get_saved_profile(profile_id: str, owner: str) -> Optional[str]:
+    """Path of a saved profile, if it exists and belongs to the owner."""
+    with _saved_lock:
+        saved = _saved_profiles.get(profile_id)
+    if saved is None or saved[0] != owner or not os.path.exists(saved[1]):
+        return None
+    return saved[1]
@@ -0,0 +1,231 @@
+"""
+Classroom Records
+
+This module holds the compact data model for the Classroom data the tools work
+with. The API returns large JSON dicts of which the app uses a handful of keys;
+each item is converted once into a slotted record with only those fields.
+Course ids, course names and enum values are interned, so every record of a
+course shares one copy of each string.
+
+`llm_table` turns records into the terse form the list tools hand to the
+model: the field names once, then one summary row per record. Full content
+(descriptions, materials, submission history) is only fetched by the detail
+tools; `materials_for_llm` and `history_for_llm` shape it for the model.
+"""
+
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from .deadlines import TURNED_IN_STATES, deadline_key, due_timestamp
+
+# Announcement texts are cut to this in list rows (the detail tool has the full text)
+LLM_PREVIEW_CHARS = 120
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def _clip(text: Optional[str], limit: int = LLM_PREVIEW_CHARS) -> Optional[str]:
+    if not text:
+        return None
+    if len(text) <= limit:
+        return text
+    return " ".join(text[:limit * 2].split())[:limit - 3] + "..."
+
+
+@dataclass
+class Course:
+    __slots__ = ("id", "name", "section", "link")
+    id: str
+    name: str
+    section: Optional[str]
+    link: Optional[str]
+
+    @classmethod
+    def from_api(cls, course: Dict[str, Any]) -> "Course":
+        return cls(
+            id=_intern(course["id"]),
+            name=_intern(course.get("name") or "Unknown Course"),
+            section=_intern(course.get("section")),
+            link=course.get("alternateLink"),
+        )
+
+
+@dataclass
+class Submission:
+    """The current user's submission for a coursework item."""
+    __slots__ = ("state", "assigned_grade", "draft_grade", "late", "link")
+    state: Optional[str]
+    assigned_grade: Optional[float]
+    draft_grade: Optional[float]
+    late: bool
+    link: Optional[str]
+
+    @classmethod
+    def from_api(cls, submission: Dict[str, Any]) -> "Submission":
+        return cls(
+            state=_intern(submission.get("state")),
+            assigned_grade=submission.get("assignedGrade"),
+            draft_grade=submission.get("draftGrade"),
+            late=bool(submission.get("late")),
+            link=submission.get("alternateLink"),
+        )
+
+
+def _number(value: float) -> str:
+    return f"{value:g}"
+
+
+@dataclass
+class CourseWork:
+    """An assignment without its content; see get_assignment_details for that."""
+    __slots__ = ("id", "course_id", "course_name", "title", "work_type",
+                 "max_points", "due", "link", "submission")
+    id: str
+    course_id: str
+    course_name: str
+    title: str
+    work_type: Optional[str]
+    max_points: Optional[float]
+    # UTC epoch timestamp, None when the item has no due date
+    due: Optional[float]
+    link: Optional[str]
+    submission: Optional[Submission]
+
+    LLM_FIELDS = ("id", "course_id", "title", "due_utc", "state", "grade")
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any], course: Course,
+                 submission: Optional[Dict[str, Any]] = None) -> "CourseWork":
+        return cls(
+            id=item["id"],
+            course_id=course.id,
+            course_name=course.name,
+            title=item.get("title") or "Untitled",
+            work_type=_intern(item.get("workType")),
+            max_points=item.get("maxPoints"),
+            due=due_timestamp(item),
+            link=item.get("alternateLink"),
+            submission=Submission.from_api(submission) if submission else None,
+        )
+
+    @property
+    def key(self) -> str:
+        return deadline_key(self.course_id, self.id)
+
+    @property
+    def turned_in(self) -> bool:
+        return self.submission is not None and self.submission.state in TURNED_IN_STATES
+
+    def llm_row(self) -> List[Any]:
+        submission = self.submission
+        state = grade = None
+        if submission is not None:
+            state = submission.state
+            if submission.late:
+                state = f"{state} late"
+            if submission.assigned_grade is not None:
+                grade = _number(submission.assigned_grade)
+                if self.max_points:
+                    grade = f"{grade}/{_number(self.max_points)}"
+        return [self.id, self.course_id, self.title, format_due(self.due), state, grade]
+
+
+@dataclass
+class Announcement:
+    __slots__ = ("id", "course_id", "course_name", "text", "created", "updated", "link")
+    id: str
+    course_id: str
+    course_name: str
+    text: str
+    # RFC 3339 timestamps as returned by the API
+    created: Optional[str]
+    updated: Optional[str]
+    link: Optional[str]
+
+    LLM_FIELDS = ("id", "course_id", "posted", "preview")
+
+    @classmethod
+    def from_api(cls, announcement: Dict[str, Any], course: Course) -> "Announcement":
+        return cls(
+            id=announcement["id"],
+            course_id=course.id,
+            course_name=course.name,
+            text=announcement.get("text") or "",
+            created=announcement.get("creationTime"),
+            updated=announcement.get("updateTime"),
+            link=announcement.get("alternateLink"),
+        )
+
+    @property
+    def posted(self) -> str:
+        return self.updated or self.created or ""
+
+    def llm_row(self) -> List[Any]:
+        return [self.id, self.course_id, self.posted[:10] or None, _clip(self.text)]
+
+
+def format_due(due: Optional[float]) -> Optional[str]:
+    if due is None:
+        return None
+    return datetime.fromtimestamp(due, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def llm_table(record_type: type, records: Sequence[Any]) -> Dict[str, Any]:
+    """Records as {"fields": [...], "rows": [[...], ...]} for a tool response."""
+    return {"fields": list(record_type.LLM_FIELDS), "rows": [record.llm_row() for record in records]}
+
+
+def for_llm(result: Dict[str, Any], key: str, record_type: type) -> Dict[str, Any]:
+    """
+    The tool response the model sees for a loaded result: the records under key
+    as an llm_table, and the checked courses as "courses" ({course_id: name}).
+    """
+    compact = {name: value for name, value in result.items() if name not in ("courses_checked", "message")}
+    compact[key] = llm_table(record_type, result.get(key, []))
+    compact["courses"] = {course.id: course.name for course in result.get("courses_checked", [])}
+    return compact
+
+
+def _format_timestamp(timestamp: Optional[str]) -> Optional[str]:
+    # RFC 3339 from the API -> "YYYY-MM-DD HH:MM"
+    return timestamp[:16].replace("T", " ") if timestamp else None
+
+
+def materials_for_llm(materials: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Optional[str]]]:
+    """Drive files, videos, links and forms attached to an item, as {"title", "url"}."""
+    result = []
+    for material in materials or []:
+        if "driveFile" in material:
+            target = material["driveFile"].get("driveFile", {})
+            result.append({"title": target.get("title"), "url": target.get("alternateLink")})
+        elif "youtubeVideo" in material:
+            target = material["youtubeVideo"]
+            result.append({"title": target.get("title"), "url": target.get("alternateLink")})
+        elif "link" in material:
+            target = material["link"]
+            result.append({"title": target.get("title"), "url": target.get("url")})
+        elif "form" in material:
+            target = material["form"]
+            result.append({"title": target.get("title"), "url": target.get("formUrl")})
+    return result
+
+
+def history_for_llm(history: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """A submission's state changes and grade changes, oldest first."""
+    result = []
+    for event in history or []:
+        if "stateHistory" in event:
+            change = event["stateHistory"]
+            result.append({"state": change.get("state"), "at": _format_timestamp(change.get("stateTimestamp"))})
+        elif "gradeHistory" in event:
+            change = event["gradeHistory"]
+            grade = change.get("pointsEarned")
+            if grade is not None and change.get("maxPoints"):
+                grade = f"{_number(grade)}/{_number(change['maxPoints'])}"
+            result.append({"grade": grade, "change": change.get("gradeChangeType"),
+                           "at": _format_timestamp(change.get("gradeTimestamp"))})
+    return result
@@ -0,0 +1,191 @@
+"""
+Model Routing
+
+This module sends each model call to a small, fast model or a larger one. The
+turn's question is classified once (classify_query): lookups and reformatting
+("what's due this week", "show my grades") are "simple", while open-ended or
+generative requests ("write a sample answer to...", "help me plan...") and
+long, multi-part questions are "complex". Each agent runs on a RoutedLlm with
+a tier policy:
+
+    small   always the small model (agents that reformat tool output)
+    large   always the large model
+    auto    the small model for simple turns, the large one for complex turns
+
+A call falls back to the other model when the chosen one raises, or when a
+streaming call has not sent its first chunk within its tier's timeout.
+Without streaming the first response is the whole answer, so a slow one is
+waited for rather than thrown away. A model that fails repeatedly is skipped
+for a cooldown. Every response is tagged in custom_metadata with the
+model and tier that served it, which the usage accounting records per turn.
+"""
+
+import asyncio
+import copy
+import re
+import threading
+import time
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from opentelemetry import trace
+
+from .context import check_cancelled, current_request
+
+SIMPLE = "simple"
+COMPLEX = "complex"
+
+SMALL = "small"
+LARGE = "large"
+AUTO = "auto"
+POLICIES = (SMALL, LARGE, AUTO)
+
+# Longest a streaming model may take to start answering before the other one is tried
+FIRST_RESPONSE_TIMEOUT_SECONDS = {SMALL: 15.0, LARGE: 60.0}
+
+# Failures in a row after which a model is skipped, and for how long
+FAILURES_BEFORE_COOLDOWN = 3
+COOLDOWN_SECONDS = 60.0
+
+# Questions longer than this are treated as complex
+SIMPLE_MAX_WORDS = 25
+
+_COMPLEX_PATTERN = re.compile(
+    r"\b("
+    r"write|draft|compose|rewrite|essay|paragraph|outline|brainstorm|"
+    r"(sample|example|model) (answer|response|solution)|"
+    r"explain|why|how (do|does|should|can|could|would|to)|"
+    r"help me (with|write|plan|understand|study|prepare|solve)|"
+    r"plan|schedule my|strategy|prioriti[sz]e|"
+    r"compare|analy[sz]e|evaluate|critique|feedback|improve|"
+    r"solve|prove|derive|calculate what|what if"
+    r")\b",
+    re.IGNORECASE,
+)
+
+
+def classify_query(query: str) -> str:
+    """SIMPLE for lookups and reformatting, COMPLEX for open-ended or generative questions."""
+    text = query.strip()
+    if _COMPLEX_PATTERN.search(text):
+        return COMPLEX
+    if len(text.split()) > SIMPLE_MAX_WORDS or text.count("?") > 1:
+        return COMPLEX
+    return SIMPLE
+
+
+class ModelHealth:
+    """Failures in a row per model, to skip models that keep failing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures: Dict[str, Tuple[int, float]] = {}
+
+    def available(self, model: str) -> bool:
+        with self._lock:
+            failures, last_failure = self._failures.get(model, (0, 0.0))
+        return failures < FAILURES_BEFORE_COOLDOWN or time.monotonic() - last_failure >= COOLDOWN_SECONDS
+
+    def record(self, model: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._failures.pop(model, None)
+            else:
+                failures, _ = self._failures.get(model, (0, 0.0))
+                self._failures[model] = (failures + 1, time.monotonic())
+
+
+model_health = ModelHealth()
+
+
+def _resolve(model) -> BaseLlm:
+    return model if isinstance(model, BaseLlm) else LLMRegistry.new_llm(model)
+
+
+def _turn_complexity() -> Optional[str]:
+    try:
+        return current_request().complexity
+    except RuntimeError:
+        return None
+
+
+class RoutedLlm(BaseLlm):
+    """Picks the small or large model per call, falling back to the other one."""
+
+    model: str = "route"
+    small: BaseLlm
+    large: BaseLlm
+    policy: str = AUTO
+
+    def tier(self) -> str:
+        """The tier this call should use; an unclassified turn gets the large model."""
+        if self.policy != AUTO:
+            return self.policy
+        return SMALL if _turn_complexity() == SIMPLE else LARGE
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        first = self.tier()
+        order = [first, LARGE if first == SMALL else SMALL]
+        # A model that keeps failing is tried last until its cooldown ends
+        if not model_health.available(self._llm(first).model):
+            order.reverse()
+
+        # Models edit the request before sending it, the fallback gets the original
+        contents = copy.deepcopy(llm_request.contents)
+        config = llm_request.config.model_copy(deep=True) if llm_request.config else None
+
+        for attempt, tier in enumerate(order):
+            # A cancelled turn makes no more model calls, fallbacks included
+            check_cancelled()
+            llm = self._llm(tier)
+            last = attempt == len(order) - 1
+            if attempt:
+                llm_request.contents = copy.deepcopy(contents)
+                llm_request.config = config.model_copy(deep=True) if config else None
+            llm_request.model = llm.model
+
+            responses = llm.generate_content_async(llm_request, stream=stream)
+            timeout = FIRST_RESPONSE_TIMEOUT_SECONDS[tier] if stream else None
+            try:
+                response = await asyncio.wait_for(responses.__anext__(), timeout)
+            except StopAsyncIteration:
+                model_health.record(llm.model, ok=True)
+                return
+            except Exception as e:
+                await responses.aclose()
+                model_health.record(llm.model, ok=False)
+                if last:
+                    raise
+                reason = "timed out" if isinstance(e, asyncio.TimeoutError) else f"failed ({e})"
+                print(f"Model {llm.model} {reason}, falling back to {self._llm(order[attempt + 1]).model}")
+                continue
+
+            model_health.record(llm.model, ok=True)
+            span = trace.get_current_span()
+            span.set_attribute("llm.routed_model", llm.model)
+            span.set_attribute("llm.routed_tier", tier)
+            tag = {"model": llm.model, "tier": tier, "fallback": tier != first}
+
+            # Once a response is out the call belongs to this model
+            yield self._tagged(response, tag)
+            async for response in responses:
+                yield self._tagged(response, tag)
+            return
+
+    def _llm(self, tier: str) -> BaseLlm:
+        return self.small if tier == SMALL else self.large
+
+    @staticmethod
+    def _tagged(response: LlmResponse, tag: Dict[str, object]) -> LlmResponse:
+        response.custom_metadata = {**(response.custom_metadata or {}), **tag}
+        return response
+
+
+def routed_model(policy: str, small, large) -> RoutedLlm:
+    """A RoutedLlm over two models (names or BaseLlm instances)."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown routing policy {policy!r}, expected one of {POLICIES}")
+    return RoutedLlm(small=_resolve(small), large=_resolve(large), policy=policy)
@@ -0,0 +1,285 @@
+"""
+Shared Cache
+
+A cache tier shared by every worker process, so Classroom content is fetched
+once however many processes serve the users who need it. Entries are keyed by
+course (e.g. "course/<id>/coursework"), so a course's assignments and
+announcements are fetched once for everyone enrolled. Only content addressed
+to the whole course (assigneeMode ALL_STUDENTS) goes in here; work and
+announcements for individual students and per-user data (their submissions)
+never do.
+
+The backend is selected with the LEARNBRIDGE_CACHE_URL environment variable:
+    memory://                      In-process only (default, one worker)
+    sqlite:////data/cache.db       SQLite in WAL mode (several processes, one node)
+    redis://host:6379/0            Redis or any Redis-protocol server (several nodes)
+
+Every entry has a TTL, and values are stored as zlib-compressed JSON. The
+memory and SQLite backends evict the least recently used entries beyond
+LEARNBRIDGE_CACHE_MAX_MB; on Redis, set maxmemory and
+maxmemory-policy allkeys-lru on the server instead.
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Optional, Tuple
+
+from .single_flight import SingleFlight
+from .tracing import tracer
+
+CACHE_URL_ENV = "LEARNBRIDGE_CACHE_URL"
+CACHE_MAX_MB_ENV = "LEARNBRIDGE_CACHE_MAX_MB"
+DEFAULT_CACHE_URL = "memory://"
+DEFAULT_CACHE_MAX_MB = 256
+
+# Course-level entries are kept this long; new work reaches users within
+# this plus their own FRESH_TTL_SECONDS (see freshness.py)
+COURSE_TTL_SECONDS = 120
+
+# Values smaller than this are stored uncompressed
+COMPRESS_MIN_BYTES = 512
+
+# SQLite: last-access times are only written back this often per entry
+TOUCH_INTERVAL_SECONDS = 60
+
+# Fetches of missed keys in flight in this process
+_fetches = SingleFlight()
+
+_RAW = b"\0"
+_ZLIB = b"z"
+
+
+def encode(value: Any) -> bytes:
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return _RAW + raw
+    return _ZLIB + zlib.compress(raw, 1)
+
+
+def decode(payload: bytes) -> Any:
+    body = payload[1:]
+    return json.loads(zlib.decompress(body) if payload[:1] == _ZLIB else body)
+
+
+class SharedCache(ABC):
+    """Interface of the shared tier: compressed JSON values with a TTL per entry."""
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """The stored payload for key, or None if missing or expired."""
+
+    @abstractmethod
+    def set_bytes(self, key: str, payload: bytes, ttl: float):
+        """Store a payload for ttl seconds."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove an entry."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry."""
+
+    def get(self, key: str) -> Optional[Any]:
+        payload = self.get_bytes(key)
+        return decode(payload) if payload is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.set_bytes(key, encode(value), ttl)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> Optional[Any]:
+        """The cached value for key, or fetch() stored for ttl. None (a failed fetch) is not stored."""
+        with tracer.start_as_current_span("shared_cache.get", attributes={"cache.key": key}) as span:
+            try:
+                value = self.get(key)
+            except Exception as e:
+                # The cache is an optimization, a broken backend must not fail the fetch
+                print(f"Shared cache read failed for {key}: {e}")
+                value = None
+            span.set_attribute("cache.hit", value is not None)
+        if value is not None:
+            return value
+        # Callers in this process that miss the same key wait for one fetch
+        return _fetches.do((id(self), key), lambda: self._fill(key, fetch, ttl))
+
+    def _fill(self, key: str, fetch: Callable[[], Optional[Any]], ttl: float) -> Optional[Any]:
+        value = fetch()
+        if value is not None:
+            try:
+                self.set(key, value, ttl)
+            except Exception as e:
+                print(f"Shared cache write failed for {key}: {e}")
+        return value
+
+
+class MemorySharedCache(SharedCache):
+    """Process-local LRU with TTLs, bounded by the total payload size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._size = 0
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set_bytes(self, key: str, payload: bytes, ttl: float):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + ttl, payload)
+            self._size += len(payload)
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+class SQLiteSharedCache(SharedCache):
+    """A SQLite file in WAL mode shared by the processes of one node."""
+
+    def __init__(self, path: str, max_bytes: int):
+        import sqlite3
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sqlite3 = sqlite3
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS learnbridge_cache ("
+                " key TEXT PRIMARY KEY, payload BLOB NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS learnbridge_cache_lru ON learnbridge_cache (accessed_at)")
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            # WAL lets several processes read while one writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT payload, expires_at, accessed_at FROM learnbridge_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        payload, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at <= now:
+            connection.execute("DELETE FROM learnbridge_cache WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if now - accessed_at > TOUCH_INTERVAL_SECONDS:
+            connection.execute("UPDATE learnbridge_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return payload
+
+    def set_bytes(self, key: str, payload: bytes, ttl: float):
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO learnbridge_cache (key, payload, expires_at, accessed_at, size)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, self._sqlite3.Binary(payload), now + ttl, now, len(payload)),
+            )
+            self._evict(connection, key, now)
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM learnbridge_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM learnbridge_cache")
+
+    def _evict(self, connection, kept: str, now: float):
+        connection.execute("DELETE FROM learnbridge_cache WHERE expires_at <= ?", (now,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM learnbridge_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used entries until the rest fits
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM learnbridge_cache WHERE key != ? ORDER BY accessed_at, rowid", (kept,)
+        ):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        connection.executemany("DELETE FROM learnbridge_cache WHERE key = ?", doomed)
+
+
+class RedisSharedCache(SharedCache):
+    """Any Redis-protocol server, shared by every node. Needs the redis package."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(f"{CACHE_URL_ENV}={url} needs the redis package (pip install redis)") from e
+        self._client = redis.Redis.from_url(url)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self._client.get(f"learnbridge:{key}")
+
+    def set_bytes(self, key: str, payload: bytes, ttl: float):
+        self._client.set(f"learnbridge:{key}", payload, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str):
+        self._client.delete(f"learnbridge:{key}")
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match="learnbridge:*", count=1000))
+        if keys:
+            self._client.delete(*keys)
+
+
+def shared_cache_from_url(url: str, max_bytes: int) -> SharedCache:
+    if url.startswith("memory://"):
+        return MemorySharedCache(max_bytes)
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedCache(url[len("sqlite:///"):], max_bytes)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(url)
+    raise ValueError(f"Unsupported {CACHE_URL_ENV}: {url}")
+
+
+@lru_cache(maxsize=None)
+def get_shared_cache() -> SharedCache:
+    """Get the process-wide shared cache selected by LEARNBRIDGE_CACHE_URL."""
+    max_bytes = int(float(os.getenv(CACHE_MAX_MB_ENV, DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+    return shared_cache_from_url(os.getenv(CACHE_URL_ENV, DEFAULT_CACHE_URL), max_bytes)
@@ -0,0 +1,84 @@
+"""
+Single-Flight Calls
+
+Identical work that is already running is joined rather than started again:
+the first caller for a key runs it, and every caller that arrives while it is
+running gets the same result (or exception) from its future. Nothing is
+cached once the call is done.
+
+Turns use it so a double-clicked sidebar button or a page reloaded mid-turn
+attaches to the running turn (see turns.py), and the item caches use it so
+the sessions of one user (or the users of one course) fetch an item once.
+Futures are concurrent.futures.Future, so callers on different threads and
+event loops (every Streamlit script run has its own) can join each other.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from .cancellation import TurnCancelled
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Calls in flight by key; a call made while one with its key runs joins it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """The future of key's call and whether the caller leads it (must run it and settle())."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def settle(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        """Finish a led call; callers that join after this start a new one."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """fn(), or the result of the call with this key already running."""
+        future, leader = self.join(key)
+        if not leader:
+            try:
+                return future.result()
+            except TurnCancelled:
+                # The leader's turn was cancelled, not this caller's
+                return self.do(key, fn)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """(await fn(), False), or (the running call's result, True) if one with this key is in flight."""
+        future, leader = self.join(key)
+        if not leader:
+            # shield: a joiner giving up must not cancel the leader's call
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result)
+        return result, False
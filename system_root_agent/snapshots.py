@@ -0,0 +1,334 @@
+"""
+Data Snapshots
+
+This module persists each user's gathered Classroom data (coursework with
+their submissions, announcements) to disk, so a restarted process can answer
+from it at once instead of refetching everything on every user's first turn.
+It is enabled by setting LEARNBRIDGE_SNAPSHOT_DIR.
+
+Every successful fetch writes the user's records for that dataset to one file,
+in the background. A snapshot holds a string table (every distinct string once,
+as one UTF-8 blob plus offsets) and one typed column per record field: string
+columns hold indexes into the table, numbers and dates are float64 columns.
+Files hold grades and announcement text, so each one is Fernet-encrypted with
+LEARNBRIDGE_CREDENTIALS_KEY like the stored credentials (see storage.py);
+without the key snapshots are off. Reading a file decrypts it and views the
+columns in place with numpy, so restoring costs no parsing beyond building the
+records themselves. Files are only read when a user's data is first needed,
+never all at startup.
+
+Nothing is kept longer than SNAPSHOT_MAX_AGE_SECONDS: an older snapshot is
+deleted when it is read, and saving sweeps the whole directory for old files
+at most once per SWEEP_INTERVAL_SECONDS, which removes the data of users who
+never come back. FreshnessCache also sweeps once at startup.
+
+Restored data is served as stale while it is refreshed (see freshness.py).
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from storage import TokenCipher
+
+from .deadlines import get_deadline_index
+from .records import Announcement, Course, CourseWork, Submission
+
+SNAPSHOT_DIR_ENV = "LEARNBRIDGE_SNAPSHOT_DIR"
+
+# Snapshots older than this are not restored, and are deleted by the sweep
+SNAPSHOT_MAX_AGE_SECONDS = 24 * 3600
+
+# How often saving a snapshot also sweeps the directory for old ones
+SWEEP_INTERVAL_SECONDS = 3600
+
+_MAGIC = b"LBSNAP02"
+_HEADER = struct.Struct("<8sI")
+_ALIGN = 8
+
+# Index of a missing string
+_NONE = np.iinfo(np.uint32).max
+
+# Record fields per column kind: "s" string, "f" float (NaN for None), "b" flag
+_COURSE_COLUMNS = (("id", "s"), ("name", "s"), ("section", "s"), ("link", "s"))
+_COURSEWORK_COLUMNS = (
+    ("id", "s"), ("course_id", "s"), ("title", "s"), ("work_type", "s"),
+    ("max_points", "f"), ("due", "f"), ("link", "s"),
+)
+_SUBMISSION_COLUMNS = (("state", "s"), ("assigned_grade", "f"), ("draft_grade", "f"), ("late", "b"), ("link", "s"))
+_ANNOUNCEMENT_COLUMNS = (
+    ("id", "s"), ("course_id", "s"), ("text", "s"), ("created", "s"), ("updated", "s"), ("link", "s"),
+)
+
+
+class _Writer:
+    """Collects columns and interned strings, then lays them out in one buffer."""
+
+    def __init__(self):
+        self._strings: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def string(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+        return index
+
+    def add(self, table: str, columns: Sequence[Tuple[str, str]], records: Sequence[Any],
+            get: Callable[[Any, str], Any] = getattr):
+        for name, kind in columns:
+            values = [get(record, name) for record in records]
+            if kind == "s":
+                column = np.fromiter((self.string(value) for value in values), np.uint32, len(values))
+            elif kind == "f":
+                column = np.fromiter((np.nan if value is None else value for value in values), np.float64, len(values))
+            else:
+                column = np.fromiter((-1 if value is None else bool(value) for value in values), np.int8, len(values))
+            self._columns[f"{table}.{name}"] = column
+
+    def encode(self, meta: Dict[str, Any]) -> bytes:
+        strings = [value.encode("utf-8") for value in self._strings]
+        offsets = np.zeros(len(strings) + 1, np.uint64)
+        np.cumsum([len(value) for value in strings], out=offsets[1:])
+        blocks = {"strings.offsets": offsets, **self._columns}
+
+        # Every block starts 8-byte aligned after the header
+        layout = {}
+        position = 0
+        for name, block in blocks.items():
+            layout[name] = [block.dtype.str, position, len(block)]
+            position += -(-block.nbytes // _ALIGN) * _ALIGN
+        layout["strings.data"] = ["|u1", position, int(offsets[-1])]
+
+        header = json.dumps({**meta, "blocks": layout}).encode("utf-8")
+        header += b" " * (-(_HEADER.size + len(header)) % _ALIGN)
+
+        parts = [_HEADER.pack(_MAGIC, len(header)), header]
+        for block in blocks.values():
+            parts.append(block.tobytes())
+            parts.append(b"\0" * (-block.nbytes % _ALIGN))
+        parts.extend(strings)
+        return b"".join(parts)
+
+
+class _Reader:
+    """Zero-copy views of a decrypted snapshot's columns."""
+
+    def __init__(self, data: bytes):
+        magic, header_size = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("not a snapshot")
+        self._buffer = data
+        self.meta = json.loads(data[_HEADER.size:_HEADER.size + header_size])
+        self._base = _HEADER.size + header_size
+        self._offsets = self.block("strings.offsets")
+        self._data = self.block("strings.data")
+
+    def block(self, name: str) -> np.ndarray:
+        dtype, offset, count = self.meta["blocks"][name]
+        return np.frombuffer(self._buffer, dtype=np.dtype(dtype), count=count, offset=self._base + offset)
+
+    def strings(self, column: np.ndarray) -> List[Optional[str]]:
+        """Decode a string column, each distinct string once."""
+        cache: Dict[int, Optional[str]] = {int(_NONE): None}
+        values = []
+        for index in column.tolist():
+            if index not in cache:
+                start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+                cache[index] = self._data[start:end].tobytes().decode("utf-8")
+            values.append(cache[index])
+        return values
+
+    def table(self, table: str, columns: Sequence[Tuple[str, str]]) -> Dict[str, List[Any]]:
+        """A table's columns as lists of Python values."""
+        result = {}
+        for name, kind in columns:
+            column = self.block(f"{table}.{name}")
+            if kind == "s":
+                result[name] = self.strings(column)
+            elif kind == "f":
+                result[name] = [None if value != value else value for value in column.tolist()]
+            else:
+                result[name] = [None if value < 0 else bool(value) for value in column.tolist()]
+        return result
+
+
+def _courses(reader: _Reader) -> List[Course]:
+    return [Course(*values) for values in zip(*reader.table("courses", _COURSE_COLUMNS).values())]
+
+
+def _course_names(courses: List[Course]) -> Dict[str, str]:
+    return {course.id: course.name for course in courses}
+
+
+def _encode_coursework(writer: _Writer, value: Dict[str, Any]):
+    coursework = value.get("coursework", [])
+    writer.add("courses", _COURSE_COLUMNS, value.get("courses_checked", []))
+    writer.add("coursework", _COURSEWORK_COLUMNS, coursework)
+    submissions = [item.submission for item in coursework]
+    writer.add("submission", (("present", "b"),), submissions, lambda submission, _: submission is not None)
+    writer.add("submission", _SUBMISSION_COLUMNS, submissions,
+               lambda submission, name: getattr(submission, name) if submission is not None else None)
+
+
+def _decode_coursework(reader: _Reader) -> Dict[str, Any]:
+    courses = _courses(reader)
+    names = _course_names(courses)
+    present = reader.table("submission", (("present", "b"),))["present"]
+    submissions = zip(*reader.table("submission", _SUBMISSION_COLUMNS).values())
+
+    coursework = []
+    rows = zip(*reader.table("coursework", _COURSEWORK_COLUMNS).values())
+    for (id, course_id, title, work_type, max_points, due, link), has_submission, submission in zip(rows, present, submissions):
+        coursework.append(CourseWork(
+            id, course_id, names.get(course_id, "Unknown Course"), title, work_type, max_points, due, link,
+            Submission(*submission) if has_submission else None,
+        ))
+    return {"status": "success", "coursework": coursework, "total_count": len(coursework), "courses_checked": courses}
+
+
+def _encode_announcements(writer: _Writer, value: Dict[str, Any]):
+    writer.add("courses", _COURSE_COLUMNS, value.get("courses_checked", []))
+    writer.add("announcements", _ANNOUNCEMENT_COLUMNS, value.get("announcements", []))
+
+
+def _decode_announcements(reader: _Reader) -> Dict[str, Any]:
+    courses = _courses(reader)
+    names = _course_names(courses)
+    announcements = [
+        Announcement(id, course_id, names.get(course_id, "Unknown Course"), text, created, updated, link)
+        for id, course_id, text, created, updated, link
+        in zip(*reader.table("announcements", _ANNOUNCEMENT_COLUMNS).values())
+    ]
+    return {"status": "success", "announcements": announcements, "total_count": len(announcements),
+            "courses_checked": courses}
+
+
+# Datasets that are persisted: (encode, decode)
+_CODECS = {
+    "coursework": (_encode_coursework, _decode_coursework),
+    "announcements": (_encode_announcements, _decode_announcements),
+}
+
+
+class SnapshotStore:
+    """Per-user, per-dataset encrypted snapshot files in one directory."""
+
+    def __init__(self, directory: str, cipher: TokenCipher, max_age: float = SNAPSHOT_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_age = max_age
+        self._cipher = cipher
+        self._last_sweep = 0.0
+
+    def persists(self, dataset: str) -> bool:
+        return dataset in _CODECS
+
+    def save(self, user_id: str, dataset: str, fetched_at: float, value: Dict[str, Any]):
+        """Write a dataset's records for a user, replacing the previous snapshot."""
+        writer = _Writer()
+        _CODECS[dataset][0](writer, value)
+        data = writer.encode({"dataset": dataset, "fetched_at": fetched_at})
+        self._write(self._path(user_id, dataset), self._cipher.encrypt_bytes(data))
+        if time.time() - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+            self.sweep()
+
+    def load(self, user_id: str, dataset: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """(fetched_at, value) of a user's snapshot, or None if there is no usable one."""
+        path = self._path(user_id, dataset)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                reader = _Reader(self._cipher.decrypt_bytes(f.read()))
+            fetched_at = reader.meta["fetched_at"]
+            if time.time() - fetched_at >= self.max_age:
+                self.delete(user_id, dataset)
+                return None
+            value = _CODECS[dataset][1](reader)
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            print(f"Ignoring unreadable snapshot {path}: {e}")
+            return None
+        return fetched_at, value
+
+    def restored(self, user_id: str, dataset: str, value: Dict[str, Any]):
+        """Rebuild what a fetch would have built alongside restored data."""
+        if dataset == "coursework":
+            # fetch_course_work updates the index on every fetch
+            get_deadline_index(user_id).sync(value["coursework"])
+
+    def delete(self, user_id: str, dataset: Optional[str] = None):
+        """Remove a user's snapshots (one dataset, or all of them)."""
+        for name in [dataset] if dataset else list(_CODECS):
+            try:
+                os.unlink(self._path(user_id, name))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self) -> int:
+        """
+        Delete every file older than max_age, so the data of users who never
+        come back does not outlive it. Returns how many files were deleted.
+        """
+        self._last_sweep = now = time.time()
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for user_key in os.listdir(self.directory):
+            user_dir = os.path.join(self.directory, user_key)
+            if not os.path.isdir(user_dir):
+                continue
+            for name in os.listdir(user_dir):
+                path = os.path.join(user_dir, name)
+                try:
+                    # Covers files left by an older format or an interrupted write
+                    if now - os.path.getmtime(path) >= self.max_age:
+                        os.unlink(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(user_dir)
+            except OSError:
+                # Not empty
+                pass
+        return removed
+
+    def _path(self, user_id: str, dataset: str) -> str:
+        # User ids are hashed so file names reveal nothing
+        user_key = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, user_key, f"{dataset}.snap")
+
+    @staticmethod
+    def _write(path: str, payload: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            # Readers only ever see a complete file
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def snapshot_store_from_env() -> Optional[SnapshotStore]:
+    """The store under LEARNBRIDGE_SNAPSHOT_DIR, or None if snapshots are off."""
+    directory = os.getenv(SNAPSHOT_DIR_ENV)
+    if not directory:
+        return None
+    try:
+        cipher = TokenCipher.from_env()
+    except ValueError as e:
+        print(f"{SNAPSHOT_DIR_ENV} is set but snapshots are off: {e}")
+        return None
+    return SnapshotStore(directory, cipher)
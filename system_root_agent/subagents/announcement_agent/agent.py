@@ -6,15 +6,14 @@ This agent is responsible for gathering and analyzing Google Classroom announcem
 
 from google.adk.agents import LlmAgent
 
+from ...context import threaded_tool
+from ...models import get_model
 from .tools import get_announcements
 
-# --- Constants ---
-GEMINI_MODEL = "gemini-2.0-flash"
-
 # Announcement Agent
 announcement_agent = LlmAgent(
     name="AnnouncementAgent",
-    model=GEMINI_MODEL,
+    model=get_model("AnnouncementAgent"),
     instruction="""You are an Announcement Agent for Google Classroom.
     
     When asked for any information, you should:
@@ -24,17 +23,13 @@ announcement_agent = LlmAgent(
     
     The tool will return a dictionary with:
     - status: "success" or "error"
-    - announcements: List of announcement objects with fields like:
-      * id: Announcement ID
-      * courseId: Course ID
-      * courseName: Course name
-      * text: Announcement content
-      * creationTime: When it was created
-      * updateTime: When it was last updated
-      * creatorUserId: Who created it
-      * state: Current state (PUBLISHED, DRAFT, etc.)
+    - announcements: A table with "fields" (the column names) and "rows" (one list of values per announcement):
+      * id: Announcement id
+      * course_id: Course id (see courses for its name)
+      * posted: Date it was posted or last updated (YYYY-MM-DD)
+      * preview: The start of the announcement text
     - total_count: Total number of announcements
-    - courses_checked: List of courses that were checked
+    - courses: The courses that were checked, as {course_id: course name}
     - error_message: Error details (if status is "error")
     
     Format your response as a well-structured report section with:
@@ -45,9 +40,10 @@ announcement_agent = LlmAgent(
     - Error information if any occurred
     
     IMPORTANT: You MUST call the get_announcements tool. Do not make up information.
+    Keep each announcement's id and course_id in the report, so its full text can be looked up later.
     If there are no announcements or errors, clearly state that in your response.
     """,
     description="Gathers and analyzes Google Classroom announcements",
-    tools=[get_announcements],
+    tools=[threaded_tool(get_announcements)],
     output_key="announcements_info",
 )
@@ -1,45 +1,65 @@
 """
 Google Classroom Announcements Tool
 
-This module provides a tool for gathering announcements from Google Classroom.
+This module provides tools for announcements from Google Classroom:
+get_announcements lists every announcement with a short preview, and
+get_announcement fetches one announcement's full text and materials.
 """
 
-import sys
-import os
-# Add project root to sys.path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))) )
-
 import time
 from typing import Any, Dict, List, Optional
-import streamlit as st
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from oauth_web_config import get_classroom_service, get_user_id
+from ...catalog import course_catalog
+from ...cancellation import TurnCancelled
+from ...context import check_cancelled, current_request
+from ...details import detail_cache
+from ...freshness import freshness_cache
+from ...records import Announcement, for_llm, materials_for_llm
+from ...tracing import tracer
+
+# Materials are left to get_announcement
+_LIST_FIELDS = "nextPageToken,announcements(id,text,creationTime,updateTime,alternateLink)"
 
 
 def get_announcements() -> Dict[str, Any]:
     """
-    Fetches all announcements from Google Classroom courses.
+    Lists all announcements from Google Classroom courses, each with the start of its text.
+    Call get_announcement for the full text, attached materials and link of an announcement.
     
     Returns:
         Dict containing announcements data with structure:
         {
             "status": "success" | "error",
-            "announcements": [...],
+            "announcements": {"fields": [...], "rows": [[...], ...]},
             "total_count": int,
-            "courses_checked": [...],
+            "courses": {course_id: course name, ...},
+            "data_as_of": str (when the data was fetched, UTC),
             "error_message": str (if status is error)
         }
+        Each row holds the values of one announcement in the order of
+        "fields": id, course_id, posted (date), preview (the start of the text).
+    """
+    return for_llm(load_announcements(), "announcements", Announcement)
+
+
+def load_announcements() -> Dict[str, Any]:
+    """
+    The current user's announcements as Announcement records, served under the
+    freshness policy (see freshness.py). Returns the get_announcements
+    structure, with the records under "announcements" and Course records under
+    "courses_checked".
     """
+    return freshness_cache.get("announcements", fetch_announcements)
+
+
+def fetch_announcements() -> Dict[str, Any]:
+    """Fetch all announcements of the current user from the API."""
     try:
-        # Get user ID and service
-        user_id = get_user_id()
-        service = get_classroom_service(user_id)
+        # Get the service for the user this request is for
+        ctx = current_request()
+        service = ctx.classroom_service()
         
         if not service:
             return {
@@ -50,8 +70,8 @@ def get_announcements() -> Dict[str, Any]:
                 "courses_checked": []
             }
         
-        # Get all courses
-        courses = _get_courses(service)
+        # Get all courses (shared catalog, cached per user)
+        courses = course_catalog.list_courses(service, ctx.user_id)
         if not courses:
             return {
                 "status": "success",
@@ -66,23 +86,15 @@ def get_announcements() -> Dict[str, Any]:
         courses_checked = []
         
         for course in courses:
-            course_id = course['id']
-            course_name = course.get('name', 'Unknown Course')
-            courses_checked.append({
-                'id': course_id,
-                'name': course_name
-            })
+            check_cancelled()
+            course_id = course.id
+            courses_checked.append(course)
             
             try:
                 # Get announcements for this course
                 announcements = _get_course_announcements(service, course_id)
                 
-                # Add course context to each announcement
-                for announcement in announcements:
-                    announcement['courseId'] = course_id
-                    announcement['courseName'] = course_name
-                
-                all_announcements.extend(announcements)
+                all_announcements.extend(Announcement.from_api(announcement, course) for announcement in announcements)
                 
             except HttpError as e:
                 # Log error but continue with other courses
@@ -97,6 +109,8 @@ def get_announcements() -> Dict[str, Any]:
             "message": f"Successfully fetched {len(all_announcements)} announcements from {len(courses_checked)} courses."
         }
         
+    except TurnCancelled:
+        raise
     except Exception as e:
         return {
             "status": "error",
@@ -107,52 +121,102 @@ def get_announcements() -> Dict[str, Any]:
         }
 
 
-def _get_courses(service) -> List[Dict[str, Any]]:
-    """Get all courses the user has access to."""
+def _get_course_announcements(service, course_id: str) -> List[Dict[str, Any]]:
+    """Get all announcements for a specific course."""
     try:
-        courses = []
+        announcements = []
         page_token = None
         
-        while True:
-            response = service.courses().list(
-                pageToken=page_token,
-                pageSize=100
-            ).execute()
-            
-            courses.extend(response.get('courses', []))
-            page_token = response.get('nextPageToken')
+        with tracer.start_as_current_span("classroom.list_announcements", attributes={"classroom.course_id": course_id}) as span:
+            pages = 0
+            while True:
+                check_cancelled()
+                response = service.courses().announcements().list(
+                    courseId=course_id,
+                    pageToken=page_token,
+                    pageSize=100,
+                    fields=_LIST_FIELDS
+                ).execute()
+                pages += 1
+                
+                announcements.extend(response.get('announcements', []))
+                page_token = response.get('nextPageToken')
+                
+                if not page_token:
+                    break
             
-            if not page_token:
-                break
+            span.set_attribute("classroom.pages", pages)
+            span.set_attribute("classroom.items", len(announcements))
         
-        return courses
+        return announcements
         
     except HttpError as e:
-        print(f"Error fetching courses: {e}")
+        print(f"Error fetching announcements for course {course_id}: {e}")
         return []
 
 
-def _get_course_announcements(service, course_id: str) -> List[Dict[str, Any]]:
-    """Get all announcements for a specific course."""
+def get_announcement(course_id: str, announcement_id: str) -> Dict[str, Any]:
+    """
+    Fetches one announcement in full: its text, attached materials (files and links) and link.
+    Use the course_id and id of a row from get_announcements.
+    
+    Args:
+        course_id: The course_id of the announcement.
+        announcement_id: The id of the announcement.
+    
+    Returns:
+        Dict with structure:
+        {
+            "status": "success" | "error",
+            "announcement": {"id", "course_id", "course", "posted", "text",
+                             "materials": [{"title", "url"}, ...], "link"},
+            "error_message": str (if status is error)
+        }
+    """
     try:
-        announcements = []
-        page_token = None
+        ctx = current_request()
+        service = ctx.classroom_service()
+        if not service:
+            return {"status": "error", "error_message": "Failed to initialize Google Classroom API service."}
         
-        while True:
-            response = service.courses().announcements().list(
-                courseId=course_id,
-                pageToken=page_token,
-                pageSize=100
-            ).execute()
-            
-            announcements.extend(response.get('announcements', []))
-            page_token = response.get('nextPageToken')
-            
-            if not page_token:
-                break
+        # Announcements for the whole course are cached per course, so check the user is in it first
+        course = course_catalog.user_course(service, ctx.user_id, course_id)
+        if course is None:
+            return {"status": "error", "error_message": f"Course {course_id} is not one of your courses."}
         
-        return announcements
+        with tracer.start_as_current_span("classroom.announcement_details", attributes={"classroom.course_id": course_id}):
+            announcement = detail_cache.get_course_item(
+                ("announcement", course_id, announcement_id),
+                ctx.user_id,
+                lambda: _get_announcement(service, course_id, announcement_id),
+            )
+        if announcement is None:
+            return {"status": "error", "error_message": f"Announcement {announcement_id} was not found in {course.name}."}
+        
+        record = Announcement.from_api(announcement, course)
+        return {
+            "status": "success",
+            "announcement": {
+                "id": record.id,
+                "course_id": record.course_id,
+                "course": record.course_name,
+                "posted": record.posted[:16].replace("T", " ") or None,
+                "text": record.text,
+                "materials": materials_for_llm(announcement.get("materials")),
+                "link": record.link,
+            },
+        }
         
+    except TurnCancelled:
+        raise
+    except Exception as e:
+        return {"status": "error", "error_message": f"Unexpected error: {str(e)}"}
+
+
+def _get_announcement(service, course_id: str, announcement_id: str) -> Optional[Dict[str, Any]]:
+    """Get one announcement with its materials, or None if it cannot be read."""
+    try:
+        return service.courses().announcements().get(courseId=course_id, id=announcement_id).execute()
     except HttpError as e:
-        print(f"Error fetching announcements for course {course_id}: {e}")
-        return []
+        print(f"Error fetching announcement {announcement_id}: {e}")
+        return None
@@ -6,40 +6,41 @@ This agent is responsible for gathering and analyzing Google Classroom course wo
 
 from google.adk.agents import LlmAgent
 
+from ...context import threaded_tool
+from ...models import get_model
 from .tools import get_course_work
 
-# --- Constants ---
-GEMINI_MODEL = "gemini-2.0-flash"
-
 # Course Work Agent
 course_work_agent = LlmAgent(
     name="CourseWorkAgent",
-    model=GEMINI_MODEL,
+    model=get_model("CourseWorkAgent"),
     instruction="""You are a Course Work Agent for Google Classroom.
     
     When asked for course work information, you should:
     1. Use the 'get_course_work' tool to gather data from Google Classroom.
     2. Analyze the returned dictionary data for all assignments.
     3. Format this information into a concise, clear section of a system report.
-    4. Send the link to the relevant post or assignment whenever possible.
+    4. Keep each assignment's id and course_id in the report, so its full details can be looked up later.
     
     The tool will return a dictionary with:
     - status: "success" or "error"
-    - course_work: List of coursework objects.
+    - coursework: A table with "fields" (the column names) and "rows" (one list of values per assignment):
+      id, course_id, title, due_utc (YYYY-MM-DD HH:MM),
+      state (of the user's submission, with "late" if handed in late), grade (points earned/max points).
     - total_count: Total number of assignments found.
-    - courses_checked: List of courses that were checked.
+    - courses: The courses that were checked, as {course_id: course name}.
     - error_message: Error details (if status is "error").
     
     Format your response as a well-structured report section with:
     - A summary of total assignments across all courses.
     - A breakdown of assignments by course.
     - A list of upcoming due dates.
-    - Any ungraded assignments (where maxPoints is 0 or not set).
+    - Any assignments that have not been graded yet (grade is empty).
     
     IMPORTANT: You MUST call the get_course_work tool. Do not make up information.
     If there are no announcements or errors, clearly state that in your response.
     """,
     description="Gathers and analyzes Google Classroom course work information.",
-    tools=[get_course_work],
+    tools=[threaded_tool(get_course_work)],
     output_key="course_work_info",
 )
@@ -2,45 +2,84 @@
 Course Work Information Tool
 Google Classroom Coursework Tool
 
-This module provides a tool for gathering coursework (assignments) from Google Classroom.
-"""
+This module provides tools for coursework (assignments) from Google Classroom:
+get_course_work lists every assignment with its due date and the user's state
+and grade, and get_assignment_details fetches one assignment's full content
+and the user's submission when a question needs them.
 
-import sys
-import os
-# Add project root to sys.path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))) )
+Course lists of coursework are the same for every student of a course and go
+through the shared cache tier (see shared_cache.py), keyed by course id, so
+each course is listed once for everyone enrolled. Only work assigned to the
+whole class is shared; a student's individually assigned work shows up as
+submissions the shared list does not have, and their own list is fetched then.
+"""
 
 import time
 from typing import Any, Dict, List, Optional
-import streamlit as st
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from oauth_web_config import get_classroom_service, get_user_id
+from ...catalog import course_catalog
+from ...cancellation import TurnCancelled
+from ...context import check_cancelled, current_request
+from ...details import addressed_to_all, detail_cache
+from ...freshness import freshness_cache
+from ...shared_cache import COURSE_TTL_SECONDS, get_shared_cache
+from ...records import Course, CourseWork, Submission, format_due, for_llm, history_for_llm, materials_for_llm
+from ...tracing import tracer
+
+# Only the fields the summaries use; descriptions and materials are left to get_assignment_details
+_LIST_FIELDS = (
+    "nextPageToken,courseWork(id,title,workType,maxPoints,dueDate,dueTime,alternateLink,assigneeMode)"
+)
+_SUBMISSION_LIST_FIELDS = (
+    "nextPageToken,studentSubmissions(courseWorkId,state,assignedGrade,draftGrade,late,alternateLink)"
+)
 
 
 def get_course_work() -> Dict[str, Any]:
     """
-    Fetches all coursework (assignments) from Google Classroom courses, including the current user's grade for each assignment.
+    Lists all coursework (assignments) from Google Classroom courses, with the current user's state and grade for each assignment.
+    Descriptions, materials and links are not included; call get_assignment_details for an assignment that needs them.
     
     Returns:
         Dict containing coursework data with structure:
         {
             "status": "success" | "error",
-            "coursework": [...],
+            "coursework": {"fields": [...], "rows": [[...], ...]},
             "total_count": int,
-            "courses_checked": [...],
+            "courses": {course_id: course name, ...},
+            "data_as_of": str (when the data was fetched, UTC),
             "error_message": str (if status is error)
         }
+        Each row holds the values of one assignment in the order of "fields":
+        id, course_id, title, due_utc, state (of the user's submission),
+        grade (points earned/max points).
     """
+    return for_llm(load_course_work(), "coursework", CourseWork)
+
+
+def load_course_work() -> Dict[str, Any]:
+    """
+    The current user's coursework as CourseWork records, served under the
+    freshness policy (see freshness.py). Returns the get_course_work structure,
+    with the records under "coursework" and Course records under
+    "courses_checked".
+    """
+    result = freshness_cache.get("coursework", fetch_course_work)
+    index = current_request().deadline_index
+    if result.get("status") == "success" and index.built_at is None:
+        # The index was evicted since the cached data was fetched
+        index.rebuild(result["coursework"])
+    return result
+
+
+def fetch_course_work() -> Dict[str, Any]:
+    """Fetch all coursework of the current user from the API and update their deadline index."""
     try:
-        # Get user ID and service
-        user_id = get_user_id()
-        service = get_classroom_service(user_id)
+        # Get the service for the user this request is for
+        ctx = current_request()
+        service = ctx.classroom_service()
         
         if not service:
             return {
@@ -51,8 +90,8 @@ def get_course_work() -> Dict[str, Any]:
                 "courses_checked": []
             }
         
-        # Get all courses
-        courses = _get_courses(service)
+        # Get all courses (shared catalog, cached per user)
+        courses = course_catalog.list_courses(service, ctx.user_id)
         if not courses:
             return {
                 "status": "success",
@@ -67,42 +106,30 @@ def get_course_work() -> Dict[str, Any]:
         courses_checked = []
         
         for course in courses:
-            course_id = course['id']
-            course_name = course.get('name', 'Unknown Course')
-            courses_checked.append({
-                'id': course_id,
-                'name': course_name
-            })
+            check_cancelled()
+            course_id = course.id
+            courses_checked.append(course)
             
             try:
                 # Get coursework for this course
-                coursework = _get_course_coursework(service, course_id)
+                coursework = list_course_coursework(service, course_id)
                 
-                # Add course context to each coursework item
+                # Build a record per item with the current user's submission and grade
+                submissions = _get_my_submissions(service, course_id)
+                if not submissions.keys() <= {item['id'] for item in coursework}:
+                    # Work assigned to the user alone is not in the shared list
+                    coursework = list_course_coursework(service, course_id, shared=False)
                 for item in coursework:
-                    item['courseId'] = course_id
-                    item['courseName'] = course_name
-                    
-                    # --- Fetch the current user's submission and grade ---
-                    submission = _get_my_submission_for_assignment(service, course_id, item['id'])
-                    if submission:
-                        item['mySubmission'] = {
-                            'state': submission.get('state'),
-                            'assignedGrade': submission.get('assignedGrade'),
-                            'draftGrade': submission.get('draftGrade'),
-                            'late': submission.get('late'),
-                            'alternateLink': submission.get('alternateLink'),
-                        }
-                    else:
-                        item['mySubmission'] = None
-                
-                all_coursework.extend(coursework)
+                    all_coursework.append(CourseWork.from_api(item, course, submissions.get(item['id'])))
                 
             except HttpError as e:
                 # Log error but continue with other courses
                 print(f"Error fetching coursework for course {course_id}: {e}")
                 continue
         
+        # Apply what changed since the last sync to the user's deadline index
+        ctx.deadline_index.sync(all_coursework)
+        
         return {
             "status": "success",
             "coursework": all_coursework,
@@ -111,6 +138,8 @@ def get_course_work() -> Dict[str, Any]:
             "message": f"Successfully fetched {len(all_coursework)} coursework items from {len(courses_checked)} courses."
         }
         
+    except TurnCancelled:
+        raise
     except Exception as e:
         return {
             "status": "error",
@@ -121,77 +150,235 @@ def get_course_work() -> Dict[str, Any]:
         }
 
 
-def _get_courses(service) -> List[Dict[str, Any]]:
-    """Get all courses the user has access to."""
+def list_course_coursework(service, course_id: str, shared: bool = True) -> List[Dict[str, Any]]:
+    """
+    Get all coursework (assignments) for a specific course. With shared, the
+    course's work assigned to the whole class is served from the shared cache;
+    otherwise the user's own list is fetched (and refreshes the shared entry).
+    """
+    cache = get_shared_cache()
+    key = _shared_key(course_id)
+    if shared:
+        coursework = cache.get_or_fetch(
+            key, lambda: _class_coursework(_fetch_course_coursework(service, course_id)), COURSE_TTL_SECONDS
+        )
+        return coursework if coursework is not None else []
+
+    coursework = _fetch_course_coursework(service, course_id)
+    if coursework is None:
+        return []
+    try:
+        cache.set(key, _class_coursework(coursework), COURSE_TTL_SECONDS)
+    except Exception as e:
+        print(f"Shared cache write failed for {key}: {e}")
+    return coursework
+
+
+def forget_shared_coursework():
+    """Drop the shared lists of the current user's courses, so the next fetch lists them from the API."""
+    ctx = current_request()
+    service = ctx.classroom_service()
+    if not service:
+        return
+    cache = get_shared_cache()
+    for course in course_catalog.list_courses(service, ctx.user_id):
+        try:
+            cache.delete(_shared_key(course.id))
+        except Exception as e:
+            print(f"Shared cache delete failed for course {course.id}: {e}")
+
+
+def _shared_key(course_id: str) -> str:
+    return f"course/{course_id}/coursework"
+
+
+def _class_coursework(coursework: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """The items of a course's list assigned to the whole class, which all of its students see alike."""
+    if coursework is None:
+        return None
+    return [item for item in coursework if addressed_to_all(item)]
+
+
+def _fetch_course_coursework(service, course_id: str) -> Optional[List[Dict[str, Any]]]:
+    """List a course's coursework from the API as the current user sees it, or None if the request failed."""
     try:
-        courses = []
+        coursework = []
         page_token = None
         
-        while True:
-            response = service.courses().list(
-                pageToken=page_token,
-                pageSize=100
-            ).execute()
-            
-            courses.extend(response.get('courses', []))
-            page_token = response.get('nextPageToken')
+        with tracer.start_as_current_span("classroom.list_coursework", attributes={"classroom.course_id": course_id}) as span:
+            pages = 0
+            while True:
+                check_cancelled()
+                response = service.courses().courseWork().list(
+                    courseId=course_id,
+                    pageToken=page_token,
+                    pageSize=100,
+                    fields=_LIST_FIELDS
+                ).execute()
+                pages += 1
+                
+                coursework.extend(response.get('courseWork', []))
+                page_token = response.get('nextPageToken')
+                
+                if not page_token:
+                    break
             
-            if not page_token:
-                break
+            span.set_attribute("classroom.pages", pages)
+            span.set_attribute("classroom.items", len(coursework))
         
-        return courses
+        return coursework
         
     except HttpError as e:
-        print(f"Error fetching courses: {e}")
-        return []
+        print(f"Error fetching coursework for course {course_id}: {e}")
+        return None
 
 
-def _get_course_coursework(service, course_id: str) -> List[Dict[str, Any]]:
-    """Get all coursework (assignments) for a specific course."""
+def _get_my_submissions(service, course_id: str) -> Dict[str, Dict[str, Any]]:
+    """Get the current user's submissions for every assignment of a course, by coursework id."""
     try:
-        coursework = []
+        submissions = {}
         page_token = None
         
-        while True:
-            response = service.courses().courseWork().list(
-                courseId=course_id,
-                pageToken=page_token,
-                pageSize=100
-            ).execute()
-            
-            coursework.extend(response.get('courseWork', []))
-            page_token = response.get('nextPageToken')
+        with tracer.start_as_current_span("classroom.course_submissions", attributes={"classroom.course_id": course_id}) as span:
+            while True:
+                check_cancelled()
+                # "-" lists the submissions of all coursework in the course at once
+                response = service.courses().courseWork().studentSubmissions().list(
+                    courseId=course_id,
+                    courseWorkId='-',
+                    userId='me',
+                    pageToken=page_token,
+                    pageSize=100,
+                    fields=_SUBMISSION_LIST_FIELDS
+                ).execute()
+                
+                for submission in response.get('studentSubmissions', []):
+                    submissions[submission['courseWorkId']] = submission
+                page_token = response.get('nextPageToken')
+                
+                if not page_token:
+                    break
             
-            if not page_token:
-                break
+            span.set_attribute("classroom.items", len(submissions))
         
-        return coursework
+        return submissions
         
     except HttpError as e:
-        print(f"Error fetching coursework for course {course_id}: {e}")
-        return []
+        print(f"Error fetching submissions for course {course_id}: {e}")
+        return {}
 
 
-def _get_my_submission_for_assignment(service, course_id: str, course_work_id: str) -> Optional[Dict[str, Any]]:
-    """Get the current user's submission for a specific assignment."""
+def get_assignment_details(course_id: str, assignment_id: str) -> Dict[str, Any]:
+    """
+    Fetches the full details of one assignment: its description, materials (attached files and links), points and link,
+    and the current user's submission with its state, grade, attachments and history.
+    Use the course_id and id of a row from get_course_work.
+    
+    Args:
+        course_id: The course_id of the assignment.
+        assignment_id: The id of the assignment.
+    
+    Returns:
+        Dict with structure:
+        {
+            "status": "success" | "error",
+            "assignment": {
+                "id", "course_id", "course", "title", "description", "materials": [{"title", "url"}, ...],
+                "type", "points", "due_utc", "created", "updated", "link",
+                "submission": {"state", "grade", "draft_grade", "late", "link",
+                               "attachments": [{"title", "url"}, ...],
+                               "history": [{"state" or "grade", "at"}, ...]} or None
+            },
+            "error_message": str (if status is error)
+        }
+    """
     try:
-        # Get the current user's profile to get their ID
-        profile = service.userProfiles().get(userId='me').execute()
-        user_id = profile['id']
+        ctx = current_request()
+        service = ctx.classroom_service()
+        if not service:
+            return {"status": "error", "error_message": "Failed to initialize Google Classroom API service."}
+        
+        # Items for the whole course are cached per course, so check the user is in it first
+        course = course_catalog.user_course(service, ctx.user_id, course_id)
+        if course is None:
+            return {"status": "error", "error_message": f"Course {course_id} is not one of your courses."}
+        
+        with tracer.start_as_current_span("classroom.assignment_details", attributes={"classroom.course_id": course_id}):
+            item = detail_cache.get_course_item(
+                ("coursework", course_id, assignment_id),
+                ctx.user_id,
+                lambda: _get_assignment(service, course_id, assignment_id),
+            )
+            if item is None:
+                return {"status": "error", "error_message": f"Assignment {assignment_id} was not found in {course.name}."}
+            submission = detail_cache.get(
+                ("submission", ctx.user_id, course_id, assignment_id),
+                lambda: _get_my_submission(service, course_id, assignment_id),
+            )
+        
+        return {"status": "success", "assignment": _assignment_details(item, course, submission or None)}
         
-        # Get the user's submission for this assignment
+    except TurnCancelled:
+        raise
+    except Exception as e:
+        return {"status": "error", "error_message": f"Unexpected error: {str(e)}"}
+
+
+def _get_assignment(service, course_id: str, assignment_id: str) -> Optional[Dict[str, Any]]:
+    """Get one assignment with all of its content, or None if it cannot be read."""
+    try:
+        return service.courses().courseWork().get(courseId=course_id, id=assignment_id).execute()
+    except HttpError as e:
+        print(f"Error fetching assignment {assignment_id}: {e}")
+        return None
+
+
+def _get_my_submission(service, course_id: str, assignment_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the current user's full submission for an assignment. Returns {} when
+    the user has none (cached like a submission), None if the request failed.
+    """
+    try:
         response = service.courses().courseWork().studentSubmissions().list(
             courseId=course_id,
-            courseWorkId=course_work_id,
-            userId=user_id
+            courseWorkId=assignment_id,
+            userId='me'
         ).execute()
-        
         submissions = response.get('studentSubmissions', [])
-        if submissions:
-            return submissions[0]  # Return the first (and should be only) submission
-        
-        return None
-        
+        return submissions[0] if submissions else {}
     except HttpError as e:
-        print(f"Error fetching submission for assignment {course_work_id}: {e}")
+        print(f"Error fetching submission for assignment {assignment_id}: {e}")
         return None
+
+
+def _assignment_details(item: Dict[str, Any], course: Course, submission: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape an assignment and the user's submission from the API for the model."""
+    record = CourseWork.from_api(item, course)
+    details = {
+        "id": record.id,
+        "course_id": record.course_id,
+        "course": record.course_name,
+        "title": record.title,
+        "description": item.get("description"),
+        "materials": materials_for_llm(item.get("materials")),
+        "type": record.work_type,
+        "points": record.max_points,
+        "due_utc": format_due(record.due),
+        "created": item.get("creationTime"),
+        "updated": item.get("updateTime"),
+        "link": record.link,
+        "submission": None,
+    }
+    if submission:
+        summary = Submission.from_api(submission)
+        attachments = (submission.get("assignmentSubmission") or {}).get("attachments")
+        details["submission"] = {
+            "state": summary.state,
+            "grade": summary.assigned_grade,
+            "draft_grade": summary.draft_grade,
+            "late": summary.late,
+            "link": summary.link,
+            "attachments": materials_for_llm(attachments),
+            "history": history_for_llm(submission.get("submissionHistory")),
+        }
+    return details
@@ -5,67 +5,30 @@ Data Analyzer Agent
 
 This agent is responsible for answering user questions by using information
 from course work and announcements agents.
-"""
-
-from google.adk.agents import LlmAgent
-import datetime
-import os.path
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from typing import Any, Dict, List, Optional
-from dateutil import parser as date_parser
-
-
-
-
-
-# If modifying scopes, delete the token.json file.
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar.events"
-]
-
-
-def add_to_calendar(assignment_name: str, due_date: str) -> dict:
-    """
-    Adds the assignment to the Google Calendar.
-    Args:
-        assignment_name (str): The assignment name.
-        due_date (str): The assignment's due date in YYYY-MM-DD format.
-    Returns:
-        dict: Status and message.
-    """
-
-    print("\n\n\nADD TO CALENDER GOT CALLED: " + due_date)
-
-    SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
-    # Load credentials (adjust as needed for your project)
-    creds = Credentials.from_authorized_user_file('drive_config.json', ['https://www.googleapis.com/auth/calendar.events'])
-
-    service = build('calendar', 'v3', credentials=creds)
-    event = {
-        "summary": assignment_name,
-        "start": {"date": due_date},
-        "end": {"date": due_date},  # Google Calendar expects end date to be exclusive, so you may want to add 1 day
-    }
-
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return {"status": "success", "eventId": created_event.get("id")}
-
 
+Its instruction and tools depend on the request (see RequestContext): a
+read-only turn, such as a batch digest, is neither offered the calendar sync
+tool nor told about it, and the class-wide teacher tools are only offered
+while the user has teacher mode on.
+"""
 
-#     add_to_calender("my_cool_event", "2025-06-23")
+from typing import Callable, List, Optional
 
+from google.adk.agents import LlmAgent
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools import BaseTool, FunctionTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.utils.instructions_utils import inject_session_state
 
+from ...context import current_request, threaded_tool
+from ...models import get_model
+from ..announcement_agent.tools import get_announcement
+from ..course_work_agent.tools import get_assignment_details
+from .teacher_tools import get_class_submission_stats, get_missing_submissions
+from .tools import get_deadlines, sync_deadlines_to_calendar
 
-# --- Constants ---
-GEMINI_MODEL = "gemini-2.0-flash"
 
-# Data Analyzer Agent
-data_analyzer_agent = LlmAgent(
-    name="DataAnalyzerAgent",
-    model=GEMINI_MODEL,
-    instruction="""You are a Data Analyzer Agent.
+ANALYZER_INSTRUCTION = """You are a Data Analyzer Agent.
     
     Your role is to answer user questions by using information from:
     - Course work information: {course_work_info}
@@ -111,14 +74,65 @@ data_analyzer_agent = LlmAgent(
     
     If the output is related to assignment information, for each of them, predict the time it would take to complete it based on its description. Then, output this data in a nicely formatted table.
     
+    The course work and announcements information only holds summaries: titles, due dates, states, grades and the start of each announcement. When a question needs an assignment's description, materials, link or submission history (e.g. a sample answer, a time estimate, feedback on a grade), call the "get_assignment_details" tool with its course_id and assignment_id (the id from the course work information), only for the assignments the question is about. For the full text, materials or link of an announcement, call the "get_announcement" tool with its course_id and announcement_id.
+    
     If you don't have enough information to answer a question completely, say so and suggest what additional information might be needed.
     
-    IMPORTANT: When the user asks about assignment DEADLINES in specific. Do the normal response, then for each assignment or course work with a deadline, call the "add_to_calendar" tool with the assignment_name (str) and the due_date (str) (YYYY-MM-DD) parameters to add this assignment to their calender. In this case, also tell the user in the response that the assignment deadlines have been added to their calender.
-    """,
-    description="Answers user questions using course work and announcements information, and helps them with completing their assignments/inquiry as best as possible no matter what it is. Also, adds the event to the calender using the tool if the user mentions assignment due dates in specific.",
-    tools=[add_to_calendar],
-)
+    For questions about due dates, upcoming or overdue work, call the "get_deadlines" tool with days_ahead (int) instead of re-reading the due dates from the course work information. It returns the deadlines already sorted, plus the overdue assignments that have not been turned in.
+    
+"""
+
+# Only while the user has teacher mode on
+TEACHER_INSTRUCTION = """    Teacher mode: when a teacher asks about their class as a whole (e.g. "who hasn't turned in X", "grade distribution for Y", how a class is doing on an assignment), call the "get_class_submission_stats" tool, optionally with course_id and assignment_id. It returns one row per assignment with counts by submission state, late and missing counts, grade percentiles and a grade histogram, for the courses the user teaches. To name the students who have not turned in an assignment, call "get_missing_submissions" with its course_id and assignment_id. Present distributions as tables, and never list students unless the user asks for them.
+    
+"""
+
+# Only for turns that may write to the user's Google account (not batch digests)
+CALENDAR_INSTRUCTION = """    IMPORTANT: When the user asks about assignment DEADLINES in specific. Do the normal response, then call the "sync_deadlines_to_calendar" tool ONCE with the list of assignments that have a deadline, each as a dict with course_id, assignment_id, title and due_date (YYYY-MM-DD). Never call it once per assignment. The tool skips events that are already on the calendar, so it is safe to call again. In this case, also tell the user in the response that the assignment deadlines have been added to their calender.
+    """
 
 
+def analyzer_instruction_template() -> str:
+    """The analyzer's instruction for the current request, before the gathered data is filled in."""
+    ctx = current_request()
+    template = ANALYZER_INSTRUCTION
+    if ctx.teacher_mode:
+        template += TEACHER_INSTRUCTION
+    if not ctx.read_only:
+        template += CALENDAR_INSTRUCTION
+    return template
 
 
+async def _instruction(readonly_context: ReadonlyContext) -> str:
+    return await inject_session_state(analyzer_instruction_template(), readonly_context)
+
+
+class _GatedToolset(BaseToolset):
+    """Tools offered to the model only while enabled() holds for the current request."""
+
+    def __init__(self, tools: List[Callable], enabled: Callable[[], bool]):
+        super().__init__()
+        self._tools = [FunctionTool(tool) for tool in tools]
+        self._enabled = enabled
+        # Depends on the request, so it must not be cached by invocation id
+        self._use_invocation_cache = False
+
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> List[BaseTool]:
+        return list(self._tools) if self._enabled() else []
+
+
+# Data Analyzer Agent
+data_analyzer_agent = LlmAgent(
+    name="DataAnalyzerAgent",
+    model=get_model("DataAnalyzerAgent"),
+    instruction=_instruction,
+    description="Answers user questions using course work and announcements information, and helps them with completing their assignments/inquiry as best as possible no matter what it is. Also, syncs the assignment deadlines to the calender in one tool call if the user mentions assignment due dates in specific.",
+    tools=[
+        threaded_tool(get_deadlines),
+        threaded_tool(get_assignment_details),
+        threaded_tool(get_announcement),
+        _GatedToolset([threaded_tool(get_class_submission_stats), threaded_tool(get_missing_submissions)],
+                      lambda: current_request().teacher_mode),
+        _GatedToolset([threaded_tool(sync_deadlines_to_calendar)], lambda: not current_request().read_only),
+    ],
+)
@@ -0,0 +1,272 @@
+"""
+Teacher Mode Tools
+
+Tools for the courses the user teaches: per-assignment submission statistics
+for the whole class, and who has not turned in an assignment. Every student's
+submissions are listed with one wildcard studentSubmissions.list per course
+and aggregated with class_stats, so the model sees one row per assignment
+instead of every submission. They only answer while the request has teacher
+mode on (see RequestContext).
+"""
+
+import math
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from googleapiclient.errors import HttpError
+
+from ...catalog import course_catalog
+from ...class_stats import SubmissionColumns, assignment_stats
+from ...cancellation import TurnCancelled
+from ...context import check_cancelled, current_request
+from ...freshness import freshness_cache
+from ...records import Course, CourseWork, format_due
+from ...tracing import tracer
+from ..course_work_agent.tools import list_course_coursework
+
+# Submissions per list request (the server may return fewer)
+SUBMISSION_PAGE_SIZE = 1000
+
+_SUBMISSION_FIELDS = "nextPageToken,studentSubmissions(courseWorkId,userId,state,late,assignedGrade)"
+_ROSTER_FIELDS = "nextPageToken,students(userId,profile(name(fullName)))"
+
+CLASS_STATS_FIELDS = (
+    "course_id", "id", "title", "due_utc", "max_points", "students", "turned_in", "not_turned_in",
+    "missing", "late", "graded", "mean", "p25", "median", "p75", "grade_histogram",
+)
+
+TEACHER_MODE_OFF = {"status": "error", "error_message": "Teacher mode is off. Turn it on to ask about whole classes."}
+
+
+class TaughtCourse(NamedTuple):
+    course: Course
+    coursework: List[CourseWork]
+    submissions: SubmissionColumns
+    stats: Dict[str, np.ndarray]
+    # Student user id -> full name, empty if the roster could not be read
+    names: Dict[str, str]
+
+
+def get_class_submission_stats(course_id: str = "", assignment_id: str = "") -> Dict[str, Any]:
+    """
+    Teacher mode: submission statistics of every student, per assignment, for the courses the user teaches.
+    Use it for questions about a whole class, e.g. how many students turned in an assignment or the grade
+    distribution of an assignment.
+
+    Args:
+        course_id: Only this course (optional, empty for all courses the user teaches).
+        assignment_id: Only this assignment (optional).
+
+    Returns:
+        Dict with structure:
+        {
+            "status": "success" | "error",
+            "assignments": {"fields": [...], "rows": [[...], ...]},
+            "courses": {course_id: course name, ...},
+            "data_as_of": str (when the data was fetched, UTC),
+            "error_message": str (if status is error)
+        }
+        Each row holds one assignment in the order of "fields": course_id, id, title, due_utc, max_points,
+        students (with a submission), turned_in, not_turned_in, missing (not turned in and past due),
+        late, graded, mean, p25, median, p75 (of the assigned grades) and grade_histogram (graded
+        students per 10% of max points, from 0-10% to 90-100%).
+    """
+    if not current_request().teacher_mode:
+        return TEACHER_MODE_OFF
+
+    result = load_class_submissions()
+    if result.get("status") != "success":
+        return {key: value for key, value in result.items() if key != "courses"}
+
+    courses = [taught for taught in result["courses"] if not course_id or taught.course.id == course_id]
+    if course_id and not courses:
+        return {"status": "error", "error_message": f"You do not teach a course with id {course_id}."}
+
+    now = time.time()
+    rows = []
+    for taught in courses:
+        for index, item in enumerate(taught.coursework):
+            if not assignment_id or item.id == assignment_id:
+                rows.append(_stats_row(taught, index, now))
+
+    return {
+        "status": "success",
+        "assignments": {"fields": list(CLASS_STATS_FIELDS), "rows": rows},
+        "courses": {taught.course.id: taught.course.name for taught in courses},
+        "data_as_of": result.get("data_as_of"),
+    }
+
+
+def get_missing_submissions(course_id: str, assignment_id: str) -> Dict[str, Any]:
+    """
+    Teacher mode: the students who have not turned in an assignment of a course the user teaches.
+
+    Args:
+        course_id: The course id.
+        assignment_id: The assignment id (the id from get_class_submission_stats).
+
+    Returns:
+        Dict with status, the assignment's title and due date, and "students": the names (or user ids,
+        if the class roster cannot be read) of the students who have not turned it in.
+    """
+    if not current_request().teacher_mode:
+        return TEACHER_MODE_OFF
+
+    result = load_class_submissions()
+    if result.get("status") != "success":
+        return {key: value for key, value in result.items() if key != "courses"}
+
+    for taught in result["courses"]:
+        if taught.course.id != course_id:
+            continue
+        for item in taught.coursework:
+            if item.id == assignment_id:
+                students = taught.submissions.not_turned_in(assignment_id)
+                return {
+                    "status": "success",
+                    "course": taught.course.name,
+                    "title": item.title,
+                    "due_utc": format_due(item.due),
+                    "count": len(students),
+                    "students": sorted(taught.names.get(student, student) for student in students),
+                    "data_as_of": result.get("data_as_of"),
+                }
+        return {"status": "error", "error_message": f"Assignment {assignment_id} was not found in {taught.course.name}."}
+    return {"status": "error", "error_message": f"You do not teach a course with id {course_id}."}
+
+
+def load_class_submissions() -> Dict[str, Any]:
+    """
+    The courses the current user teaches as TaughtCourse records (under
+    "courses"), served under the freshness policy (see freshness.py).
+    """
+    return freshness_cache.get("class_submissions", fetch_class_submissions)
+
+
+def fetch_class_submissions() -> Dict[str, Any]:
+    """Fetch and aggregate all students' submissions in the courses the current user teaches."""
+    try:
+        ctx = current_request()
+        service = ctx.classroom_service()
+        if not service:
+            return {
+                "status": "error",
+                "error_message": "Failed to initialize Google Classroom API service. Please authenticate with Google Classroom.",
+            }
+
+        courses = course_catalog.list_courses(service, ctx.user_id, teaching=True)
+        if not courses:
+            return {"status": "error", "error_message": "You do not teach any Google Classroom courses."}
+
+        taught = []
+        for course in courses:
+            check_cancelled()
+            try:
+                taught.append(_load_course(service, course))
+            except HttpError as e:
+                # Log error but continue with other courses
+                print(f"Error fetching class submissions for course {course.id}: {e}")
+                continue
+
+        return {"status": "success", "courses": taught}
+
+    except TurnCancelled:
+        raise
+    except Exception as e:
+        return {"status": "error", "error_message": f"Unexpected error: {str(e)}"}
+
+
+def _load_course(service, course: Course) -> TaughtCourse:
+    # A teacher's own list has the work assigned to individual students too (and refreshes the shared one)
+    coursework = [CourseWork.from_api(item, course) for item in list_course_coursework(service, course.id, shared=False)]
+    submissions = SubmissionColumns([item.id for item in coursework])
+
+    with tracer.start_as_current_span("classroom.class_submissions", attributes={"classroom.course_id": course.id}) as span:
+        page_token = None
+        pages = 0
+        while coursework:
+            check_cancelled()
+            # "-" lists the submissions of all coursework, and no userId means every student's
+            response = service.courses().courseWork().studentSubmissions().list(
+                courseId=course.id,
+                courseWorkId='-',
+                pageToken=page_token,
+                pageSize=SUBMISSION_PAGE_SIZE,
+                fields=_SUBMISSION_FIELDS
+            ).execute()
+            pages += 1
+
+            # Each page goes straight into the columns
+            submissions.extend(response.get('studentSubmissions', []))
+            page_token = response.get('nextPageToken')
+
+            if not page_token:
+                break
+
+        span.set_attribute("classroom.pages", pages)
+        span.set_attribute("classroom.items", len(submissions))
+
+    submissions.finish()
+    stats = assignment_stats(submissions, [item.max_points for item in coursework])
+    return TaughtCourse(course, coursework, submissions, stats, _get_roster_names(service, course.id))
+
+
+def _get_roster_names(service, course_id: str) -> Dict[str, str]:
+    """Student user id -> full name for a course, or {} if the roster cannot be read."""
+    try:
+        names = {}
+        page_token = None
+
+        while True:
+            check_cancelled()
+            response = service.courses().students().list(
+                courseId=course_id,
+                pageToken=page_token,
+                pageSize=100,
+                fields=_ROSTER_FIELDS
+            ).execute()
+
+            for student in response.get('students', []):
+                name = student.get('profile', {}).get('name', {}).get('fullName')
+                if name:
+                    names[student['userId']] = name
+            page_token = response.get('nextPageToken')
+
+            if not page_token:
+                break
+
+        return names
+
+    except HttpError as e:
+        print(f"Error fetching roster for course {course_id}: {e}")
+        return {}
+
+
+def _number(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(float(value), 1)
+
+
+def _stats_row(taught: TaughtCourse, index: int, now: float) -> List[Any]:
+    item = taught.coursework[index]
+    stats = taught.stats
+    not_turned_in = int(stats["submissions"][index] - stats["turned_in"][index])
+    histogram = stats["histogram"][index]
+    return [
+        item.course_id,
+        item.id,
+        item.title,
+        format_due(item.due),
+        item.max_points,
+        int(stats["submissions"][index]),
+        int(stats["turned_in"][index]),
+        not_turned_in,
+        not_turned_in if item.due is not None and item.due < now else 0,
+        int(stats["late"][index]),
+        int(stats["graded"][index]),
+        _number(stats["mean"][index]),
+        _number(stats["p25"][index]),
+        _number(stats["p50"][index]),
+        _number(stats["p75"][index]),
+        histogram.tolist() if item.max_points and histogram.any() else None,
+    ]
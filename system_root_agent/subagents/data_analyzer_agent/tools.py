@@ -1,43 +1,270 @@
 from __future__ import print_function
 import datetime
-import os.path
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from typing import Any, Dict, List, Optional
+import time
+from googleapiclient.errors import HttpError
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-# If modifying scopes, delete the token.json file.
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar.events"
-]
+from oauth_web_config import new_calendar_batch
 
+from ...cancellation import TurnCancelled
+from ...context import check_cancelled, current_request
+from ...deadlines import DeadlineEntry, DeadlineIndex, deadline_key
+from ..course_work_agent.tools import load_course_work
 
-def add_to_calendar(event_title: str, due_date: str) -> dict:
+# Private extended properties stamped on the events this app creates, so a
+# sync can find its own events again instead of inserting duplicates
+CALENDAR_SOURCE_PROPERTY = "learnbridgeSource"
+CALENDAR_SOURCE_VALUE = "classroom"
+CALENDAR_KEY_PROPERTY = "learnbridgeKey"
+
+# Calls per batch HTTP request
+CALENDAR_BATCH_SIZE = 50
+
+# Upcoming deadlines synced when no assignments are given, soonest first
+CALENDAR_SYNC_LIMIT = 100
+
+
+def sync_deadlines_to_calendar(assignments: List[Dict[str, Any]]) -> dict:
     """
-    Adds an all-day event to Google Calendar.
+    Adds assignment deadlines to the user's Google Calendar as all-day events, in one call and without duplicates.
+    Events that already exist are updated if the title or date changed and skipped otherwise. Assignments
+    from Classroom are put on their due date in the calendar's time zone.
     Args:
-        event_title (str): The event title.
-        due_date (str): The event date in YYYY-MM-DD format.
+        assignments (list): The assignments to sync. Each one is a dict with course_id (str),
+            assignment_id (str), title (str) and due_date (str, YYYY-MM-DD). Pass an empty
+            list to sync the next 100 upcoming deadlines.
     Returns:
-        dict: Status and message.
+        dict: Status and the number of events inserted, updated and skipped.
     """
+    try:
+        if current_request().read_only:
+            return {"status": "error", "error_message": "Calendar changes are not allowed in this run."}
+
+        # The coursework sync updates the index; within the freshness TTL this is a cache hit
+        result = load_course_work()
+        if not assignments and result.get("status") != "success":
+            return {"status": "error", "error_message": result.get("error_message", "Failed to sync coursework.")}
+
+        ctx = current_request()
+        index = ctx.deadline_index
+        entries = None
+        if not assignments:
+            entries = index.next_deadlines(CALENDAR_SYNC_LIMIT)
+            if not entries:
+                return {"status": "success", "inserted": 0, "updated": 0, "skipped": 0,
+                        "message": "No assignments with due dates to sync."}
+
+        service = ctx.calendar_service()
+        if not service:
+            return {"status": "error",
+                    "error_message": "Failed to initialize Google Calendar API service. Please authenticate with Google."}
+        existing, tz = _list_synced_events(service)
+        if entries is not None:
+            assignments = [_entry_to_assignment(entry, tz) for entry in entries]
+
+        # Normalize the requested events by their stable key (last one wins)
+        desired = {}
+        for assignment in assignments:
+            event = _assignment_to_event(assignment, index, tz)
+            if event:
+                desired[event["extendedProperties"]["private"][CALENDAR_KEY_PROPERTY]] = event
+
+        if not desired:
+            return {"status": "success", "inserted": 0, "updated": 0, "skipped": 0,
+                    "message": "No assignments with due dates to sync."}
+
+        inserted = updated = skipped = 0
+        requests = []
+        for key, event in desired.items():
+            current = existing.get(key)
+            if current is None:
+                requests.append(service.events().insert(calendarId="primary", body=event))
+                inserted += 1
+            elif (current.get("summary") == event["summary"]
+                  and current.get("start", {}).get("date") == event["start"]["date"]):
+                skipped += 1
+            else:
+                requests.append(service.events().patch(calendarId="primary", eventId=current["id"], body=event))
+                updated += 1
 
-    print("\n\n\nADD TO CALENDER GOT CALLED: " + due_date)
+        errors = _execute_batched(requests)
 
-    SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
-    # Load credentials (adjust as needed for your project)
-    creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/calendar.events'])
+        result = {
+            "status": "success" if not errors else "partial",
+            "inserted": inserted,
+            "updated": updated,
+            "skipped": skipped,
+            "message": f"Calendar synced: {inserted} added, {updated} updated, {skipped} already up to date.",
+        }
+        if errors:
+            result["errors"] = errors
+        return result
 
-    service = build('calendar', 'v3', credentials=creds)
-    event = {
-        "summary": event_title,
-        "start": {"date": due_date},
-        "end": {"date": due_date},  # Google Calendar expects end date to be exclusive, so you may want to add 1 day
+    except TurnCancelled:
+        raise
+    except Exception as e:
+        return {"status": "error", "error_message": f"Unexpected error: {str(e)}"}
+
+
+def _entry_to_assignment(entry: DeadlineEntry, tz: datetime.tzinfo) -> Dict[str, Any]:
+    """Turn a deadline index entry into a sync request, due on its date in tz."""
+    item = entry.item
+    return {
+        "course_id": item.course_id,
+        "assignment_id": item.id,
+        "title": item.title,
+        "course_name": item.course_name,
+        "link": item.link,
+        "due_date": datetime.datetime.fromtimestamp(entry.due, tz).strftime("%Y-%m-%d"),
     }
 
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return {"status": "success", "eventId": created_event.get("id")}
 
+def _assignment_to_event(assignment: Dict[str, Any], index: DeadlineIndex,
+                         tz: datetime.tzinfo) -> Optional[Dict[str, Any]]:
+    """Build the all-day Calendar event body for an assignment."""
+    course_id = assignment.get("course_id") or assignment.get("courseId")
+    assignment_id = assignment.get("assignment_id") or assignment.get("id")
+    title = assignment.get("title") or assignment.get("assignment_name")
+    due_date = assignment.get("due_date")
+
+    if course_id and assignment_id:
+        key = deadline_key(course_id, assignment_id)
+        # Fill in anything the caller left out from the deadline index. Its due
+        # date wins: the caller only sees due times in UTC
+        entry = index.get(course_id, assignment_id)
+        if entry is not None:
+            filled = _entry_to_assignment(entry, tz)
+            title = title or filled["title"]
+            due_date = filled["due_date"]
+            assignment = {**filled, **assignment, "due_date": due_date}
+    else:
+        key = f"title:{title}"
+
+    if not title or not due_date:
+        return None
+
+    try:
+        start = datetime.date.fromisoformat(due_date[:10])
+    except ValueError:
+        print(f"Skipping calendar sync for {title}: invalid due date {due_date}")
+        return None
 
+    description = "Assignment deadline from Google Classroom."
+    if assignment.get("course_name"):
+        description = f"{assignment['course_name']}: {description}"
+    if assignment.get("link"):
+        description += f"\n{assignment['link']}"
 
-#     add_to_calender("my_cool_event", "2025-06-23")
\ No newline at end of file
+    return {
+        "summary": title,
+        "description": description,
+        "start": {"date": start.isoformat()},
+        # All-day events end on the (exclusive) following day
+        "end": {"date": (start + datetime.timedelta(days=1)).isoformat()},
+        "extendedProperties": {
+            "private": {
+                CALENDAR_SOURCE_PROPERTY: CALENDAR_SOURCE_VALUE,
+                CALENDAR_KEY_PROPERTY: key,
+            }
+        },
+    }
+
+
+def _list_synced_events(service) -> Tuple[Dict[str, Dict[str, Any]], datetime.tzinfo]:
+    """
+    Find the events this app already created, by their key, and the calendar's
+    time zone (UTC if it is unknown). Not limited to the dates being synced: an
+    assignment whose due date moved still has its event on the old date.
+    """
+    existing = {}
+    tz_name = None
+    page_token = None
+    while True:
+        check_cancelled()
+        response = service.events().list(
+            calendarId="primary",
+            privateExtendedProperty=f"{CALENDAR_SOURCE_PROPERTY}={CALENDAR_SOURCE_VALUE}",
+            singleEvents=True,
+            maxResults=2500,
+            pageToken=page_token,
+            fields="timeZone,items(id,summary,start,extendedProperties),nextPageToken",
+        ).execute()
+        tz_name = tz_name or response.get("timeZone")
+
+        for event in response.get("items", []):
+            key = event.get("extendedProperties", {}).get("private", {}).get(CALENDAR_KEY_PROPERTY)
+            if key:
+                existing[key] = event
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+    try:
+        return existing, ZoneInfo(tz_name) if tz_name else datetime.timezone.utc
+    except (ValueError, ZoneInfoNotFoundError):
+        print(f"Unknown calendar time zone {tz_name}, using UTC")
+        return existing, datetime.timezone.utc
+
+
+def _execute_batched(requests) -> List[str]:
+    """Send the insert/patch calls as batch HTTP requests, returning any errors."""
+    errors = []
+
+    def _callback(request_id, response, exception):
+        if exception is not None:
+            errors.append(f"Request {request_id}: {exception}")
+
+    for start in range(0, len(requests), CALENDAR_BATCH_SIZE):
+        # Batches already sent stay synced; a later sync finds and skips their events
+        check_cancelled()
+        batch = new_calendar_batch(_callback)
+        for request in requests[start:start + CALENDAR_BATCH_SIZE]:
+            batch.add(request)
+        try:
+            batch.execute()
+        except HttpError as e:
+            errors.append(f"Batch request failed: {e}")
+
+    return errors
+
+
+def get_deadlines(days_ahead: int) -> dict:
+    """
+    Gets the user's upcoming and overdue assignment deadlines from the deadline index.
+    Args:
+        days_ahead (int): How many days ahead to look for upcoming deadlines.
+    Returns:
+        dict: Status, the upcoming deadlines (soonest first), the overdue
+        assignments that have not been turned in and when the data was fetched.
+    """
+    # The coursework sync updates the index; within the freshness TTL this is a cache hit
+    result = load_course_work()
+    if result.get("status") != "success":
+        return {"status": "error", "error_message": result.get("error_message", "Failed to sync coursework.")}
+
+    index = current_request().deadline_index
+    now = time.time()
+    upcoming = index.due_between(now, now + max(days_ahead, 0) * 86400)
+    overdue = index.overdue(now)
+    return {
+        "status": "success",
+        "upcoming": [_deadline_to_dict(entry) for entry in upcoming],
+        "overdue": [_deadline_to_dict(entry) for entry in overdue],
+        "data_as_of": result.get("data_as_of"),
+    }
+
+
+def _deadline_to_dict(entry: DeadlineEntry) -> Dict[str, Any]:
+    """Flatten a deadline index entry for the LLM."""
+    item = entry.item
+    return {
+        "courseId": item.course_id,
+        "courseName": item.course_name,
+        "id": item.id,
+        "title": item.title,
+        "due": datetime.datetime.fromtimestamp(entry.due, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        "state": item.submission.state if item.submission else None,
+        "alternateLink": item.link,
+    }
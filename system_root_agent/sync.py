@@ -0,0 +1,252 @@
+"""
+Background Sync
+
+This module keeps signed-in users' Classroom data warm, so their questions are
+answered from the freshness cache instead of waiting on the Google APIs. A
+user is put on the schedule when they sign in (warm) and every time they take
+a turn (note_activity). Each sync refreshes their courses, coursework with
+their submissions, and announcements:
+
+    active users (a turn in the last ACTIVE_WINDOW_SECONDS)
+        every ACTIVE_INTERVAL_SECONDS, before the cached data goes stale
+    idle users
+        as often as they have been idle (idle for 2 hours: next sync in 2
+        hours), at most MAX_INTERVAL_SECONDS apart
+    idle for DROP_AFTER_SECONDS, or signed out
+        dropped until their next turn
+
+Every interval is jittered so users who signed in together do not sync
+together, and a failed sync is retried with exponential backoff. All syncs
+share a pool of threads (LEARNBRIDGE_SYNC_WORKERS) and one budget of Google
+API requests per second (LEARNBRIDGE_SYNC_API_RPS). The budget only applies
+to the scheduler's own requests; turns are never throttled by it.
+"""
+
+import contextvars
+import heapq
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from google_requests import register_request_hook
+from oauth_web_config import is_user_authenticated
+
+from .deadlines import forget_deadline_index
+from .freshness import FRESH_TTL_SECONDS, freshness_cache
+from .ratelimit import RateLimiter
+from .tracing import tracer
+
+SYNC_WORKERS_ENV = "LEARNBRIDGE_SYNC_WORKERS"
+SYNC_API_RPS_ENV = "LEARNBRIDGE_SYNC_API_RPS"
+
+# Users synced at the same time
+DEFAULT_SYNC_WORKERS = 4
+
+# Google API requests per second across all syncs
+DEFAULT_SYNC_API_RPS = 20.0
+
+# A user with a turn this recent is active
+ACTIVE_WINDOW_SECONDS = 1800
+
+# Active users are synced this often, so their data never goes stale
+ACTIVE_INTERVAL_SECONDS = FRESH_TTL_SECONDS * 0.8
+
+# Longest gap between syncs of an idle user
+MAX_INTERVAL_SECONDS = 6 * 3600
+
+# Users idle this long are no longer synced
+DROP_AFTER_SECONDS = 24 * 3600
+
+# Intervals are randomly stretched or shrunk by up to this fraction
+JITTER = 0.2
+
+# First retry after a failed sync, doubling on every failure up to the max
+RETRY_SECONDS = 60
+MAX_RETRY_SECONDS = 3600
+
+# Data fetched this recently (e.g. by a turn) is not fetched again
+MIN_REFRESH_AGE_SECONDS = 60
+
+_in_sync: contextvars.ContextVar[bool] = contextvars.ContextVar("learnbridge_sync", default=False)
+
+
+def _jittered(seconds: float) -> float:
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def _sync_datasets() -> List[Tuple[str, Callable]]:
+    # Imported on the first sync, the tools modules load the agent graph
+    from .subagents.announcement_agent.tools import fetch_announcements
+    from .subagents.course_work_agent.tools import fetch_course_work
+
+    # Coursework lists the user's courses, so announcements find them cached
+    return [("coursework", fetch_course_work), ("announcements", fetch_announcements)]
+
+
+@dataclass
+class _UserSchedule:
+    last_active: float
+    # When the next sync is due; matches the user's live entry in the queue
+    due: float
+    failures: int = 0
+
+
+class SyncScheduler:
+    """Refreshes the data of signed-in users in the background."""
+
+    def __init__(self, workers: Optional[int] = None, api_rps: Optional[float] = None):
+        if workers is None:
+            workers = int(os.getenv(SYNC_WORKERS_ENV, DEFAULT_SYNC_WORKERS))
+        if api_rps is None:
+            api_rps = float(os.getenv(SYNC_API_RPS_ENV, DEFAULT_SYNC_API_RPS))
+        self.workers = workers
+        self.api_limiter = RateLimiter(api_rps, burst=api_rps)
+
+        self._cond = threading.Condition()
+        self._users: Dict[str, _UserSchedule] = {}
+        # (due, user id) heap; entries whose due no longer matches the user's are skipped
+        self._queue: List[Tuple[float, str]] = []
+        self._running: Set[str] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def warm(self, user_id: str):
+        """Sync a user's data now, e.g. right after they sign in."""
+        self._schedule(user_id, time.time())
+
+    def note_activity(self, user_id: str):
+        """Record a turn by the user, keeping them on the active schedule."""
+        self._schedule(user_id, time.time() + _jittered(ACTIVE_INTERVAL_SECONDS))
+
+    def forget(self, user_id: str):
+        """Stop syncing a user."""
+        with self._cond:
+            self._users.pop(user_id, None)
+
+    def scheduled_users(self) -> int:
+        with self._cond:
+            return len(self._users)
+
+    def sync_user(self, user_id: str) -> bool:
+        """
+        Refresh the user's datasets that were not fetched in the last
+        MIN_REFRESH_AGE_SECONDS. Returns False if any fetch failed.
+        """
+        if not is_user_authenticated(user_id):
+            # Signed out or revoked: drop their data, snapshots included
+            self.forget(user_id)
+            freshness_cache.invalidate(user_id)
+            forget_deadline_index(user_id)
+            return True
+
+        ok = True
+        for dataset, fetch in _sync_datasets():
+            fetched_at = freshness_cache.fetched_at(user_id, dataset)
+            if fetched_at is not None and time.time() - fetched_at < MIN_REFRESH_AGE_SECONDS:
+                continue
+            if freshness_cache.refresh(user_id, dataset, fetch) is None:
+                ok = False
+        return ok
+
+    # --- Scheduling ---
+
+    def _schedule(self, user_id: str, due: float):
+        with self._cond:
+            now = time.time()
+            schedule = self._users.get(user_id)
+            if schedule is None:
+                schedule = self._users[user_id] = _UserSchedule(last_active=now, due=due)
+            else:
+                schedule.last_active = now
+                # A running sync schedules the next one when it finishes
+                if user_id in self._running or due >= schedule.due:
+                    return
+                schedule.due = due
+            heapq.heappush(self._queue, (due, user_id))
+            self._start()
+            self._cond.notify()
+
+    def _next_due(self, schedule: _UserSchedule, now: float) -> float:
+        if schedule.failures:
+            return now + _jittered(min(MAX_RETRY_SECONDS, RETRY_SECONDS * 2 ** (schedule.failures - 1)))
+        idle = now - schedule.last_active
+        if idle < ACTIVE_WINDOW_SECONDS:
+            return now + _jittered(ACTIVE_INTERVAL_SECONDS)
+        return now + _jittered(min(MAX_INTERVAL_SECONDS, idle))
+
+    def _start(self):
+        # Called with the lock held
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="learnbridge-sync")
+        register_request_hook(self._throttle)
+        threading.Thread(target=self._dispatch, name="learnbridge-sync-scheduler", daemon=True).start()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                user_id = self._next_user()
+                self._running.add(user_id)
+            try:
+                self._executor.submit(self._run_sync, user_id)
+            except RuntimeError:
+                # The interpreter is shutting down
+                return
+
+    def _next_user(self) -> str:
+        """Wait until a user is due and a worker is free, and take them off the queue."""
+        while True:
+            while self._queue:
+                due, user_id = self._queue[0]
+                schedule = self._users.get(user_id)
+                if schedule is not None and schedule.due == due and user_id not in self._running:
+                    break
+                heapq.heappop(self._queue)
+
+            if len(self._running) >= self.workers or not self._queue:
+                self._cond.wait()
+                continue
+            wait = self._queue[0][0] - time.time()
+            if wait > 0:
+                self._cond.wait(wait)
+                continue
+            return heapq.heappop(self._queue)[1]
+
+    def _run_sync(self, user_id: str):
+        ok = False
+        token = _in_sync.set(True)
+        try:
+            with tracer.start_as_current_span("sync.user", attributes={"user.id": user_id}) as span:
+                ok = self.sync_user(user_id)
+                span.set_attribute("sync.ok", ok)
+        except Exception as e:
+            print(f"Background sync failed for user {user_id}: {e}")
+        finally:
+            _in_sync.reset(token)
+            self._finish(user_id, ok)
+
+    def _finish(self, user_id: str, ok: bool):
+        with self._cond:
+            self._running.discard(user_id)
+            schedule = self._users.get(user_id)
+            now = time.time()
+            if schedule is not None and now - schedule.last_active >= DROP_AFTER_SECONDS:
+                del self._users[user_id]
+            elif schedule is not None:
+                schedule.failures = 0 if ok else schedule.failures + 1
+                schedule.due = self._next_due(schedule, now)
+                heapq.heappush(self._queue, (schedule.due, user_id))
+            self._cond.notify()
+
+    def _throttle(self, request):
+        # Only the scheduler's requests draw from its budget
+        if _in_sync.get():
+            self.api_limiter.acquire()
+        return None
+
+
+# Process-wide scheduler shared by every session of the app or API server
+sync_scheduler = SyncScheduler()
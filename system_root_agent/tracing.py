@@ -0,0 +1,203 @@
+"""
+Turn Tracing
+
+This module traces each chat turn with OpenTelemetry. ADK already emits spans
+for agent runs, model calls and tool calls; on top of those we add a root span
+per turn, one span per Google API request (through the request hook in
+google_requests) and spans around per-course fetches with their page counts.
+
+Finished spans are kept in memory for the last few turns, so any frontend can
+show where a turn's time went. If OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+OTLP exporter is installed, spans are exported there as well.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+from google_requests import register_request_hook
+
+# Number of traces (turns) kept in memory
+TRACE_HISTORY = 100
+
+# Longer attribute values (prompts, tool payloads) are not kept
+MAX_ATTRIBUTE_LENGTH = 200
+
+tracer = trace.get_tracer("learnbridge")
+
+_COURSE_ID = re.compile(r"/courses/([^/]+)")
+_PATH_ID = re.compile(r"/[0-9]+(?=/|$)")
+
+
+class SpanRecord(NamedTuple):
+    """The parts of a finished span needed to draw a waterfall."""
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    start_ns: int
+    end_ns: int
+    attributes: Dict[str, Any]
+    error: bool
+
+
+class TraceCollector(SpanProcessor):
+    """Keeps the spans of the most recent traces, grouped by trace id."""
+
+    def __init__(self, max_traces: int = TRACE_HISTORY):
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[int, List[SpanRecord]]" = OrderedDict()
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span: ReadableSpan):
+        context = span.get_span_context()
+        record = SpanRecord(
+            name=span.name,
+            span_id=context.span_id,
+            parent_id=span.parent.span_id if span.parent else None,
+            start_ns=span.start_time or 0,
+            end_ns=span.end_time or 0,
+            attributes={
+                key: value for key, value in (span.attributes or {}).items()
+                if not isinstance(value, str) or len(value) <= MAX_ATTRIBUTE_LENGTH
+            },
+            error=not span.status.is_ok,
+        )
+        with self._lock:
+            spans = self._traces.get(context.trace_id)
+            if spans is None:
+                spans = self._traces[context.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(record)
+
+    def spans(self, trace_id: int) -> List[SpanRecord]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+collector = TraceCollector()
+_setup_lock = threading.Lock()
+_setup_done = False
+
+
+def setup_tracing():
+    """Install the in-memory collector (and OTLP export if configured) once per process."""
+    global _setup_done
+    with _setup_lock:
+        if _setup_done:
+            return
+        _setup_done = True
+
+        provider = trace.get_tracer_provider()
+        if not isinstance(provider, TracerProvider):
+            provider = TracerProvider(resource=Resource.create({"service.name": "learnbridge"}))
+            trace.set_tracer_provider(provider)
+        provider.add_span_processor(collector)
+
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            except ImportError:
+                print("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-exporter-otlp is not installed.")
+
+        register_request_hook(_trace_google_request)
+
+
+@contextmanager
+def _trace_google_request(request) -> Iterator[None]:
+    """Span around one Google API request."""
+    url = urlparse(request.uri)
+    attributes = {"http.method": request.method, "url.path": url.path}
+    course = _COURSE_ID.search(url.path)
+    if course:
+        attributes["classroom.course_id"] = course.group(1)
+    if "pageToken=" in url.query:
+        attributes["google_api.next_page"] = True
+
+    with tracer.start_as_current_span(
+        f"google_api {request.method} {_PATH_ID.sub('/{id}', url.path)}", attributes=attributes
+    ) as span:
+        yield
+        span.set_attribute("http.response_bytes", request.response_bytes)
+
+
+@contextmanager
+def turn_span(user_id: str, session_id: str) -> Iterator[trace.Span]:
+    """Root span of a chat turn; everything the turn does nests under it."""
+    setup_tracing()
+    with tracer.start_as_current_span(
+        "turn", attributes={"user.id": user_id, "session.id": session_id}
+    ) as span:
+        yield span
+
+
+def trace_id_of(span: trace.Span) -> str:
+    return format(span.get_span_context().trace_id, "032x")
+
+
+def turn_waterfall(trace_id: str) -> List[Dict[str, Any]]:
+    """
+    The spans of a traced turn in start order, as rows of:
+    name, depth, start_ms (from the start of the turn), duration_ms, attributes, error
+    """
+    spans = collector.spans(int(trace_id, 16))
+    if not spans:
+        return []
+
+    by_id = {span.span_id: span for span in spans}
+    origin = min(span.start_ns for span in spans)
+
+    def depth(span: SpanRecord) -> int:
+        level = 0
+        while span.parent_id in by_id:
+            span = by_id[span.parent_id]
+            level += 1
+        return level
+
+    return [
+        {
+            "name": span.name,
+            "depth": depth(span),
+            "start_ms": (span.start_ns - origin) / 1e6,
+            "duration_ms": (span.end_ns - span.start_ns) / 1e6,
+            "attributes": span.attributes,
+            "error": span.error,
+        }
+        for span in sorted(spans, key=lambda span: span.start_ns)
+    ]
+
+
+def format_waterfall(rows: List[Dict[str, Any]], width: int = 40, name_width: int = 44) -> str:
+    """Render waterfall rows as monospace text with one bar per span."""
+    if not rows:
+        return "No spans recorded."
+
+    total = max(row["start_ms"] + row["duration_ms"] for row in rows) or 1.0
+    lines = []
+    for row in rows:
+        offset = int(row["start_ms"] / total * width)
+        length = max(1, int(row["duration_ms"] / total * width))
+        name = ("  " * row["depth"] + row["name"])[:name_width]
+        marker = "!" if row["error"] else " "
+        bar = " " * offset + "█" * min(length, width - offset)
+        lines.append(f"{name:<{name_width}}{marker}{row['duration_ms']:>9.1f} ms |{bar:<{width}}|")
+    return "\n".join(lines)
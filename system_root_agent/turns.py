@@ -0,0 +1,281 @@
+"""
+Agent Turns
+
+This module runs one chat turn against the agent pipeline, independent of the
+frontend. Streamlit, the HTTP API and batch jobs all go through it, so the fast
+path, the request context and the interaction history behave the same
+everywhere.
+
+run_turn is single-flight per session: the same question asked again in a
+session while it is still being answered (a double-clicked sidebar button, a
+page reloaded mid-turn, a client retrying) joins the running turn and gets
+its answer, instead of running the whole pipeline a second time. If that
+turn is stopped for a reason that is not the caller's own (the client that
+started it went away), the caller runs the question itself.
+"""
+
+import asyncio
+import time
+import uuid
+from contextlib import aclosing
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from .accounting import record_event_usage, turn_usage
+from .cancellation import CancellationToken, TurnCancelled, turn_registry
+from .context import request_context
+from .fast_path import FAST_PATH_AGENT_NAME, answer_fast_path
+from .freshness import format_as_of
+from .profiling import profiled_in_thread
+from .routing import classify_query
+from .single_flight import SingleFlight
+from .tracing import trace_id_of, tracer, turn_span
+
+APP_NAME = "Classroom ChatBot"
+
+# Turns in flight by (user, session, question, teacher mode)
+_turns = SingleFlight()
+
+
+@dataclass
+class TurnResult:
+    """The final answer of a turn."""
+    text: Optional[str]
+    agent: Optional[str]
+    fast_path: bool = False
+    trace_id: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    # When the oldest Classroom data the answer used was fetched (UTC, ISO 8601)
+    data_as_of: Optional[str] = None
+    # The answer of an identical turn that was already running in the session
+    coalesced: bool = False
+    # Why the turn was stopped before it finished (see cancellation.py)
+    cancelled: Optional[str] = None
+
+
+def new_initial_state() -> Dict[str, Any]:
+    """State for a brand new conversation."""
+    return {
+        "user_name": "Classroom User",
+        "courses_accessed": [],
+        "interaction_history": [],
+        "last_announcement_check": None,
+        "last_coursework_check": None,
+    }
+
+
+async def append_interaction(session_service, user_id: str, session_id: str, entry: Dict[str, Any]):
+    """Add an entry to the interaction history in a session's state."""
+    try:
+        session = await session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=session_id,
+        )
+
+        interaction_history = list(session.state.get("interaction_history", []))
+
+        # Add timestamp if not already present
+        if "timestamp" not in entry:
+            entry["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        interaction_history.append(entry)
+
+        # Persist the change as a state delta so every session backend stores it
+        await session_service.append_event(session, Event(
+            invocation_id=f"history_{uuid.uuid4().hex}",
+            author="system",
+            actions=EventActions(state_delta={"interaction_history": interaction_history}),
+            timestamp=time.time(),
+        ))
+    except Exception as e:
+        print(f"Error updating interaction history: {e}")
+
+
+async def stream_turn(runner, user_id: str, session_id: str, query: str, streaming: bool = False,
+                      token: Optional[CancellationToken] = None, read_only: bool = False,
+                      teacher_mode: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs one turn and yields its progress.
+
+    Yields dicts with a "type" of:
+        "delta": a chunk of model text as it is generated (streaming only)
+        "final": the final answer, with "text", "agent", "fast_path", "trace_id",
+                 "usage" (tokens per agent and model, the model each agent ran on,
+                 and Google API requests/bytes of the turn)
+                 and "data_as_of" (when the Classroom data it used was fetched)
+        "cancelled": the turn was stopped (see cancellation.py), with "reason"
+                 and "trace_id"; nothing follows it
+
+    Starting a turn cancels the one still running in the same session, and a
+    consumer that stops iterating (e.g. a client that disconnected) cancels it.
+    token, if given, becomes the turn's CancellationToken, so the caller can
+    cancel this turn and no other. A read_only turn cannot write to the user's
+    Google account, and only a teacher_mode turn gets the class-wide teacher
+    tools (see RequestContext).
+    """
+    session_service = runner.session_service
+
+    with request_context(user_id=user_id, session_id=session_id) as ctx, \
+            turn_span(user_id, session_id) as span, turn_usage(user_id) as usage:
+        trace_id = trace_id_of(span)
+        ctx.read_only = read_only
+        ctx.teacher_mode = teacher_mode
+        token = ctx.cancellation = turn_registry.start(user_id, session_id, token)
+        span.set_attribute("turn.id", token.turn_id)
+        finished = False
+        try:
+            await append_interaction(session_service, user_id, session_id, {
+                "action": "user_query",
+                "query": query,
+            })
+
+            # Answer common structured questions straight from the tool data,
+            # skipping the Gemini round trips entirely
+            with tracer.start_as_current_span("fast_path") as fast_path_span:
+                fast_response = await asyncio.to_thread(profiled_in_thread(answer_fast_path), query)
+                fast_path_span.set_attribute("fast_path.answered", bool(fast_response))
+            token.raise_if_cancelled()
+            if fast_response:
+                usage.fast_path = True
+                await append_interaction(session_service, user_id, session_id, {
+                    "action": "agent_response",
+                    "agent": FAST_PATH_AGENT_NAME,
+                    "response": fast_response,
+                })
+                finished = True
+                yield {"type": "final", "text": fast_response, "agent": FAST_PATH_AGENT_NAME, "fast_path": True,
+                       "trace_id": trace_id, "usage": usage.to_dict(), "data_as_of": _data_as_of(ctx)}
+                return
+
+            # Decides which model tier the agents answer with
+            ctx.complexity = usage.complexity = classify_query(query)
+            span.set_attribute("turn.complexity", ctx.complexity)
+
+            content = types.Content(role="user", parts=[types.Part(text=query)])
+            run_config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+
+            final_response_text = None
+            agent_name = None
+
+            # Closed as soon as the loop ends, so a cancelled turn's agents stop with it
+            async with aclosing(runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=content,
+                run_config=run_config,
+            )) as events:
+                async for event in events:
+                    # Between model and tool calls
+                    token.raise_if_cancelled()
+                    # Capture the agent name from the event if available
+                    if event.author:
+                        agent_name = event.author
+                    record_event_usage(usage, event)
+
+                    if not (event.content and event.content.parts):
+                        continue
+
+                    for part in event.content.parts:
+                        if getattr(part, "text", None) and not part.text.isspace():
+                            if event.partial:
+                                yield {"type": "delta", "text": part.text, "agent": event.author}
+                            else:
+                                final_response_text = part.text.strip()
+                            break
+
+            # Add the agent response to interaction history if we got a final response
+            if final_response_text and agent_name:
+                await append_interaction(session_service, user_id, session_id, {
+                    "action": "agent_response",
+                    "agent": agent_name,
+                    "response": final_response_text,
+                })
+
+            span.set_attribute("turn.agent", agent_name or "")
+            finished = True
+            yield {"type": "final", "text": final_response_text, "agent": agent_name, "fast_path": False,
+                   "trace_id": trace_id, "usage": usage.to_dict(), "data_as_of": _data_as_of(ctx)}
+
+        except TurnCancelled as e:
+            finished = True
+            span.set_attribute("turn.cancelled", e.reason)
+            await append_interaction(session_service, user_id, session_id, {
+                "action": "turn_cancelled",
+                "reason": e.reason,
+            })
+            yield {"type": "cancelled", "reason": e.reason, "trace_id": trace_id}
+
+        finally:
+            if not finished:
+                # The consumer went away (or the turn failed): stop its work in threads too
+                token.cancel("disconnected")
+            turn_registry.finish(token)
+
+
+def _data_as_of(ctx) -> Optional[str]:
+    return format_as_of(ctx.data_as_of) if ctx.data_as_of is not None else None
+
+
+async def run_turn(runner, user_id: str, session_id: str, query: str,
+                   token: Optional[CancellationToken] = None, read_only: bool = False,
+                   teacher_mode: bool = False) -> TurnResult:
+    """
+    Runs one turn and returns its final answer. If the same question is being
+    answered in the session already, waits for that turn's answer instead.
+    token is the new turn's CancellationToken (see stream_turn); a caller
+    that joins a running turn still passes its own, because it runs the turn
+    itself when the one it joined was stopped for another caller's reason
+    (see _stopped_for_joiner). read_only and teacher_mode are passed on to
+    stream_turn; only turns with the same teacher_mode join.
+    """
+    key = _turn_key(user_id, session_id, query, teacher_mode)
+    while True:
+        asked_at = time.time()
+        leader = token or CancellationToken(user_id, session_id)
+        (result, ran), coalesced = await _turns.do_async(
+            key, lambda: _run_turn(runner, user_id, session_id, query, leader, read_only, teacher_mode)
+        )
+        if not coalesced:
+            return result
+        if result.cancelled and not _stopped_for_joiner(ran, asked_at, token):
+            continue
+        return replace(result, coalesced=True)
+
+
+def _stopped_for_joiner(leader: CancellationToken, asked_at: float,
+                        token: Optional[CancellationToken]) -> bool:
+    """Whether the cancellation of a joined turn also applies to a caller that joined it at asked_at."""
+    if token is not None and token.cancelled:
+        return True
+    # Not if the leader's client went away, or if the turn had been stopped
+    # (e.g. superseded by an older question) before this caller asked
+    return leader.reason != "disconnected" and leader.cancelled_at >= asked_at
+
+
+def turn_in_flight(user_id: str, session_id: str, query: str, teacher_mode: bool = False) -> bool:
+    """Whether run_turn with this question would join a turn already running in the session."""
+    return _turns.in_flight(_turn_key(user_id, session_id, query, teacher_mode))
+
+
+def _turn_key(user_id: str, session_id: str, query: str, teacher_mode: bool):
+    return (user_id, session_id, " ".join(query.split()), teacher_mode)
+
+
+async def _run_turn(runner, user_id: str, session_id: str, query: str, token: CancellationToken,
+                    read_only: bool, teacher_mode: bool) -> Tuple[TurnResult, CancellationToken]:
+    """The turn's result, and its token for the callers that joined it."""
+    result = TurnResult(text=None, agent=None)
+    async for update in stream_turn(runner, user_id, session_id, query, token=token, read_only=read_only,
+                                    teacher_mode=teacher_mode):
+        if update["type"] == "final":
+            result = TurnResult(text=update["text"], agent=update["agent"], fast_path=update["fast_path"],
+                                trace_id=update["trace_id"], usage=update["usage"],
+                                data_as_of=update["data_as_of"])
+        elif update["type"] == "cancelled":
+            result = TurnResult(text=None, agent=None, trace_id=update["trace_id"], cancelled=update["reason"])
+    return result, token
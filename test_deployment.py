@@ -132,6 +132,106 @@ def test_file_structure():
         print("✅ All required files exist")
         return True
 
+def test_shared_storage():
+    """Test that one documented LEARNBRIDGE_STORE_URL serves both the credential store and the session service."""
+    print("\n🔍 Testing shared storage...")
+    
+    import asyncio
+    import tempfile
+    from unittest import mock
+    
+    try:
+        from cryptography.fernet import Fernet
+        import storage
+        
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                storage.STORE_URL_ENV: f"sqlite:///{directory}/learnbridge.db",
+                storage.CREDENTIALS_KEY_ENV: Fernet.generate_key().decode(),
+            }
+            with mock.patch.dict(os.environ, env):
+                storage.get_credential_store.cache_clear()
+                storage.get_session_service.cache_clear()
+                try:
+                    credentials = storage.get_credential_store()
+                    credentials.put("deployment-test", {"token": "t"})
+                    if credentials.get("deployment-test") != {"token": "t"}:
+                        print("❌ Credential store did not return what was stored")
+                        return False
+                    
+                    sessions = storage.get_session_service()
+                    
+                    async def round_trip():
+                        session = await sessions.create_session(app_name="test", user_id="deployment-test")
+                        return await sessions.get_session(app_name="test", user_id="deployment-test", session_id=session.id)
+                    
+                    if asyncio.run(round_trip()) is None:
+                        print("❌ Session service did not return the created session")
+                        return False
+                finally:
+                    storage.get_credential_store.cache_clear()
+                    storage.get_session_service.cache_clear()
+        
+        print("✅ Credential store and session service work from one SQLite URL")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing shared storage: {e}")
+        return False
+
+def test_coalesced_retry():
+    """Test that a retry joining a turn whose client disconnected still gets an answer."""
+    print("\n🔍 Testing a disconnect plus a retry...")
+    
+    import asyncio
+    
+    try:
+        from google.adk.events import Event
+        from google.adk.sessions import InMemorySessionService
+        from google.genai import types
+        from system_root_agent.cancellation import CancellationToken
+        from system_root_agent.turns import APP_NAME, run_turn
+        
+        class SlowRunner:
+            """Answers every question after a short delay, like a model call."""
+            
+            def __init__(self):
+                self.session_service = InMemorySessionService()
+                self.runs = 0
+            
+            async def run_async(self, user_id, session_id, new_message, run_config):
+                self.runs += 1
+                await asyncio.sleep(0.3)
+                yield Event(author="DataAnalyzerAgent", content=types.Content(role="model", parts=[types.Part(text="The answer")]))
+        
+        async def disconnect_and_retry():
+            runner = SlowRunner()
+            session = await runner.session_service.create_session(app_name=APP_NAME, user_id="deployment-test")
+            question = "Explain the causes of the French Revolution"
+            
+            first = CancellationToken()
+            leader = asyncio.create_task(run_turn(runner, "deployment-test", session.id, question, first))
+            await asyncio.sleep(0.1)
+            retry = asyncio.create_task(run_turn(runner, "deployment-test", session.id, question, CancellationToken()))
+            await asyncio.sleep(0.05)
+            first.cancel("disconnected")
+            return await leader, await retry, runner.runs
+        
+        leader, retry, runs = asyncio.run(disconnect_and_retry())
+        if leader.cancelled != "disconnected":
+            print(f"❌ The disconnected turn was not cancelled: {leader}")
+            return False
+        if retry.cancelled or retry.text != "The answer" or runs != 2:
+            print(f"❌ The retry did not get its own answer: {retry} ({runs} runs)")
+            return False
+        
+        print("✅ A retry runs the question again when the turn it joined was disconnected")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing a disconnect plus a retry: {e}")
+        return False
+
 def main():
     """Run all tests."""
     print("🚀 LearnBridge Deployment Test Suite")
@@ -141,7 +241,9 @@ def main():
         test_environment_variables,
         test_oauth_config,
         test_imports,
-        test_file_structure
+        test_file_structure,
+        test_shared_storage,
+        test_coalesced_retry
     ]
     
     passed = 0